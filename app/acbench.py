@@ -0,0 +1,250 @@
+# Regression check and memory benchmark for the compact aircraft state (aircraft.py)
+#
+# Drives a number of aircraft with the same pseudo-random stream of updates twice: once
+# with the original dict based Aircraft (kept here as the reference), and once with the
+# __slots__ version.  The strings the table shows are compared, any mismatch is printed.
+# Then reports the memory held per aircraft (not counting its track, or objects shared
+# between aircraft such as constant description strings), the memory held by its track
+# (simplified as the decoder does by default), and the time per update.
+#
+#	python acbench.py [-n AIRCRAFT] [-u UPDATES] [--read]
+#
+# With --read, every string the table shows is read after each update, as the GUI does.
+#
+
+import sys
+import time
+import random
+import argparse
+import decoder
+import aircraft
+
+# ---- reference implementation, the Aircraft state the decoder used to keep ----
+
+class RefAircraft(object):
+	def __init__(self, decoder, aa):
+		self.decoder = decoder
+		self.aa = aa
+		self.idStr = ""
+		self.airlineStr = ""
+		self.callsignStr = ""
+		self.caStr = ""
+		self.catStr = ""
+		self.posStr = ""
+		self.altStr = ""
+		self.posUncertStr = ""
+		self.altTypeStr = ""
+		self.velStr = ""
+		self.vertStr = ""
+		self.ccStr = ""
+		self.riStr = ""
+		self.fsStr = ""
+		self.emergStr = ""
+		self.acasStr = ""
+		self.iis = 0
+		self.alt = 0
+		self.squawk = 0
+		self.squawkStr = ""
+		self.range = 0
+		self.bearing = 0
+		self.elev = 0
+		self.elevStr = ""
+		self.rangeStr = ""
+		self.bearingStr = ""
+		self.heading = 0
+		self.headingStr = ""
+		self.fakeICAO24 = False
+		self.pkts = 1
+		self.timestamp = time.time()
+		self.countryStr = decoder.lookupCountry(aa)
+		self.track = [ ]
+		self.IICSeen = [False] * 16;
+		self.IICSeenStr = ""
+
+	getHeadingStr = aircraft.Aircraft.__dict__['getHeadingStr']
+	formatPos = aircraft.Aircraft.__dict__['formatPos']
+
+	def setIICSeen(self, ic):
+		self.IICSeen[ic] = True;
+		ics = ""
+		for (ic,seen) in enumerate(self.IICSeen):
+			if ic != 0 and seen:
+				ics += "%d, " % ic
+		if len(ics) != 0:
+			ics = ics.strip(", ")
+		self.IICSeenStr = ics
+
+	def setGroundPos(self, lat, lon, velStr, caStr):
+		self.pkts += 1
+		self.posStr = self.formatPos(lat, lon)
+		self.velStr = velStr
+		self.caStr = caStr
+		self.fsStr = "On Ground"
+		self.vertStr = ""
+		self.headingStr = ""
+		self.timestamp = time.time()
+		self.pos_timestamp = self.timestamp = t = time.time()
+		self.track += [(lon, lat, self.alt, t)]
+
+	def setAirbornePos(self, lat, lon, alt, posUncertStr, altTypeStr, caStr):
+		self.pkts += 1
+		self.pos_timestamp = self.timestamp = t = time.time()
+		self.posStr = self.formatPos(lat, lon)
+		[self.range, self.bearing, self.elev ] = self.decoder.rangeAndBearingToAircraft(self.decoder.getOrigin(), [lat, lon], alt)
+		self.rangeStr = ("%0.2f" % self.range)
+		self.bearingStr = ("%.0f" % self.bearing)
+		self.elevStr = ("%.0f" % self.elev)
+		if alt != 0:
+			self.alt = alt
+		self.posUncertStr = posUncertStr
+		self.altTypeStr = altTypeStr
+		self.caStr = caStr
+		self.fsStr = "Airborne"
+		self.track += [(lon, lat, alt, t)]
+
+	def setAirborneVel(self, velStr, heading, vertStr, caStr):
+		self.pkts += 1
+		self.velStr = velStr
+		self.heading = heading
+		self.headingStr = self.getHeadingStr(heading)
+		self.vertStr = vertStr
+		self.fsStr = "Airborne"
+		self.timestamp = time.time()
+		self.vel_timestamp = self.timestamp = time.time()
+
+	def setCommBAltitude(self, alt, iis, fsStr, drStr):
+		self.pkts += 1
+		if alt != 0:
+			self.alt = alt
+		self.iis = iis;
+		self.fsStr = fsStr
+		self.drStr = drStr
+		self.timestamp = time.time()
+
+	def setCommBIdent(self, squawk, fsStr, drStr):
+		self.pkts += 1
+		self.squawk = squawk;
+		self.squawkStr = ("%04u" % squawk)
+		self.fsStr = fsStr
+		self.drStr = drStr
+		self.timestamp = time.time()
+
+# ---- update stream ----
+
+SHOWN = ('countryStr', 'idStr', 'fsStr', 'rangeStr', 'elevStr', 'bearingStr', 'posStr', 'vertStr',
+	'headingStr', 'velStr', 'squawkStr', 'catStr', 'riStr', 'IICSeenStr')
+
+# the same updates, in the same order, for any seed
+def updates(naircraft, nupdates, seed = 1):
+	rnd = random.Random(seed)
+	addrs = [ rnd.randrange(0x000001, 0xFFFFFF) for i in range(naircraft) ]
+	start = {}
+	for aa in addrs:
+		start[aa] = (rnd.uniform(36.0, 39.0), rnd.uniform(-124.0, -120.0), rnd.randrange(0, 40000, 25), rnd.uniform(0, 360))
+	for i in range(nupdates):
+		aa = addrs[i % naircraft]
+		(lat, lon, alt, hdg) = start[aa]
+		step = i // naircraft
+		kind = rnd.randrange(10)
+		if kind < 4:
+			yield (aa, 'setAirbornePos', (lat + step * 0.001, lon + step * 0.001, alt, "< 0.1 NM", "Barometric", "Level 2+, airborne"))
+		elif kind < 7:
+			yield (aa, 'setAirborneVel', ("%u kts" % (400 + step % 20), (hdg + step * 0.5) % 360, "Level", "Level 2+, airborne"))
+		elif kind < 8:
+			yield (aa, 'setCommBAltitude', (alt, 0, "Airborne", "No downlink request"))
+		elif kind < 9:
+			yield (aa, 'setCommBIdent', (1200 + aa % 7, "Airborne", "No downlink request"))
+		else:
+			yield (aa, 'setGroundPos', (lat, lon, "12 kts", "Level 2+, on ground"))
+		if kind % 3 == 0:
+			yield (aa, 'setIICSeen', (rnd.randrange(16),))
+
+def replay(cls, dec, naircraft, nupdates, read):
+	fleet = {}
+	n = 0
+	t0 = time.time()
+	for (aa, method, args) in updates(naircraft, nupdates):
+		a = fleet.get(aa)
+		if a == None:
+			a = fleet[aa] = cls(dec, aa)
+		getattr(a, method)(*args)
+		if read:
+			for name in SHOWN:
+				getattr(a, name)
+		n += 1
+	return [ fleet, (time.time() - t0) / n ]
+
+# ---- memory ----
+
+# bytes held by obj and everything it refers to, skipping objects already in seen and the skip ids
+def deepSize(obj, seen, skip):
+	size = 0
+	stack = [ obj ]
+	while stack:
+		o = stack.pop()
+		if id(o) in seen or id(o) in skip:
+			continue
+		seen.add(id(o))
+		size += sys.getsizeof(o)
+		if isinstance(o, dict):
+			stack.extend(o.keys())
+			stack.extend(o.values())
+		elif isinstance(o, (list, tuple, set, frozenset)):
+			stack.extend(o)
+		if hasattr(o, '__dict__'):
+			stack.append(o.__dict__)
+		for slot in getattr(type(o), '__slots__', ()):
+			if hasattr(o, slot):
+				stack.append(getattr(o, slot))
+	return size
+
+def stateSize(fleet, dec):
+	# count anything shared between aircraft (the decoder, constant strings, ...) only once, up front
+	seen = set()
+	skip = set([ id(dec) ] + [ id(a.track) for a in fleet.values() ])
+	deepSize(dec, seen, set())
+	sizes = [ deepSize(a, seen, skip) for a in fleet.values() ]
+	return float(sum(sizes)) / len(sizes)
+
+def trackSize(fleet):
+	seen = set()
+	size = sum([ deepSize(a.track, seen, set()) for a in fleet.values() ])
+	points = sum([ len(a.track) for a in fleet.values() ])
+	return [ float(size) / len(fleet), float(points) / len(fleet) ]
+
+def main():
+	parser = argparse.ArgumentParser(description='Check and benchmark the compact aircraft state')
+	parser.add_argument('-n', '--aircraft', type=int, default=1000, help='number of aircraft')
+	parser.add_argument('-u', '--updates', type=int, default=200000, help='number of updates')
+	parser.add_argument('--read', action='store_true', help='read the table strings after every update')
+	args = parser.parse_args()
+
+	class Args:
+		origin = (37.7, -122.02)
+	dec = decoder.Decoder(Args())
+
+	[ ref, tref ] = replay(RefAircraft, dec, args.aircraft, args.updates, args.read)
+	[ new, tnew ] = replay(aircraft.Aircraft, dec, args.aircraft, args.updates, args.read)
+
+	mismatches = 0
+	for aa in sorted(ref):
+		for name in SHOWN + ('alt', 'squawk', 'heading', 'pkts'):
+			if getattr(ref[aa], name) != getattr(new[aa], name):
+				mismatches += 1
+				print "%06X %s: %r != %r" % (aa, name, getattr(ref[aa], name), getattr(new[aa], name))
+	print "%u aircraft, %u updates, %u mismatches" % (len(ref), args.updates, mismatches)
+
+	sref = stateSize(ref, dec)
+	snew = stateSize(new, dec)
+	print "state per aircraft (without track): reference %6.0f bytes, compact %6.0f bytes (%.1fx)" % (sref, snew, sref / snew)
+	[ bref, pref ] = trackSize(ref)
+	[ bnew, pnew ] = trackSize(new)
+	print "track per aircraft: reference %6.0f bytes (%.0f points), compact %6.0f bytes (%.0f points) (%.1fx)" % \
+		(bref, pref, bnew, pnew, bref / bnew)
+	print "time per update%s: reference %6.2f us, compact %6.2f us (%.1fx)" % \
+		(args.read and " and read" or "", tref * 1e6, tnew * 1e6, tref / tnew)
+	if mismatches:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
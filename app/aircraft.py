@@ -2,8 +2,9 @@
 # B. Kuschak, OpenADSB Project <brian@openadsb.com>
 #
 import time
-from PyQt4.QtCore import *
-from PyQt4.QtGui import *
+import threading
+import clock
+import track
 
 #Aircraft = {
 #	aa, 'icao24 address',
@@ -41,9 +42,47 @@ from PyQt4.QtGui import *
 #
 #}
 
-class Aircraft(QObject):
+# A string derived from the numeric state, formatted on first read and cached in a slot.
+# Setters invalidate the cache by storing None there (Aircraft.setDerived); "" means there is
+# nothing to show yet.  Assigning to the attribute overrides the cached string until the next
+# invalidation.  The reader thread sets values while the GUI thread formats them, so every
+# invalidation bumps the aircraft's version, and a string is only cached if the version is
+# still the one it was formatted from.  The check and the store are under cacheLock, as is the
+# invalidation, so a string formatted from old values can't land after the None.
+cacheLock = threading.Lock()
+
+class DerivedStr(object):
+	def __init__(self, slot, format):
+		self.slot = slot
+		self.format = format
+
+	def __get__(self, obj, cls):
+		if obj == None:
+			return self
+		s = getattr(obj, self.slot)
+		if s == None:
+			version = obj._version
+			s = self.format(obj)
+			with cacheLock:
+				if obj._version == version:
+					setattr(obj, self.slot, s)
+		return s
+
+	def __set__(self, obj, s):
+		obj.setDerived(s, self.slot)
+
+# Aircraft state is kept as numbers in __slots__ (no per-instance dict).  Range, bearing,
+# elevation, heading, position, squawk and the seen interrogator codes are only turned into
+# the strings the table shows (rangeStr, headingStr, ...) when somebody reads them.
+# The remaining *Str fields are the descriptions the decoder hands in, mostly shared constants.
+class Aircraft(object):
+	__slots__ = ('decoder', 'aa', 'countryStr', 'fakeICAO24', 'pkts', 'timestamp', 'pos_timestamp', 'vel_timestamp',
+		'lat', 'lon', 'alt', 'range', 'bearing', 'elev', 'heading', 'squawk', 'iis', 'iicMask', 'track', 'rawTrack',
+		'idStr', 'airlineStr', 'callsignStr', 'caStr', 'catStr', 'altStr', 'posUncertStr', 'altTypeStr',
+		'velStr', 'vertStr', 'ccStr', 'riStr', 'fsStr', 'emergStr', 'acasStr', 'drStr',
+		'_posStr', '_rangeStr', '_bearingStr', '_elevStr', '_headingStr', '_squawkStr', '_IICSeenStr', '_version')
+
 	def __init__(self, decoder, aa):
-		QObject.__init__(self, parent = None)
 		self.decoder = decoder
 		self.aa = aa
 		self.idStr = ""
@@ -51,7 +90,6 @@ class Aircraft(QObject):
 		self.callsignStr = ""
 		self.caStr = ""
 		self.catStr = ""
-		self.posStr = ""
 		self.altStr = ""
 		self.posUncertStr = ""
 		self.altTypeStr = ""
@@ -62,25 +100,28 @@ class Aircraft(QObject):
 		self.fsStr = ""
 		self.emergStr = ""
 		self.acasStr = ""
+		self.drStr = ""
 		self.iis = 0				# interrogator identity subfield 
+		self.lat = 0.0
+		self.lon = 0.0
 		self.alt = 0
 		self.squawk = 0
-		self.squawkStr = ""
 		self.range = 0
 		self.bearing = 0
 		self.elev = 0
-		self.elevStr = ""
-		self.rangeStr = ""
-		self.bearingStr = ""
 		self.heading = 0
-		self.headingStr = ""
+		self.iicMask = 0			# bit n set: we have seen interrogator code n
 		self.fakeICAO24 = False
 		self.pkts = 1
-		self.timestamp = time.time()
+		self.timestamp = self.pos_timestamp = self.vel_timestamp = clock.now()
 		self.countryStr = decoder.lookupCountry(aa)
-		self.track = [ ]
-		self.IICSeen = [False] * 16; # which interrogator codes have we seen
-		self.IICSeenStr = ""
+		self.track = track.Track(decoder.trackPoints, decoder.trackTolerance)
+		self.rawTrack = None
+		if decoder.rawTrack and decoder.trackTolerance != None:
+			self.rawTrack = track.Track(decoder.trackPoints)
+		self._posStr = self._rangeStr = self._bearingStr = self._elevStr = ""
+		self._headingStr = self._squawkStr = self._IICSeenStr = ""
+		self._version = 0			# bumped whenever a cached string goes stale, see DerivedStr
 	
 		#self.minAlt
 		#self.maxAlt
@@ -121,11 +162,26 @@ class Aircraft(QObject):
 		#self.capVersion1 = false
 		#self.capVersion0 = false
 
-	def __del__(self):
-		pass
-
 	def getAA(self):
-		return aa
+		return self.aa
+
+	# The aircraft's state as a list of plain values, for sending to another process (see pool.py).
+	# Leaves out the decoder and tracks, and the airline lookups which the receiver does itself.
+	def getState(self):
+		return [ getattr(self, name) for name in STATE_SLOTS ]
+
+	def setState(self, state):
+		with cacheLock:
+			self._version += 1
+			for (name, value) in zip(STATE_SLOTS, state):
+				setattr(self, name, value)
+
+	# set the cached strings in slots to value, None to have them formatted again (see DerivedStr)
+	def setDerived(self, value, *slots):
+		with cacheLock:
+			self._version += 1
+			for slot in slots:
+				setattr(self, slot, value)
 	
 	def getHeadingStr(self, deg):
 		d = 360.0/32
@@ -178,14 +234,22 @@ class Aircraft(QObject):
 		return self.timestamp
 
 	def setIICSeen(self, ic):
-		self.IICSeen[ic] = True;
-		ics = ""
-		for (ic,seen) in enumerate(self.IICSeen):
-			if ic != 0 and seen:
-				ics += "%d, " % ic
-		if len(ics) != 0:
-			ics = ics.strip(", ")           # strip trailing comma
-		self.IICSeenStr = ics
+		bit = 1 << ic
+		if not self.iicMask & bit:
+			self.iicMask |= bit
+			self.setDerived(None, '_IICSeenStr')
+
+	def formatIICSeen(self):
+		# interrogator code 0 is not listed
+		return ", ".join([ "%d" % ic for ic in range(1, 16) if self.iicMask & (1 << ic) ])
+
+	posStr = DerivedStr('_posStr', lambda self: self.formatPos(self.lat, self.lon))
+	rangeStr = DerivedStr('_rangeStr', lambda self: "%0.2f" % self.range)
+	bearingStr = DerivedStr('_bearingStr', lambda self: "%.0f" % self.bearing)
+	elevStr = DerivedStr('_elevStr', lambda self: "%.0f" % self.elev)
+	headingStr = DerivedStr('_headingStr', lambda self: self.getHeadingStr(self.heading))
+	squawkStr = DerivedStr('_squawkStr', lambda self: "%04u" % self.squawk)
+	IICSeenStr = DerivedStr('_IICSeenStr', formatIICSeen)
 
 	def setIdentityInfo(self, idStr, catStr):
 		self.pkts += 1
@@ -193,36 +257,44 @@ class Aircraft(QObject):
 			self.idStr = idStr
 			(self.airlineStr, self.callsignStr) = self.lookupAirlineByFlightID(idStr)
 		self.catStr = catStr
-		self.timestamp = time.time()
+		self.timestamp = clock.now()
+
+	def setPos(self, lat, lon):
+		if lat != self.lat or lon != self.lon or self._posStr == "":
+			self.lat = lat
+			self.lon = lon
+			self.setDerived(None, '_posStr')
+
+	# track is simplified if the decoder asks for it, rawTrack (if any) keeps every point
+	def addTrackPoint(self, lon, lat, alt, t):
+		self.track.add(lon, lat, alt, t)
+		if self.rawTrack != None:
+			self.rawTrack.append(lon, lat, alt, t)
 
 	def setGroundPos(self, lat, lon, velStr, caStr):
 		self.pkts += 1
-		self.posStr = self.formatPos(lat, lon)
+		self.setPos(lat, lon)
 		self.velStr = velStr
 		self.caStr = caStr
 		self.fsStr = "On Ground"
 		self.vertStr = ""
-		self.headingStr = ""
-		self.timestamp = time.time()
-		self.pos_timestamp = self.timestamp = t = time.time()
-		self.track += [(lon, lat, self.alt, t)]		# fixme - alt might not be valid yet
+		self.setDerived("", '_headingStr')
+		self.pos_timestamp = self.timestamp = t = clock.now()
+		self.addTrackPoint(lon, lat, self.alt, t)		# fixme - alt might not be valid yet
 
 	def setAirbornePos(self, lat, lon, alt, posUncertStr, altTypeStr, caStr):
 		self.pkts += 1
-		self.pos_timestamp = self.timestamp = t = time.time()
-		#self.posStr = "(%f, %f)" % (lat, lon)
-		self.posStr = self.formatPos(lat, lon)
+		self.pos_timestamp = self.timestamp = t = clock.now()
+		self.setPos(lat, lon)
 		[self.range, self.bearing, self.elev ] = self.decoder.rangeAndBearingToAircraft(self.decoder.getOrigin(), [lat, lon], alt)
-		self.rangeStr = ("%0.2f" % self.range)
-		self.bearingStr = ("%.0f" % self.bearing)
-		self.elevStr = ("%.0f" % self.elev)
+		self.setDerived(None, '_rangeStr', '_bearingStr', '_elevStr')
 		if alt != 0:
 			self.alt = alt
 		self.posUncertStr = posUncertStr
 		self.altTypeStr = altTypeStr
 		self.caStr = caStr
 		self.fsStr = "Airborne"
-		self.track += [(lon, lat, alt, t)]		# fixme - add heading
+		self.addTrackPoint(lon, lat, alt, t)		# fixme - add heading
 		#self.pt = kml.newpoint(coords=[(lon,lat,alt)], altitudemode='absolute')
 		#self.pt.iconstyle = simplekml.IconStyle(heading=self.heading,icon=icon)
 		#if self.idStr != "":
@@ -240,17 +312,17 @@ class Aircraft(QObject):
 		self.posUncertStr = posUncertStr
 		self.altTypeStr = altTypeStr
 		self.fsStr = "Airborne"
-		self.pos_timestamp = self.timestamp = time.time()
+		self.pos_timestamp = self.timestamp = clock.now()
 
 	def setAirborneVel(self, velStr, heading, vertStr, caStr):
 		self.pkts += 1
 		self.velStr = velStr
-		self.heading = heading
-		self.headingStr = self.getHeadingStr(heading)
+		if heading != self.heading or self._headingStr == "":
+			self.heading = heading
+			self.setDerived(None, '_headingStr')
 		self.vertStr = vertStr
 		self.fsStr = "Airborne"
-		self.timestamp = time.time()
-		self.vel_timestamp = self.timestamp = time.time()
+		self.vel_timestamp = self.timestamp = clock.now()
 
 	def setACASInfo(self, ccStr, alt, riStr, acasStr, vsStr):
 		self.pkts += 1
@@ -263,7 +335,12 @@ class Aircraft(QObject):
 		if acasStr != "":
 			self.acasStr = acasStr
 		self.fsStr = vsStr
-		self.timestamp = time.time()
+		self.timestamp = clock.now()
+
+	def setSquawk(self, squawk):
+		if squawk != self.squawk or self._squawkStr == "":
+			self.squawk = squawk
+			self.setDerived(None, '_squawkStr')
 
 	def setCommBAltitude(self, alt, iis, fsStr, drStr):
 		self.pkts += 1
@@ -272,15 +349,14 @@ class Aircraft(QObject):
 		self.iis = iis;
 		self.fsStr = fsStr
 		self.drStr = drStr
-		self.timestamp = time.time()
+		self.timestamp = clock.now()
 
 	def setCommBIdent(self, squawk, fsStr, drStr):
 		self.pkts += 1
-		self.squawk = squawk;
-		self.squawkStr = ("%04u" % squawk)
+		self.setSquawk(squawk)
 		self.fsStr = fsStr
 		self.drStr = drStr
-		self.timestamp = time.time()
+		self.timestamp = clock.now()
 
 	def setAltitude(self, iis, fsStr, alt, drStr):
 		self.pkts += 1
@@ -289,15 +365,17 @@ class Aircraft(QObject):
 		self.iis = iis
 		self.fsStr = fsStr
 		self.drStr = drStr
-		self.timestamp = time.time()
+		self.timestamp = clock.now()
 
 	def setEmergStatus(self, squawk, esStr):
 		self.pkts += 1
-		self.squawk = squawk;
-		self.squawkStr = ("%04u" % squawk)
+		self.setSquawk(squawk)
 		self.emergStr = esStr
-		self.timestamp = time.time()
+		self.timestamp = clock.now()
 		
+	def isOnGround(self):
+		return "On Ground" in self.fsStr
+
 	def setFakeICAO24(self, state):
 		self.fakeICAO24 = state
 
@@ -345,12 +423,14 @@ class Aircraft(QObject):
 	def printInfo(self):
 		#kml.newlinestring(name=("%x"%(self.aa)), coords=self.track)
 		#kml.save("adsb.kml")
-		age = time.time() - self.timestamp
+		age = clock.now() - self.timestamp
 		print "age %3u: %14s %x: %s, %s, Range: %2u km, Pos: %s (+/- %s), Alt: %6d (%s), %s, Heading: %3u, Speed: %s, Squawk: %4u, %s %s" % \
 			(age, self.countryStr, self.aa, self.idStr, self.fsStr, self.range, self.posStr, self.posUncertStr, self.alt, \
 			self.altTypeStr, self.vertStr, self.heading, self.velStr, self.squawk, self.catStr, self.caStr)
 
 	def lookupAirlineByFlightID(self, idStr):
-		(airline, country, callsign) = self.decoder.reader.app.airlineCodes.lookupByFlightID(idStr)
+		(airline, country, callsign) = self.decoder.lookupFlightID(idStr)
 		print airline, callsign
 		return [ airline, callsign ]
+
+STATE_SLOTS = tuple([ name for name in Aircraft.__slots__ if name not in ('decoder', 'track', 'rawTrack', 'airlineStr', 'callsignStr', '_version') ])
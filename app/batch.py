@@ -0,0 +1,134 @@
+# Vectorized batch decoding of Mode S packets with NumPy
+#
+# Packets are handed in as an (N, 14) uint8 array, one packet per row.  Short (56-bit)
+# packets occupy the first 7 bytes of their row; the rest of the row is ignored.
+# The fields which are common to most packets (DF, CRC syndrome, ICAO address, type code,
+# altitude and the raw CPR fields) are computed for the whole array at once, and returned
+# as a structured array with one record per packet.
+#
+# requires numpy ("easy_install numpy")
+#
+
+import numpy as np
+import crc
+import fields
+
+# one record per packet
+RESULT_DTYPE = np.dtype([
+	('df', np.uint8),		# downlink format
+	('nbytes', np.uint8),		# 7 or 14
+	('syndrome', np.uint32),	# CRC of the data XOR the parity field
+	('icao', np.uint32),		# AA field for DF11/17/18, otherwise the address recovered from AP
+	('crcok', np.bool_),		# parity good (DF11/17/18 only, the IC/CL bits are ignored)
+	('tc', np.uint8),		# DF17/18 type code, 0 otherwise
+	('alt', np.float64),		# altitude in feet, NaN if the packet doesn't carry one, -1 if unavailable
+	('oddeven', np.uint8),		# DF17/18 position messages: CPR format
+	('cprlat', np.uint32),		# DF17/18 position messages: raw 17-bit CPR latitude
+	('cprlon', np.uint32),		# DF17/18 position messages: raw 17-bit CPR longitude
+	])
+
+CRC_TABLE = np.array(crc.CRC_TABLE, dtype=np.uint32)
+
+_altTable = None
+
+# altitude in feet for every possible 13-bit AC field, built on first use
+def altitudeTable():
+	global _altTable
+	if _altTable is None:
+		_altTable = np.array([ a[0] for a in fields.altitudeTable() ], dtype=np.float64)
+	return _altTable
+
+# running CRC over byte columns [start:end] of every row
+def _crcColumns(frames, c, start, end):
+	for j in range(start, end):
+		c = ((c << 8) & 0xFFFFFF) ^ CRC_TABLE[((c >> 16) ^ frames[:, j]) & 0xFF]
+	return c
+
+def _uint24(frames, j):
+	return (frames[:, j].astype(np.uint32) << 16) | (frames[:, j+1].astype(np.uint32) << 8) | frames[:, j+2]
+
+def asFrames(frames):
+	frames = np.asarray(frames, dtype=np.uint8)
+	if frames.ndim != 2 or frames.shape[1] != 14:
+		raise ValueError("expected an (N, 14) uint8 array of packets, got shape %s" % (frames.shape,))
+	return frames
+
+def decodeFrames(frames):
+	frames = asFrames(frames)
+	n = frames.shape[0]
+	res = np.zeros(n, dtype=RESULT_DTYPE)
+
+	df = frames[:, 0] >> 3
+	longpkt = df >= 16
+	res['df'] = df
+	res['nbytes'] = np.where(longpkt, 14, 7)
+
+	# CRC over the first 4 bytes serves short packets, carry on to 11 bytes for long ones
+	c = np.zeros(n, dtype=np.uint32)
+	c = _crcColumns(frames, c, 0, 4)
+	crcShort = c ^ _uint24(frames, 4)
+	c = _crcColumns(frames, c, 4, 11)
+	crcLong = c ^ _uint24(frames, 11)
+	syndrome = np.where(longpkt, crcLong, crcShort)
+	res['syndrome'] = syndrome
+
+	# DF11/17/18 carry the address in the clear, the rest overlay it on the parity
+	clear = (df == 11) | (df == 17) | (df == 18)
+	res['icao'] = np.where(clear, _uint24(frames, 1), syndrome)
+	res['crcok'] = clear & ((syndrome >> 7) == 0)
+
+	alts = altitudeTable()
+	alt = np.empty(n, dtype=np.float64)
+	alt.fill(np.nan)
+
+	# 13-bit AC field of DF0/4/16/20
+	ac = ((frames[:, 2].astype(np.uint32) & 0x1F) << 8) | frames[:, 3]
+	hasAC = (df == 0) | (df == 4) | (df == 16) | (df == 20)
+	alt[hasAC] = alts[ac[hasAC]]
+
+	# extended squitter ME field starts at byte 4
+	squitter = (df == 17) | (df == 18)
+	tc = np.where(squitter, frames[:, 4] >> 3, 0).astype(np.uint8)
+	res['tc'] = tc
+	me_ac = (frames[:, 5].astype(np.uint32) << 4) | (frames[:, 6] >> 4)
+	baro = squitter & (tc >= 9) & (tc <= 18)
+	gnss = squitter & (tc >= 20) & (tc <= 22)
+	me_ac13 = ((me_ac & 0xFC0) << 1) | (me_ac & 0x3F)	# put back the M bit
+	alt[baro] = alts[me_ac13[baro]]
+	alt[gnss] = me_ac[gnss]
+	res['alt'] = alt
+
+	# raw CPR fields of surface and airborne position messages
+	pos = squitter & (tc >= 5) & (tc <= 22) & (tc != 19)
+	b6 = frames[:, 6].astype(np.uint32)
+	b8 = frames[:, 8].astype(np.uint32)
+	res['oddeven'] = np.where(pos, (b6 >> 2) & 1, 0)
+	res['cprlat'] = np.where(pos, ((b6 & 3) << 15) | (frames[:, 7].astype(np.uint32) << 7) | (b8 >> 1), 0)
+	res['cprlon'] = np.where(pos, ((b8 & 1) << 16) | (frames[:, 9].astype(np.uint32) << 8) | frames[:, 10], 0)
+	return res
+
+# Which packets could update an aircraft, and so still need the per-packet decoder:
+# good DF11/17/18, and replies whose address is a known aircraft (or one announced earlier in this batch).
+# With fixErrors, bad DF11/17/18 go through too, so the decoder can try to repair them.
+def needsDetail(res, known, fixErrors = False):
+	clear = res['crcok']
+	known = np.union1d(np.asarray(list(known), dtype=np.uint32), res['icao'][clear])
+	addressed = np.in1d(res['icao'], known) & ~clear & np.in1d(res['df'], [0, 4, 5, 16, 20, 21])
+	if fixErrors:
+		clear = clear | np.in1d(res['df'], [11, 17, 18])
+	return clear | addressed
+
+# Tally a batch into a DecoderStats, the same way the per-packet decoder would have counted it
+def countStats(stats, res):
+	stats.totalPkts += len(res)
+	df = res['df']
+	counts = np.bincount(df, minlength=32)
+	other = len(res)
+	for n in (0, 4, 5, 11, 16, 17, 18, 20, 21):
+		setattr(stats, "DF%u" % n, getattr(stats, "DF%u" % n) + int(counts[n]))
+		other -= int(counts[n])
+	stats.DFOther += other
+	# packets left here never matched an aircraft or failed parity
+	decodable = np.in1d(df, [0, 4, 5, 11, 16, 17, 18, 20, 21])
+	stats.CrcErrs += int(np.count_nonzero(decodable & ~res['crcok']))
+	stats.goodPkts += int(np.count_nonzero(res['crcok']))
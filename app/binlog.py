@@ -0,0 +1,210 @@
+# Binary packet log: fixed-size records, read back through mmap without copying
+#
+# The text log (packetlog.txt) spends three characters a byte on hex, and replaying it means
+# split, join and unhexlify for every line.  A binary log is a 16-byte header and then one
+# 28-byte record per frame, little-endian:
+#	header	magic "OADSBLOG", version (uint16), record size (uint16), reserved (uint32)
+#	record	timestamp in microseconds since the epoch (uint64), receiver id (uint16),
+#		rx level (uint16), frame length (uint8, 7 or 14), frame bytes zero-padded to 14,
+#		one byte reserved
+# Records are fixed size, so record i is at a known offset: the Reader maps the file and hands
+# out each frame as a slice of the mapping, nothing is copied or parsed.  (memoryview slices;
+# on Python 2, where mmap has only the old buffer interface, buffer slices.)  With numpy, the
+# whole file is also available as a structured array (array()), whose 'data' column is the
+# (N, 14) uint8 frames decoder.decodeBatch wants.  Finding a time is a binary search of the
+# records in place (search()), so unlike a text log, a binary log needs no index.
+#
+# Run on its own, converts a text log to a binary one, or back:
+#	python binlog.py packetlog.txt packetlog.bin
+#	python binlog.py packetlog.bin packetlog.txt
+# Nothing in here depends on Qt.
+#
+
+import os
+import mmap
+import time
+import struct
+import binascii
+import argparse
+
+MAGIC = "OADSBLOG"
+VERSION = 1
+HEADER = struct.Struct("<8sHHI")
+RECORD = struct.Struct("<QHHB14sx")
+FRAME_OFFSET = 13			# of the frame bytes in a record
+
+# the same record, as a numpy dtype (built on first use, numpy is optional)
+_recordDtype = None
+def recordDtype():
+	global _recordDtype
+	if _recordDtype is None:
+		import numpy
+		_recordDtype = numpy.dtype([ ('us', '<u8'), ('receiver', '<u2'), ('rxlevel', '<u2'), ('length', 'u1'),
+			('data', 'u1', (14,)), ('reserved', 'u1') ])
+		assert _recordDtype.itemsize == RECORD.size
+	return _recordDtype
+
+# the record for frame d (str, bytearray or array of 7 or 14 bytes), received at time t
+def pack(d, t, receiver = 0, rxlevel = 0):
+	d = str(bytearray(d))
+	return RECORD.pack(int(t * 1000000), receiver, rxlevel, len(d), d)
+
+# True if fname is a binary log
+def isBinLog(fname):
+	try:
+		with open(fname, "rb") as f:
+			return f.read(len(MAGIC)) == MAGIC
+	except IOError:
+		return False
+
+# Appends frames to a binary log (or, with append False, starts it afresh), writing the header
+# if the file is new
+class Writer(object):
+	def __init__(self, fname, append = True):
+		self.fname = fname
+		self.f = open(fname, append and "ab" or "wb")
+		self.f.seek(0, os.SEEK_END)
+		if self.f.tell() == 0:
+			self.f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+		elif not isBinLog(fname):
+			raise ValueError("%s exists and is not a binary packet log" % fname)
+
+	# d is a str, bytearray or array of 7 or 14 bytes, t the time received (default now)
+	def write(self, d, t = None, receiver = 0, rxlevel = 0):
+		if t == None:
+			t = time.time()
+		self.f.write(pack(d, t, receiver, rxlevel))
+
+	# records already made by pack(), any number of them
+	def writePacked(self, s):
+		self.f.write(s)
+
+	def tell(self):
+		return self.f.tell()
+
+	def flush(self):
+		self.f.flush()
+
+	def close(self):
+		self.f.close()
+
+class Reader(object):
+	def __init__(self, fname):
+		self.fname = fname
+		self.f = open(fname, "rb")
+		size = os.fstat(self.f.fileno()).st_size
+		if size < HEADER.size:
+			raise ValueError("%s is not a binary packet log" % fname)
+		self.map = mmap.mmap(self.f.fileno(), 0, access = mmap.ACCESS_READ)
+		(magic, version, self.recordSize, reserved) = HEADER.unpack_from(self.map, 0)
+		if magic != MAGIC:
+			raise ValueError("%s is not a binary packet log" % fname)
+		if version != VERSION or self.recordSize != RECORD.size:
+			raise ValueError("%s: unsupported binary log version %u" % (fname, version))
+		self.n = (size - HEADER.size) // self.recordSize	# a partly written last record is left out
+		try:
+			self.view = memoryview(self.map)
+		except TypeError:
+			self.view = None
+
+	def __len__(self):
+		return self.n
+
+	# byte offset of record i, i.e. how far into the file we are before reading it
+	def offset(self, i):
+		return HEADER.size + i * self.recordSize
+
+	def slice(self, start, length):
+		if self.view != None:
+			return self.view[start:start + length]
+		return buffer(self.map, start, length)
+
+	# the bytes of frame i, without copying
+	def frame(self, i):
+		off = self.offset(i)
+		return self.slice(off + FRAME_OFFSET, ord(self.map[off + FRAME_OFFSET - 1]))
+
+	# ( time in seconds, receiver id, rx level, frame ) of record i
+	def record(self, i):
+		off = self.offset(i)
+		(us, receiver, rxlevel, length) = struct.unpack_from("<QHHB", self.map, off)
+		return (us / 1000000.0, receiver, rxlevel, self.slice(off + FRAME_OFFSET, length))
+
+	# time in seconds of record i
+	def time(self, i):
+		return struct.unpack_from("<Q", self.map, self.offset(i))[0] / 1000000.0
+
+	# the first record at or after time t (len(self) if none), by binary search, so the log
+	# must be in time order, as it is when written by one reader
+	def search(self, t):
+		(lo, hi) = (0, self.n)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self.time(mid) < t:
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+
+	def __iter__(self):
+		return self.records()
+
+	def records(self, start = 0, stop = None):
+		if stop == None or stop > self.n:
+			stop = self.n
+		for i in xrange(start, stop):
+			yield self.record(i)
+
+	# every record as a numpy structured array sharing the mapping (see recordDtype)
+	def array(self):
+		import numpy
+		return numpy.frombuffer(self.map, dtype = recordDtype(), count = self.n, offset = HEADER.size)
+
+	def close(self):
+		self.view = None
+		self.map.close()
+		self.f.close()
+
+# Text log to binary log.  Returns the number of frames converted
+def fromText(textName, binName):
+	w = Writer(binName, append = False)
+	n = 0
+	for line in open(textName, "r"):
+		s = line.strip().split()
+		try:
+			d = binascii.unhexlify("".join(s[2:]))
+			t = float(s[0])
+		except (ValueError, TypeError, IndexError):
+			continue
+		if len(d) == 7 or len(d) == 14:
+			w.write(d, t)
+			n += 1
+	w.close()
+	return n
+
+# Binary log to text log, in the format AdsbReaderThread.logPacket writes
+def toText(binName, textName):
+	r = Reader(binName)
+	out = open(textName, "w")
+	for (t, receiver, rxlevel, d) in r:
+		out.write("%u %u %s\n" % (t, len(d), "".join([ "%02hx " % b for b in bytearray(d) ])))
+	out.close()
+	n = len(r)
+	r.close()
+	return n
+
+def main():
+	parser = argparse.ArgumentParser(description='Convert a text packet log to a binary one, or a binary one back to text')
+	parser.add_argument('input', help='packet log to convert, text or binary')
+	parser.add_argument('output', help='file to write, in the other format')
+	args = parser.parse_args()
+	t0 = time.time()
+	if isBinLog(args.input):
+		n = toText(args.input, args.output)
+	else:
+		n = fromText(args.input, args.output)
+	print "%u frames in %.1f s: %s (%u bytes) -> %s (%u bytes)" % (n, time.time() - t0, \
+		args.input, os.path.getsize(args.input), args.output, os.path.getsize(args.output))
+
+if __name__ == '__main__':
+	main()
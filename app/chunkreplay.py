@@ -0,0 +1,388 @@
+# Decode a packet log in parallel: chunks in worker processes, merged into one aircraft dataset
+#
+# The log (text or binary, see binlog.py) is cut into byte ranges on record boundaries, a few per
+# worker so they finish together, optionally between --start-time and --end-time (found with the
+# index, see logindex.py).  Each chunk is decoded in a process of its own by a decoder.Decoder
+# running on the log's clock (clock.LogClock), so pair timeouts and track times are the times the
+# frames were logged, however fast they're read.  Workers keep every track point and never age
+# aircraft out.
+#
+# The chunks' results are merged in log order, per aircraft:
+#	state	the latest chunk's, where it has anything to say (fields still at a new Aircraft's
+#		values are left as they were), with packets summed
+#	track	the chunks' points in order, then simplified with --track-tolerance as the decoder
+#		would have
+#	CPR	a chunk starts with no even/odd frames in hand, so its first positions for each
+#		aircraft, up to its first global decode, are decoded locally.  The worker sends
+#		those frames back, and the merge decodes them again with the CPR state left by the
+#		chunks before, replacing the points.  After the first global decode an aircraft's
+#		CPR state no longer depends on what came before, so the result is the same as
+#		decoding the whole log in one go.
+#	replies	address/parity replies (DF0/4/5/16/20/21) only count once we know the aircraft, and
+#		a chunk doesn't know the aircraft seen before it.  Workers send back the ones they
+#		couldn't match, and those for aircraft from earlier chunks are decoded by the merge,
+#		in front of the chunk's state
+#	stats	summed (DecoderStats.add), with the replies matched by the merge moved from CRC
+#		errors to good packets
+#
+# The dataset is written as JSON: the log, the chunks, the statistics and, for each aircraft,
+# what we know of it and its track as [ time, lat, lon, alt ] points.  It is what decoding the
+# whole log in one process would give, with nothing aged out (--expire doesn't apply).
+#
+#	python chunkreplay.py [-j JOBS] [--start-time T] [--end-time T] -o aircraft.json LOG
+#	python main.py -f LOG --analyze aircraft.json [-j JOBS] ...
+# Nothing in here depends on Qt.
+#
+
+import os
+import sys
+import time
+import json
+import argparse
+import binascii
+import multiprocessing
+import clock
+import cpr
+import track
+import binlog
+import logindex
+import prefilter
+import aircraft
+import decoder
+
+CHUNKS_PER_JOB = 4		# so a slow chunk doesn't hold up the rest
+BLOCK = 1 << 20			# bytes read at a time from a text log
+NEVER = 1e18			# seconds, how long workers keep aircraft
+TIMESTAMPS = ('timestamp', 'pos_timestamp', 'vel_timestamp')
+
+# ( time, frame ) for each record of the log from byte start up to byte end, both on record boundaries
+def readFrames(fname, start, end):
+	if binlog.isBinLog(fname):
+		log = binlog.Reader(fname)
+		for i in xrange((start - binlog.HEADER.size) // log.recordSize, (end - binlog.HEADER.size) // log.recordSize):
+			yield (log.time(i), log.frame(i))
+		log.close()
+		return
+	f = open(fname, "rb")
+	f.seek(start)
+	left = end - start
+	tail = ""
+	while left > 0:
+		block = f.read(min(BLOCK, left))
+		if not block:
+			break
+		left -= len(block)
+		lines = (tail + block).split("\n")
+		tail = lines.pop()
+		if left <= 0:
+			lines.append(tail)	# the last line, if it has no newline
+		for line in lines:
+			s = line.split()
+			try:
+				yield (float(s[0]), binascii.unhexlify("".join(s[2:])))
+			except (ValueError, TypeError, IndexError):
+				pass
+	f.close()
+
+# [ ( start, end ), ... ] byte ranges dividing the log into (at most) n, on record boundaries
+def chunks(fname, n, startTime = None, endTime = None):
+	if binlog.isBinLog(fname):
+		log = binlog.Reader(fname)
+		first = 0
+		last = len(log)
+		if startTime != None:
+			first = log.search(startTime)
+		if endTime != None:
+			last = max(first, log.search(endTime))
+		bounds = [ log.offset(first + (last - first) * k // n) for k in range(n + 1) ]
+		log.close()
+	else:
+		begin = 0
+		end = os.path.getsize(fname)
+		for (t, which) in ((startTime, 0), (endTime, 1)):
+			if t != None:
+				(f, ordinal) = logindex.openAt(fname, 0, t)
+				if which == 0:
+					begin = f.tell()
+				else:
+					end = max(begin, f.tell())
+				f.close()
+		f = open(fname, "rb")
+		bounds = [ begin ]
+		for k in range(1, n):
+			f.seek(max(begin + (end - begin) * k // n - 1, 0))
+			f.readline()			# to the start of the next line
+			bounds.append(min(max(f.tell(), bounds[-1]), end))
+		bounds.append(end)
+		f.close()
+	return [ (a, b) for (a, b) in zip(bounds, bounds[1:]) if b > a ]
+
+# A CPR tracker which remembers, for each aircraft, the frames it decoded before its first global
+# decode, and which track point each became
+class StitchingTracker(cpr.CprTracker):
+	def __init__(self):
+		cpr.CprTracker.__init__(self)
+		self.decoded = {}		# aa -> positions decoded so far
+		self.heads = {}			# aa -> [ ( xz, yz, odd, surface, t, point ) ]
+		self.settled = set()		# aircraft which have had a global decode
+
+	def decode(self, aa, xz, yz, odd, surface, origin, t = None):
+		if t == None:
+			t = clock.now()
+		seq = self.decoded.get(aa, 0)
+		self.decoded[aa] = seq + 1
+		pos = cpr.CprTracker.decode(self, aa, xz, yz, odd, surface, origin, t)
+		if aa not in self.settled:
+			if pos[2]:
+				self.settled.add(aa)
+			else:
+				self.heads.setdefault(aa, []).append((xz, yz, odd, surface, t, seq))
+		return pos
+
+	# ( even frame, odd frame, last position ) for aa
+	def tail(self, aa):
+		s = self.aircraft.get(aa)
+		if s == None:
+			return None
+		return (s.frames[0], s.frames[1], s.pos)
+
+# the options a worker's decoder runs with: every track point kept, nothing aged out
+def workerArgs(args):
+	w = argparse.Namespace(**vars(args))
+	w.trackpoints = sys.maxint
+	w.tracktolerance = (0.0, 0.0, 0.0)
+	w.rawtrack = False
+	w.expire = (NEVER, NEVER, NEVER)
+	return w
+
+# A decoder which notes the address/parity frames (DF0/4/5/16/20/21) it couldn't match to an
+# aircraft, as the aircraft may have been seen in an earlier chunk
+class ChunkDecoder(decoder.Decoder):
+	def __init__(self, args):
+		decoder.Decoder.__init__(self, args)
+		self.cpr = StitchingTracker()
+		self.missed = None		# address the frame being decoded was for, if we don't know it
+
+	def lookupAircraft(self, aa):
+		a = decoder.Decoder.lookupAircraft(self, aa)
+		if a == None:
+			self.missed = aa
+		return a
+
+	def recordAircraft(self, aa):
+		self.missed = None		# an all-call reply or squitter, which is as good as known
+		a = decoder.Decoder.recordAircraft(self, aa)
+		# stamped only by what we hear from here on, so the merge can tell an aircraft heard in
+		# this chunk from one which was just new to it
+		a.timestamp = a.pos_timestamp = a.vel_timestamp = 0.0
+		return a
+
+# Worker process: decode one chunk, and return what it found
+def decodeChunk(job):
+	(index, fname, start, end, args) = job
+	sys.stdout = open(os.devnull, "w")		# the decoder's debug prints
+	t0 = time.time()
+	logClock = clock.LogClock()
+	clock.use(logClock)
+	dec = ChunkDecoder(args)
+	firstSeen = {}
+	dec.subscribe("addAircraft", lambda a: firstSeen.setdefault(a.aa, logClock.t))
+	pf = prefilter.fromArgs(args)
+	frames = 0
+	errors = 0
+	orphans = []			# ( time, frame, address ) of frames for aircraft we don't know
+	for (t, d) in readFrames(fname, start, end):
+		frames += 1
+		if pf != None and not pf.accept(d):
+			continue
+		logClock.t = t
+		dec.missed = None
+		try:
+			dec.decode(d)
+		except Exception:
+			errors += 1
+		if dec.missed != None:
+			orphans.append((t, str(d), dec.missed))
+	found = {}
+	for (aa, a) in dec.recentAircraft.items():
+		found[aa] = (a.getState(), firstSeen.get(aa), list(a.track), dec.cpr.heads.get(aa, []), \
+			aa in dec.cpr.settled, dec.cpr.tail(aa))
+	return (index, start, end, frames, errors, time.time() - t0, found, orphans, dec.stats)
+
+# Puts the chunks' results together, in log order
+class Merger(object):
+	def __init__(self, args):
+		self.args = args
+		self.origin = args.origin
+		self.clock = clock.LogClock()
+		self.dec = decoder.Decoder(workerArgs(args))	# holds the merged aircraft
+		self.defaults = dict(zip(aircraft.STATE_SLOTS, aircraft.Aircraft(self.dec, 0).getState()))
+		self.defaults.update([ (name, 0.0) for name in TIMESTAMPS ])
+		self.tracker = cpr.CprTracker()		# CPR state as of the end of the chunks merged so far
+		self.points = {}			# aa -> track points
+		self.firstSeen = {}			# aa -> time
+		self.stats = decoder.DecoderStats()
+		self.chunks = []
+		self.frames = 0
+		self.errors = 0
+		self.recovered = 0			# address/parity frames for aircraft from earlier chunks
+
+	def add(self, result):
+		(index, start, end, frames, errors, secs, found, orphans, stats) = result
+		self.chunks.append({ 'start': start, 'end': end, 'frames': frames, 'errors': errors, 'seconds': secs })
+		self.frames += frames
+		self.errors += errors
+		self.stats.add(stats)
+		self.adopt(orphans)
+		for (aa, (state, first, points, head, settled, tail)) in found.items():
+			state = dict(zip(aircraft.STATE_SLOTS, state))
+			self.stitch(aa, state, points, head)
+			if settled:
+				s = self.tracker.aircraft[aa] = cpr.CprState()
+				(s.frames[0], s.frames[1], s.pos) = tail
+			a = self.dec.lookupAircraft(aa)
+			if a == None:
+				for name in TIMESTAMPS:
+					state[name] = state[name] or first
+				a = aircraft.Aircraft(self.dec, aa)
+				a.setState([ state[name] for name in aircraft.STATE_SLOTS ])
+				self.dec.registry.add(a)
+				self.points[aa] = points
+				self.firstSeen[aa] = first
+				continue
+			old = dict(zip(aircraft.STATE_SLOTS, a.getState()))
+			for (name, value) in state.items():
+				if name == 'pkts':
+					old[name] += value - 1		# a new Aircraft starts at one
+				elif name == 'iicMask':
+					old[name] |= value
+				elif value != self.defaults[name]:
+					old[name] = value
+			a.setState([ old[name] for name in aircraft.STATE_SLOTS ])
+			self.points[aa].extend(points)
+
+	# a chunk's address/parity frames for aircraft seen in earlier chunks, which decoding the
+	# whole log in one go would have matched.  They come before anything else the chunk has for
+	# the aircraft, so they go in before its state
+	def adopt(self, orphans):
+		old = clock.use(self.clock)
+		for (t, d, aa) in orphans:
+			if self.dec.lookupAircraft(aa) == None:
+				continue			# a CRC error after all
+			self.clock.t = t
+			self.dec.decode(bytearray(d))
+			self.recovered += 1
+			self.stats.CrcErrs -= 1		# what the worker made of it
+			self.stats.goodPkts += 1
+		clock.use(old)
+
+	# decode the chunk's first positions again, knowing what the chunks before it knew
+	def stitch(self, aa, state, points, head):
+		for (xz, yz, odd, surface, t, seq) in head:
+			(lat, lon, isGlobal) = self.tracker.decode(aa, xz, yz, odd, surface, self.origin, t)
+			if seq >= len(points):
+				continue
+			(oldLon, oldLat, alt, pt) = points[seq]
+			points[seq] = (lon, lat, alt, pt)
+			if seq == len(points) - 1:
+				# the chunk's last position, so it's where the aircraft is
+				(state['lat'], state['lon']) = (lat, lon)
+				if not surface:
+					(state['range'], state['bearing'], state['elev']) = self.dec.rangeAndBearingToAircraft(self.origin, [lat, lon], alt)
+				state['_posStr'] = state['_rangeStr'] = state['_bearingStr'] = state['_elevStr'] = None
+
+	# [ ( Aircraft, first seen ) ] with their whole (simplified) tracks
+	def results(self):
+		tol = getattr(self.args, 'tracktolerance', None) or (100.0, 100.0, 60.0)
+		tolerance = any(tol) and track.Tolerance(*tol) or None
+		out = []
+		for aa in sorted(self.dec.recentAircraft):
+			a = self.dec.recentAircraft[aa]
+			points = self.points[aa]
+			a.track = track.Track(len(points) + 2, tolerance)
+			for p in points:
+				a.track.add(*p)
+			out.append((a, self.firstSeen[aa]))
+		return out
+
+	def dataset(self):
+		def plain(v):
+			if v == None or isinstance(v, (bool, int, long, float, basestring)):
+				return v
+			return str(v)
+		planes = []
+		for (a, first) in self.results():
+			planes.append({
+				'aa': "%06x" % a.aa,
+				'id': a.idStr.strip(),
+				'country': plain(a.countryStr),
+				'category': plain(a.catStr),
+				'squawk': a.squawk and a.squawkStr or "",
+				'packets': a.pkts,
+				'first_seen': first,
+				'last_seen': a.timestamp,
+				'lat': a.lat,
+				'lon': a.lon,
+				'alt': a.alt,
+				'on_ground': a.isOnGround(),
+				'emergency': plain(a.emergStr),
+				'fake_icao24': a.fakeICAO24,
+				'track': [ [ t, lat, lon, alt ] for (lon, lat, alt, t) in a.track ],
+			})
+		return {
+			'log': self.args.filename,
+			'frames': self.frames,
+			'errors': self.errors,
+			'recovered': self.recovered,
+			'chunks': self.chunks,
+			'stats': dict([ (k, v) for (k, v) in vars(self.stats).items() if k not in ('logfileSize', 'rxLevel', 'badShortPkts', 'badLongPkts') ]),
+			'aircraft': planes,
+		}
+
+# Decode args.filename in args.jobs processes and write the dataset to args.analyze.  Returns the Merger
+def analyze(args):
+	t0 = time.time()
+	jobs = int(getattr(args, 'jobs', 0) or multiprocessing.cpu_count())
+	ranges = chunks(args.filename, jobs * CHUNKS_PER_JOB, getattr(args, 'starttime', None), getattr(args, 'endtime', None))
+	wargs = workerArgs(args)
+	work = [ (i, args.filename, start, end, wargs) for (i, (start, end)) in enumerate(ranges) ]
+	merger = Merger(args)
+	if jobs == 1:
+		(stdout, now) = (sys.stdout, clock.now)
+		for w in work:
+			merger.add(decodeChunk(w))
+		sys.stdout = stdout
+		clock.use(now)
+	else:
+		workers = multiprocessing.Pool(jobs)
+		for result in workers.imap(decodeChunk, work):	# in order, as they finish
+			merger.add(result)
+		workers.close()
+		workers.join()
+	data = merger.dataset()
+	if getattr(args, 'analyze', None):
+		with open(args.analyze, "w") as f:
+			json.dump(data, f, indent = 1, sort_keys = True)
+	elapsed = time.time() - t0
+	busy = sum([ c['seconds'] for c in merger.chunks ])
+	print "%u frames in %u chunks on %u processes: %.1f s (%.0f frames/s, %.1fx the time spent decoding), %u aircraft, %u track points" % \
+		(merger.frames, len(ranges), jobs, elapsed, merger.frames / max(elapsed, 1e-6), busy / max(elapsed, 1e-6), \
+		len(data['aircraft']), sum([ len(p['track']) for p in data['aircraft'] ]))
+	return merger
+
+def main():
+	parser = argparse.ArgumentParser(description='Decode a packet log in parallel chunks, and write the aircraft and their tracks as JSON')
+	parser.add_argument('filename', help='packet log, text or binary', metavar='LOG')
+	parser.add_argument('-o', '--output', dest="analyze", help='write the dataset to FILE', metavar='FILE')
+	parser.add_argument('-j', '--jobs', dest="jobs", type=int, help='worker processes (default: one per CPU)', metavar='NUM')
+	parser.add_argument('-O', '--origin', dest="origin", nargs=2, type=float, default=[ 37.38, -122.04 ], metavar="FLOAT", help="latitude and longitude of the receiver")
+	parser.add_argument('-e', '--fix-errors', dest="fixerrors", type=int, choices=[0, 1, 2], default=0, metavar="NUM", help="repair DF11/17/18 packets with up to NUM bit errors")
+	parser.add_argument('-T', '--track-tolerance', dest="tracktolerance", nargs=3, type=float, metavar=("METERS", "FEET", "SECS"), help="track simplification, as for main.py (0 0 0 keeps every point)")
+	parser.add_argument('--start-time', dest="starttime", type=logindex.parseTime, metavar="TIME", help="start at the first packet at or after TIME")
+	parser.add_argument('--end-time', dest="endtime", type=logindex.parseTime, metavar="TIME", help="stop at the first packet at or after TIME")
+	prefilter.addArguments(parser)
+	args = parser.parse_args()
+	analyze(args)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,29 @@
+# Where the decoder gets the time from
+#
+# The decoder, the aircraft, the CPR tracker and the aircraft registry call clock.now() for "the
+# time this frame was received".  Live, that is time.time().  Decoding a recorded log, it can be
+# the time the frame was logged instead (LogClock), so pair timeouts, track times and expiry
+# follow the log however fast it is read, see chunkreplay.py.
+# Nothing in here depends on Qt.
+#
+
+import time
+
+now = time.time
+
+# a clock which stands still at whatever time it was last set to
+class LogClock(object):
+	__slots__ = ('t',)
+
+	def __init__(self, t = 0.0):
+		self.t = t
+
+	def __call__(self):
+		return self.t
+
+# make now() the clock c, e.g. a LogClock.  Returns the clock it replaces
+def use(c):
+	global now
+	old = now
+	now = c
+	return old
@@ -0,0 +1,168 @@
+# Compact Position Reporting (CPR) decoding
+#
+# refer to C.2.6 of the ICAO annex.  Positions are sent as 17-bit fractions of a latitude/longitude
+# zone, alternating between an "even" and an "odd" zone layout.  Two ways to get back a position:
+#  - global: an even and an odd frame received close together give an unambiguous position
+#  - local: a single frame, relative to a reference position within 180 NM (airborne) or 45 NM (surface)
+# CprTracker keeps the last even and odd frame of each aircraft, and uses global decoding whenever
+# it has a fresh pair, otherwise local decoding relative to the aircraft's last known position.
+# Nothing in here depends on Qt.
+#
+
+import math
+import clock
+from bisect import bisect_right
+
+NZ = 15				# number of latitude zones (fixed)
+NBITS = 17			# CPR encoding used by airborne and surface position messages
+SCALE = float(2**NBITS)
+
+AIRBORNE_RANGE = 360.0
+SURFACE_RANGE = 90.0
+
+PAIR_TIMEOUT = 10.0		# max seconds between even and odd frames for global decoding, airborne
+SURFACE_PAIR_TIMEOUT = 50.0	# ... and for surface positions (slow movers)
+LOCAL_REF_TIMEOUT = 600.0	# an aircraft's last position is used as the local reference for this long
+MAX_RANGE = 300.0		# NM, positions further from the receiver than this are assumed bad
+
+# NL - number of longitude zones, refer to C.2.6.2
+# Computed once: the latitudes at which NL drops from 59 to 58, 58 to 57, ... 2 to 1.
+def _nlBoundaries():
+	a = 1.0 - math.cos(math.pi / (2.0 * NZ))
+	return [ math.degrees(math.acos(math.sqrt(a / (1.0 - math.cos(2.0 * math.pi / nl))))) for nl in range(4*NZ - 1, 1, -1) ]
+
+NL_BOUNDARIES = _nlBoundaries()
+
+def NL(lat):
+	return 4*NZ - 1 - bisect_right(NL_BOUNDARIES, abs(lat))
+
+# great circle distance in NM between [ lat, lon ] positions a and b
+def distance(a, b):
+	lat1 = math.radians(a[0])
+	lat2 = math.radians(b[0])
+	h = math.sin((lat2 - lat1) / 2.0)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(b[1] - a[1]) / 2.0)**2
+	return 2.0 * math.asin(min(1.0, math.sqrt(h))) * 3440.065
+
+# positive modulo
+def mod(a, b):
+	return a - b * math.floor(a / b)
+
+# Local decoding of one frame relative to reference position [ lats, lons ].  odd is 0 or 1
+def decodeLocal(ref, xz, yz, odd, _range = AIRBORNE_RANGE):
+	[lats, lons] = ref
+	yz /= SCALE
+	xz /= SCALE
+	# first latitude
+	dlat = _range / (4*NZ - odd)
+	j = math.floor(lats / dlat) + math.floor(0.5 + mod(lats, dlat) / dlat - yz)
+	rlat = dlat * (j + yz)
+	# then longitude
+	dlon = _range / max(NL(rlat) - odd, 1)
+	m = math.floor(lons / dlon) + math.floor(0.5 + mod(lons, dlon) / dlon - xz)
+	rlon = dlon * (m + xz)
+	return [rlat, rlon]
+
+# Global decoding of an even and an odd frame, each ( xz, yz ).  The position is that of the most
+# recent frame, odd if lastOdd.  Returns [ lat, lon ], or None if the two frames straddle a
+# latitude zone boundary and can't be combined.
+# Surface positions repeat every 90 degrees, ref picks the solution closest to the receiver.
+def decodeGlobal(even, odd, lastOdd, surface = False, ref = None):
+	_range = SURFACE_RANGE if surface else AIRBORNE_RANGE
+	(xz0, yz0) = (even[0] / SCALE, even[1] / SCALE)
+	(xz1, yz1) = (odd[0] / SCALE, odd[1] / SCALE)
+	dlat0 = _range / (4*NZ)
+	dlat1 = _range / (4*NZ - 1)
+	j = math.floor(59 * yz0 - 60 * yz1 + 0.5)
+	rlat0 = dlat0 * (mod(j, 60) + yz0)
+	rlat1 = dlat1 * (mod(j, 59) + yz1)
+	if surface:
+		# northern hemisphere solution, or the one 90 degrees south of it, whichever is closer to the receiver
+		if ref != None and abs(rlat0 - 90.0 - ref[0]) < abs(rlat0 - ref[0]):
+			rlat0 -= 90.0
+			rlat1 -= 90.0
+	else:
+		if rlat0 >= 270.0:
+			rlat0 -= 360.0
+		if rlat1 >= 270.0:
+			rlat1 -= 360.0
+	if rlat0 < -90.0 or rlat0 > 90.0 or rlat1 < -90.0 or rlat1 > 90.0:
+		return None
+	nl = NL(rlat0)
+	if nl != NL(rlat1):
+		return None
+	if lastOdd:
+		lat = rlat1
+		ni = max(nl - 1, 1)
+		xz = xz1
+	else:
+		lat = rlat0
+		ni = max(nl, 1)
+		xz = xz0
+	m = math.floor(xz0 * (nl - 1) - xz1 * nl + 0.5)
+	lon = (_range / ni) * (mod(m, ni) + xz)
+	if surface:
+		if ref != None:
+			# one of the four solutions 90 degrees apart lies closest to the receiver
+			lon += 90.0 * math.floor((ref[1] - lon) / 90.0 + 0.5)
+	elif lon >= 180.0:
+		lon -= 360.0
+	return [lat, lon]
+
+# Encoding, the inverse of the above (used by framegen.py): [ xz, yz ] of [ lat, lon ], odd is 0 or 1
+def encode(lat, lon, odd, surface = False):
+	_range = SURFACE_RANGE if surface else AIRBORNE_RANGE
+	dlat = _range / (4*NZ - odd)
+	yz = math.floor(SCALE * mod(lat, dlat) / dlat + 0.5)
+	rlat = dlat * (yz / SCALE + math.floor(lat / dlat))
+	dlon = _range / max(NL(rlat) - odd, 1)
+	xz = math.floor(SCALE * mod(lon, dlon) / dlon + 0.5)
+	return [ int(xz) & 0x1FFFF, int(yz) & 0x1FFFF ]
+
+# What we know about the position of one aircraft
+class CprState:
+	def __init__(self):
+		self.frames = [ None, None ]	# last even and odd frame, ( xz, yz, t, surface )
+		self.pos = None			# last decoded position, ( lat, lon, t )
+
+# Keeps the CPR state of each aircraft, by ICAO address
+class CprTracker:
+	def __init__(self):
+		self.aircraft = {}
+
+	def forget(self, aa):
+		if aa in self.aircraft:
+			del self.aircraft[aa]
+
+	# Decode a good position frame from aircraft aa.  origin is the receiver position, used as
+	# the local reference when we don't know where the aircraft is yet.
+	# Returns [ lat, lon, isGlobal ]
+	def decode(self, aa, xz, yz, odd, surface, origin, t = None):
+		if t == None:
+			t = clock.now()
+		s = self.aircraft.get(aa)
+		if s == None:
+			s = self.aircraft[aa] = CprState()
+		s.frames[odd] = (xz, yz, t, surface)
+
+		pos = None
+		other = s.frames[1 - odd]
+		if other != None and other[3] == surface:
+			timeout = SURFACE_PAIR_TIMEOUT if surface else PAIR_TIMEOUT
+			if abs(t - other[2]) <= timeout:
+				pos = decodeGlobal(s.frames[0], s.frames[1], odd, surface, origin)
+				if pos != None and distance(origin, pos) > MAX_RANGE:
+					pos = None		# frames from two different positions, or corrupt
+		isGlobal = pos != None
+
+		trusted = isGlobal
+		_range = SURFACE_RANGE if surface else AIRBORNE_RANGE
+		if pos == None and s.pos != None and t - s.pos[2] <= LOCAL_REF_TIMEOUT:
+			pos = decodeLocal(s.pos[0:2], xz, yz, odd, _range)
+			trusted = distance(origin, pos) <= MAX_RANGE
+		if not trusted:
+			# only right if the aircraft is within range of the receiver
+			pos = decodeLocal(origin, xz, yz, odd, _range)
+
+		if trusted:
+			s.pos = (pos[0], pos[1], t)
+		return [pos[0], pos[1], isGlobal]
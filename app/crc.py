@@ -0,0 +1,121 @@
+# Table-driven CRC engine for Mode S packets
+#
+# The Mode S parity field is a 24-bit CRC using generator polynomial 0x1FFF409.
+# Refer to 3.1.2.3.3 and "EUROCONTROL - CRC Calculation for Mode-S Transponders"
+#
+# Rather than walking the polynomial one bit at a time, we precompute the remainder
+# of every possible byte once at import, and then consume the message a byte at a time.
+# Everything here works on plain ints and bytearrays - no bitstring objects.
+#
+
+POLY = 0xFFF409		# 24-bit generator, implicit x^24 term
+
+# build the per-byte syndrome table
+def _buildTable():
+	table = [ 0 ] * 256
+	for i in range(256):
+		c = i << 16
+		for j in range(8):
+			if c & 0x800000:
+				c = ((c << 1) ^ POLY) & 0xFFFFFF
+			else:
+				c = (c << 1) & 0xFFFFFF
+		table[i] = c
+	return table
+
+CRC_TABLE = _buildTable()
+
+# CRC of a bytearray (or any sequence of ints 0..255), returned as a 24-bit int.
+# For a 56-bit packet pass the first 4 bytes, for a 112-bit packet the first 11.
+def calcCrc(data):
+	table = CRC_TABLE
+	crc = 0
+	for b in data:
+		crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ b]
+	return crc
+
+# CRC of an nbits-long unsigned int (nbits must be a multiple of 8)
+def calcCrcInt(value, nbits):
+	table = CRC_TABLE
+	crc = 0
+	shift = nbits - 8
+	while shift >= 0:
+		crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ ((value >> shift) & 0xFF)]
+		shift -= 8
+	return crc
+
+# Syndrome of a complete packet (7 or 14 bytes): the CRC of the data bits XOR'ed
+# with the received parity field.  Zero for a good DF11/DF17/DF18 packet, the
+# aircraft address for DF0/4/5/16/20/21.
+def syndrome(frame):
+	n = len(frame) - 3
+	pi = (frame[n] << 16) | (frame[n+1] << 8) | frame[n+2]
+	return calcCrc(frame[0:n]) ^ pi
+
+# Aircraft address of a raw frame (str, bytearray or list of ints), or None if it is too short:
+# the AA field of DF11/17/18, the address recovered from the parity for the other formats
+def frameAddress(d):
+	d = bytearray(d)
+	if len(d) < 7:
+		return None
+	df = d[0] >> 3
+	if df == 11 or df == 17 or df == 18:
+		return (d[1] << 16) | (d[2] << 8) | d[3]
+	if df < 16:
+		return syndrome(d[0:7])
+	if len(d) < 14:
+		return None
+	return syndrome(d[0:14])
+
+# ---- error correction ----
+#
+# The CRC is linear, so the syndrome of a packet with some bits flipped is the XOR of the
+# syndromes of each flipped bit on its own.  We precompute syndrome -> bit positions for
+# every 1-bit (and optionally 2-bit) error pattern, then a bad packet is repaired with a
+# single dict lookup.  Bit positions are counted from the LSB of the packet int, as in fields.py.
+# The 5 DF bits are never corrected, a flipped DF would change how the packet is decoded.
+# Syndromes reachable by more than one error pattern are ambiguous, and left out of the table.
+
+_syndromeTables = {}
+
+# syndrome of a packet of nbits which is all zero except for the bit at position pos
+def bitSyndrome(pos, nbits):
+	if pos < 24:
+		return 1 << pos
+	return calcCrcInt(1 << (pos - 24), nbits - 24)
+
+def _buildSyndromeTable(nbits, maxErrors):
+	single = [ bitSyndrome(pos, nbits) for pos in range(nbits - 5) ]
+	table = {}
+	ambiguous = set()
+	def add(s, bits):
+		if s in table:
+			ambiguous.add(s)
+		else:
+			table[s] = bits
+	for (i, si) in enumerate(single):
+		add(si, (i,))
+	if maxErrors >= 2:
+		for i in range(len(single)):
+			for j in range(i + 1, len(single)):
+				add(single[i] ^ single[j], (i, j))
+	for s in ambiguous:
+		del table[s]
+	return table
+
+# Returns the (cached) syndrome table for nbits-long packets with up to maxErrors flipped bits
+def syndromeTable(nbits, maxErrors):
+	key = (nbits, maxErrors)
+	if key not in _syndromeTables:
+		_syndromeTables[key] = _buildSyndromeTable(nbits, maxErrors)
+	return _syndromeTables[key]
+
+# Try to repair a packet with a non-zero syndrome.  Returns [ pkt, nfixed ], with nfixed 0 if
+# the syndrome doesn't match a correctable error pattern (pkt is then returned unchanged).
+def correctErrors(pkt, nbits, syn, maxErrors = 1):
+	bits = syndromeTable(nbits, maxErrors).get(syn)
+	if bits == None:
+		return [ pkt, 0 ]
+	for pos in bits:
+		pkt ^= 1 << pos
+	return [ pkt, len(bits) ]
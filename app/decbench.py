@@ -0,0 +1,211 @@
+# Replay benchmark for the decoder: throughput per DF and type code, latency and memory
+#
+# Replays a packet log (packetlog.txt, or a binary log, see binlog.py) through the
+# Qt-free decoder.Decoder, which is what qtdecoder.AdsbDecoder wraps, with nobody subscribed to
+# its events, so no message is rendered and no GUI is updated.  Each frame is timed on its own.
+# The decoder's debug prints go to a null stream while it runs, so the terminal isn't measured.
+#
+#	python decbench.py [-r REPEAT] [-c COUNT] [-o RESULTS.json] [--compare OLD.json] LOG
+#	python decbench.py -g AIRCRAFT [-c COUNT] ...
+#
+# Reports frames/sec overall and per DF (per type code for DF17/18), the median and 99th
+# percentile time per frame, and how much the process grew (resident memory, and the number
+# of aircraft held at the end).  With -o the results are saved as JSON, with the git commit they
+# were run on, and --compare prints each figure next to the one in an earlier results file.
+#
+# The corpus is read into memory first, so only decoding is timed.  -r replays it again, into
+# the same decoder, to make a short log last long enough to measure.  With -g, the corpus is
+# COUNT frames (default 100000) from AIRCRAFT synthetic aircraft instead, see framegen.py.
+#
+
+import os
+import sys
+import time
+import json
+import platform
+import binascii
+import argparse
+import subprocess
+from array import array
+import decoder
+import binlog
+
+# frames from a packet log (text or binary), as strings of 7 or 14 bytes
+def readLog(fname, count = -1):
+	if binlog.isBinLog(fname):
+		log = binlog.Reader(fname)
+		n = len(log)
+		if count >= 0:
+			n = min(count, n)
+		frames = [ str(log.frame(i)) for i in xrange(n) ]
+		log.close()
+		return frames
+	frames = []
+	for line in open(fname, "r"):
+		if count == 0:
+			break
+		s = line.strip().split()
+		try:
+			d = binascii.unhexlify("".join(s[2:]))
+		except:
+			continue
+		if len(d) == 7 or len(d) == 14:
+			frames.append(d)
+			count -= 1
+	return frames
+
+# what a frame is counted under: "DF11", "DF17 TC11", ...
+def frameKey(d):
+	df = ord(d[0]) >> 3
+	if df in (17, 18) and len(d) == 14:
+		return "DF%u TC%u" % (df, ord(d[4]) >> 3)
+	return "DF%u" % df
+
+# resident set size in bytes (Linux), else the peak from getrusage
+def rss():
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (IOError, OSError, ValueError):
+		import resource
+		r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return sys.platform == 'darwin' and r or r * 1024
+
+def percentile(s, p):
+	if len(s) == 0:
+		return 0.0
+	return s[min(len(s) - 1, int(p / 100.0 * len(s)))]
+
+class NullStream:
+	def write(self, s):
+		pass
+
+def run(frames, repeat = 1):
+	class Args:
+		origin = (37.7, -122.02)
+	dec = decoder.Decoder(Args())
+	keys = [ frameKey(d) for d in frames ]
+	times = {}			# key -> array of seconds per frame
+	for k in set(keys):
+		times[k] = array('d')
+	clock = time.time
+	decode = dec.decode
+	errors = 0
+	rss0 = rss()
+	stdout = sys.stdout
+	sys.stdout = NullStream()
+	try:
+		t0 = clock()
+		for r in range(repeat):
+			for (d, k) in zip(frames, keys):
+				t = clock()
+				try:
+					decode(d)
+				except Exception:
+					errors += 1
+				times[k].append(clock() - t)
+		elapsed = clock() - t0
+	finally:
+		sys.stdout = stdout
+	rss1 = rss()
+
+	every = array('d')
+	byKey = {}
+	for (k, a) in times.items():
+		s = sorted(a)
+		every.extend(a)
+		byKey[k] = summary(s)
+	total = summary(sorted(every))
+	total['wall_fps'] = len(every) / elapsed
+	return {
+		'frames': len(every),
+		'errors': errors,
+		'seconds': elapsed,
+		'total': total,
+		'by_type': byKey,
+		'rss_start': rss0,
+		'rss_growth': rss1 - rss0,
+		'aircraft': len(dec.recentAircraft),
+	}
+
+# count, frames/sec (over the time spent decoding them) and percentiles of seconds per frame
+def summary(s):
+	busy = sum(s)
+	return {
+		'count': len(s),
+		'fps': busy > 0 and len(s) / busy or 0.0,
+		'p50': percentile(s, 50),
+		'p99': percentile(s, 99),
+		'max': s and s[-1] or 0.0,
+	}
+
+def gitCommit():
+	try:
+		here = os.path.dirname(os.path.abspath(__file__))
+		p = subprocess.Popen(["git", "rev-parse", "--short", "HEAD"], cwd = here, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+		return p.communicate()[0].strip() or None
+	except OSError:
+		return None
+
+def report(res, old = None):
+	def line(name, s, o):
+		text = "%-14s %9u %11.0f %9.2f %9.2f" % (name, s['count'], s['fps'], s['p50'] * 1e6, s['p99'] * 1e6)
+		if o != None:
+			text += "   %11.0f %5.2fx" % (o['fps'], o['fps'] > 0 and s['fps'] / o['fps'] or 0.0)
+		print text
+	header = "%-14s %9s %11s %9s %9s" % ("Frames", "Count", "Frames/sec", "p50 us", "p99 us")
+	if old != None:
+		header += "   %11s %6s" % ("was", "speed")
+	print header
+	byOld = old and old['by_type'] or {}
+	for k in sorted(res['by_type'], key = lambda k: [ int(x[2:]) for x in k.split() ]):
+		line(k, res['by_type'][k], byOld.get(k))
+	line("all", res['total'], old and old['total'])
+	print "%u frames in %.2f s, %.0f frames/sec with the timing overhead, %u decode errors" % \
+		(res['frames'], res['seconds'], res['total']['wall_fps'], res['errors'])
+	print "memory: %.1f MB at start, grew %.1f MB, %u aircraft held at the end" % \
+		(res['rss_start'] / 1048576.0, res['rss_growth'] / 1048576.0, res['aircraft'])
+	if old != None:
+		print "compared with %s (%s)" % (old.get('commit'), old.get('date'))
+
+def main():
+	parser = argparse.ArgumentParser(description='Replay a packet log through the decoder and report its throughput')
+	parser.add_argument('log', nargs='?', help='packet log to replay')
+	parser.add_argument('-g', '--generate', type=int, help='replay frames from NUM synthetic aircraft instead of a log', metavar='NUM')
+	parser.add_argument('-c', '--count', type=int, default=-1, help='only use the first NUM frames of the log (or generate NUM frames)', metavar='NUM')
+	parser.add_argument('-r', '--repeat', type=int, default=1, help='replay the frames NUM times', metavar='NUM')
+	parser.add_argument('-o', '--output', help='save the results to FILE as JSON', metavar='FILE')
+	parser.add_argument('--compare', help='compare with the results saved in FILE', metavar='FILE')
+	args = parser.parse_args()
+
+	if args.generate:
+		import framegen
+		count = args.count > 0 and args.count or 100000
+		frames = [ d for (t, d) in framegen.FrameGenerator(args.generate).frames(count) ]
+		args.log = "synthetic, %u aircraft" % args.generate
+	elif args.log:
+		frames = readLog(args.log, args.count)
+	else:
+		parser.error("give a packet log, or -g")
+	if not frames:
+		print "No frames in %s" % args.log
+		sys.exit(1)
+	res = run(frames, args.repeat)
+	res['log'] = args.log
+	res['repeat'] = args.repeat
+	res['commit'] = gitCommit()
+	res['date'] = time.strftime("%Y-%m-%d %H:%M:%S")
+	res['python'] = platform.python_version()
+	res['platform'] = platform.platform()
+
+	old = None
+	if args.compare:
+		with open(args.compare) as f:
+			old = json.load(f)
+	report(res, old)
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(res, f, indent = 1, sort_keys = True)
+
+if __name__ == '__main__':
+	main()
@@ -1,6 +1,9 @@
 # These classes implement a decoder for Mode S packets
 # prereqs: bitstring simplekml PyUSB 
 # 	"easy_install bitstring simplekml PyUSB"
+# 	(bitstring is only used by the reference parity implementations)
+# The decoder core does not depend on Qt: it reports aircraft and messages to subscribers
+# (see observer.py).  qtdecoder.py wraps it for the GUI.
 # B. Kuschak, OpenADSB Project <brian@openadsb.com>
 # Some parts based on:
 # 	gr-air-modes # Copyright 2010, 2012 Nick Foster
@@ -12,10 +15,19 @@ import time, math
 #import simplekml
 import binascii
 import aircraft
+import clock
+import crc
+import fields
+import cpr
+import icao24
+import messages
+import observer
+import registry
+import track
 
-from PyQt4.QtCore import *
-from PyQt4.QtGui import *
 
+AGING_PACKETS = 256		# look for aircraft to age out every this many packets ...
+AGING_INTERVAL = 1.0		# ... but no more than once a second
 
 # Just a struct to hold statistics
 class DecoderStats:
@@ -40,21 +52,50 @@ class DecoderStats:
 		self.DFOther = 0
 		self.CrcErrs = 0
 		self.goodPkts = 0	# CRC good, decoded properly
+		self.correctedPkts = 0	# CRC bad, but repaired by error correction (also counted in goodPkts)
 		self.uniqueAA = 0
 		self.ACASonly = 0	# AAs that only send ACAS, not other ADS-B
 		self.IICSeen = [False] * 16; # which interrogator codes have we seen 
 		self.lastPressure = 0	# last reported pressure in mbar
 
+	# add in another decoder's counts (see pool.py); the reader's own figures are left alone
+	def add(self, other):
+		for (name, value) in vars(other).items():
+			if name == 'IICSeen':
+				self.IICSeen = [ x or y for (x, y) in zip(self.IICSeen, value) ]
+			elif name == 'lastPressure':
+				self.lastPressure = value or self.lastPressure
+			elif name not in ('logfileSize', 'rxLevel', 'badShortPkts', 'badLongPkts'):
+				setattr(self, name, getattr(self, name) + value)
+
 # This class parses and decodes the ADS-B messages.
-class AdsbDecoder(QObject):
+# Events, each with the Aircraft concerned unless noted:
+#	addAircraft, updateAircraft, updateAircraftPosition, delAircraft (when it ages out),
+#	updateStats (DecoderStats), rxLevelChanged (int), message (messages.Message)
+class Decoder(observer.Observable):
 
-	def __init__(self, args, reader):
-		QObject.__init__(self, parent = None)
+	def __init__(self, args, reader = None, airlineCodes = None):
+		observer.Observable.__init__(self)
 		self.args = args
 		self.reader = reader
-		self.recentAircraft = {}
+		self.airlineCodes = airlineCodes
+		self.registry = registry.AircraftRegistry(self.expireTimeouts(args))
+		self.recentAircraft = self.registry.aircraft	# aa -> Aircraft
+		self.lastAging = clock.now()
 		self.origin = self.args.origin
 		self.stats = DecoderStats()
+		self.cpr = cpr.CprTracker()
+		self.trackPoints = int(getattr(self.args, 'trackpoints', 0) or track.DEFAULT_CAPACITY)	# max points kept per aircraft
+		self.trackTolerance = None					# simplify tracks as they come in, None = keep every point
+		tol = getattr(self.args, 'tracktolerance', None) or (100.0, 100.0, 60.0)
+		if any(tol):
+			self.trackTolerance = track.Tolerance(*tol)
+		self.rawTrack = bool(getattr(self.args, 'rawtrack', False))	# also keep the unsimplified track
+		self.fixErrors = int(getattr(self.args, 'fixerrors', 0) or 0)	# max bits to repair in DF11/17/18, 0 = off
+		if self.fixErrors:
+			# build the syndrome tables now, rather than on the first bad packet
+			crc.syndromeTable(fields.SHORT_BITS, self.fixErrors)
+			crc.syndromeTable(fields.LONG_BITS, self.fixErrors)
 
 	def __del__(self):
 		pass
@@ -63,66 +104,120 @@ class AdsbDecoder(QObject):
 			#del self.recentAircraft[aa]
 
 
+	# per-state timeouts from --expire AIRBORNE GROUND TISB, if given
+	def expireTimeouts(self, args):
+		t = getattr(args, 'expire', None)
+		if t == None:
+			return None
+		return { registry.AIRBORNE: float(t[0]), registry.GROUND: float(t[1]), registry.TISB: float(t[2]) }
+
 	# Some statistics are maintained by the decoder, but are gleaned from the reader or elsewhere
 	def updateStats(self, rxLevel, badShort, badLong, logfilesize):
 		self.stats.logfileSize = int(logfilesize)
 		self.stats.rxLevel = int(rxLevel)
 		self.stats.badShortPkts = int(badShort)
 		self.stats.badLongPkts = int(badLong)
-		self.emit(SIGNAL("rxLevelChanged(int)"), self.stats.rxLevel)
-		self.emit(SIGNAL("updateStats(PyQt_PyObject)"), self.stats)
+		self.notify("rxLevelChanged", self.stats.rxLevel)
+		self.notify("updateStats", self.stats)
 		
 
-	# Send a message to the Qt log window
-	def logMsg(self, str):
-		txt = QString(str)
-		self.emit(SIGNAL("appendText(const QString&)"), txt)
+	# Try to repair a DF11/17/18 packet which failed parity.  Only an all-zero syndrome is
+	# expected, so DF11 replies to an interrogator (IIC/SI overlaid on the parity) can't be repaired.
+	# Returns the repaired packet, or None.
+	def correctPacket(self, pkt, nbits, syn):
+		if not self.fixErrors:
+			return None
+		[pkt, nfixed] = crc.correctErrors(pkt, nbits, syn, self.fixErrors)
+		if nfixed == 0:
+			return None
+		self.stats.correctedPkts += 1
+		return pkt
+
+	# Send a decoded message (see messages.py) to whoever is listening.  It is only
+	# rendered to text by subscribers which want text, e.g. the log window or --verbose.
+	def logMsg(self, msg):
+		if self.subscribed("message"):
+			self.notify("message", msg)
 
-	# the bitstring bit positions are a little strange:  bits[A:B], where B is one number greater than the ending bit position
+	# Packets are loaded once into an int; see fields.py for the bit numbering
 	def decode(self, d):
 		self.stats.totalPkts += 1
+		if self.stats.totalPkts % AGING_PACKETS == 0:
+			self.ageRecentAircraft()
 
-		# convert to a bitstring
-		b = bitstring.BitArray(bytearray(d))
+		[pkt, nbits] = fields.loadFrame(d)
+		df = (pkt >> (nbits - 5)) & fields.DF_MASK
+		if df < 16 and nbits > fields.SHORT_BITS:
+			# short format, only the first 56 bits are meaningful
+			pkt >>= nbits - fields.SHORT_BITS
+			nbits = fields.SHORT_BITS
 
-		df = b[0:5].uint
 		if df == 0:
-			self.DecodeDF0(b)
+			self.DecodeDF0(pkt, nbits)
 			self.stats.DF0 += 1
 		elif df == 4:
-			self.DecodeDF4(b)
+			self.DecodeDF4(pkt, nbits)
 			self.stats.DF4 += 1
 		elif df == 5:
-			self.DecodeDF5(b)
+			self.DecodeDF5(pkt, nbits)
 			self.stats.DF5 += 1
 		elif df == 11:
-			self.DecodeDF11(b)
+			self.DecodeDF11(pkt, nbits)
 			self.stats.DF11 += 1
 		elif df == 16:
-			self.DecodeDF16(b)
+			self.DecodeDF16(pkt, nbits)
 			self.stats.DF16 += 1
 		elif df == 17:
-			self.DecodeDF17(b)
+			self.DecodeDF17(pkt, nbits)
 			self.stats.DF17 += 1
 		elif df == 18:
-			self.DecodeDF18(b)
+			self.DecodeDF18(pkt, nbits)
 			self.stats.DF18 += 1
 		elif df == 20:
-			self.DecodeDF20(b)
+			self.DecodeDF20(pkt, nbits)
 			self.stats.DF20 += 1
 		elif df == 21:
-			self.DecodeDF21(b)
+			self.DecodeDF21(pkt, nbits)
 			self.stats.DF21 += 1
 		else:
 			print "  Need decoder for DF %u: " % (df), self.ba2hex(d)
 			self.stats.DFOther += 1
 	
+	# Decoding is done by the time decode() returns, so there is nothing to wait for here.
+	# Readers call this at the end of their input; see pool.DecodePool, which does buffer.
+	def flush(self):
+		pass
+
+	# Likewise nothing to stop; readers call this when their input ends, see pool.DecodePool.close.
+	def close(self):
+		pass
+
+	# Decode an (N, 14) uint8 array of packets at once, see batch.py (needs numpy).
+	# Returns a structured array with one record per packet.  With detail, packets which could
+	# update an aircraft also go through the per-packet decoder; the rest are only counted.
+	def decodeBatch(self, frames, detail = True):
+		import batch
+		frames = batch.asFrames(frames)
+		res = batch.decodeFrames(frames)
+		if detail:
+			mask = batch.needsDetail(res, self.recentAircraft.keys(), self.fixErrors > 0)
+			for i in mask.nonzero()[0]:
+				self.decode(frames[i, 0:res['nbytes'][i]])
+			batch.countStats(self.stats, res[~mask])
+		else:
+			batch.countStats(self.stats, res)
+		self.ageRecentAircraft()		# countStats adds the chunk at once, missing decode()'s check
+		return res
+
 	def ba2hex(self, d):
 		mystr = ""
 		for byte in d:
 			mystr += "%02hx " % byte
 		return mystr
 
+	def pkt2hex(self, pkt, nbits):
+		return "%0*x" % (nbits / 4, pkt)
+
 	def capabilitiesStr(self, ca):
 		if ca == 0:
 			caStr = "Level 1 transponder."
@@ -141,16 +236,19 @@ class AdsbDecoder(QObject):
 	def getOrigin(self):
 		return self.origin
 
-	def DecodeDF0(self, pkt):
+	def setOrigin(self, origin):
+		self.origin = origin
+
+	def DecodeDF0(self, pkt, nbits):
 		# Short Air-to-air surveillance
 		# 56-bit packet
-		df = pkt[0:5].uint
-		vs = pkt[5:6].uint
-		cc = pkt[6:7].uint
-		sl = pkt[8:11].uint
-		ri = pkt[13:17].uint
-		ac = pkt[19:32]
-		ap = pkt[32:56]
+		df = (pkt >> 51) & 0x1F
+		vs = (pkt >> 50) & 0x1
+		cc = (pkt >> 49) & 0x1
+		sl = (pkt >> 45) & 0x7
+		ri = (pkt >> 39) & 0xF
+		ac = (pkt >> 24) & 0x1FFF
+		ap = pkt & 0xFFFFFF
 		[alt, altStr] = self.AltitudeCode(ac)
 		if vs == 0:
 			vsStr = "Airborne"
@@ -195,47 +293,47 @@ class AdsbDecoder(QObject):
 			ccStr = "No crosslink"
 		else:
 			ccStr = "Crosslink supported"
-		crc = self.calcParity(pkt[0:32])
-		aa = crc ^ ap;	
+		crc = self.calcParity(pkt >> 24, 32)
+		aa = crc ^ ap
 
-		a = self.lookupAircraft(aa.uint)
+		a = self.lookupAircraft(aa)
 		if (a != None):
 			# AA exists in roll-call list so CRC must have been good
-			crcStr = "Aircraft ID %x." % (aa.uint)
+			crcStr = messages.Text("Aircraft ID %x.", aa)
 			a.setACASInfo(ccStr, alt, riStr, acasStr, vsStr)
-			self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+			self.notify("updateAircraft", a)
 			self.stats.goodPkts += 1
 		else:
-			crcStr = "CRC error or no all-call received yet from ID %x." % (aa.uint)
+			crcStr = messages.Text("CRC error or no all-call received yet from ID %x.", aa)
 			self.stats.CrcErrs += 1
-		self.logMsg("  DF%u (Short ACAS Air-to-Air): %s. %s. %s. %s. %s. %s. %s" % (df, vsStr, altStr, riStr, acasStr, slStr, ccStr, crcStr))
+		self.logMsg(messages.Message(df, None, aa, a != None, "  DF%u (Short ACAS Air-to-Air): %s. %s. %s. %s. %s. %s. %s", df, vsStr, altStr, riStr, acasStr, slStr, ccStr, crcStr))
 
-	def DecodeDF4(self, pkt):
+	def DecodeDF4(self, pkt, nbits):
 		# Surveillance altitude reply
 		# 56-bit packet
-		df = pkt[0:5].uint
-		fs = pkt[5:8].uint
-		dr = pkt[8:13].uint
-		um = pkt[13:19]			# fixme - ?
-		ac = pkt[19:32]
-		ap = pkt[32:56]
-		iis = um[0:4].uint
+		df = (pkt >> 51) & 0x1F
+		fs = (pkt >> 48) & 0x7
+		dr = (pkt >> 43) & 0x1F
+		um = (pkt >> 37) & 0x3F			# fixme - ?
+		ac = (pkt >> 24) & 0x1FFF
+		ap = pkt & 0xFFFFFF
+		iis = (pkt >> 39) & 0xF
 		fsStr = self.flightStatusStr(fs)
 		drStr = self.downlinkReqStr(dr)
 		[alt, altStr] = self.AltitudeCode(ac)
-		crc = self.calcParity(pkt[0:32])
-		aa = crc ^ ap;	
-		a = self.lookupAircraft(aa.uint)
+		crc = self.calcParity(pkt >> 24, 32)
+		aa = crc ^ ap
+		a = self.lookupAircraft(aa)
 		if (a != None):
 			# AA exists in roll-call list so CRC must have been good
-			crcStr = "Aircraft ID %x." % (aa.uint)
+			crcStr = messages.Text("Aircraft ID %x.", aa)
 			a.setAltitude(iis, fsStr, alt, drStr)
-			self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+			self.notify("updateAircraft", a)
 			self.stats.goodPkts += 1
 		else:
-			crcStr = "CRC error or no all-call received yet from ID %x." % (aa.uint)
+			crcStr = messages.Text("CRC error or no all-call received yet from ID %x.", aa)
 			self.stats.CrcErrs += 1
-		self.logMsg("  DF%u (Altitude Roll-Call): IID=%u. %s. %s. %s. %s" % (df, iis, fsStr, altStr, drStr, crcStr))
+		self.logMsg(messages.Message(df, None, aa, a != None, "  DF%u (Altitude Roll-Call): IID=%u. %s. %s. %s. %s", df, iis, fsStr, altStr, drStr, crcStr))
 		
 	def downlinkReqStr(self, dr):
 		if dr == 0:
@@ -275,98 +373,51 @@ class AdsbDecoder(QObject):
 			fsStr = "Reserved FS %u" % (fs)
 		return fsStr
 
+	# b is the 13-bit identity field
 	def squawkDecode(self, b):
-		# refer to section 3.1.1.6
-		# fixme - test this comparing to the Mode C/A decoding table
-		c1 = b[0:1]
-		a1 = b[1:2]
-		c2 = b[2:3]
-		a2 = b[3:4]
-		c4 = b[4:5]
-		a4 = b[5:6]
-		if b[6] != 0:
-			print "Error - expected 0 for bit 6 of mode A response."
-		b1 = b[7:8]
-		d1 = b[8:9]
-		b2 = b[9:10]
-		d2 = b[10:11]
-		b4 = b[11:12]
-		d4 = b[12:13]
-		# bitarray concatenation
-		a = a4 + a2 + a1
-		b = b4 + b2 + b1
-		c = c4 + c2 + c1
-		d = d4 + d2 + d1
-		squawk = (a.uint * 1000) + (b.uint * 100) + (c.uint * 10) + d.uint
-		return squawk
-
-	# decode 6-bit encoded characters
-	def decodeChars(self, c):
-		set1 = [' ', 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O']
-		set2 = ['P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z']
-		set3 = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
-
-		str = ""
-		while len(c) != 0:
-			b_hi = c[0:2].uint
-			b_lo = c[2:6].uint
-			if b_hi == 0:
-				if b_lo == 0:
-					str += '_'	# illegal
-				else:
-					str += set1[b_lo]	
-			elif b_hi == 1:
-				if b_lo < 0xB:
-					str += set2[b_lo] 
-				else:
-					str += '_'	# illegal
-			elif b_hi == 2:
-				str += ' '		# space
-			elif b_hi == 3:
-				if b_lo < 0xA:
-					str += set3[b_lo] 
-				else:
-					str += '_'	# illegal
-			del c[0:6]			# move to next char
-		return str
+		return fields.squawkDecode(b)
 
+	# decode 6-bit encoded characters, c is an int holding nchars characters
+	def decodeChars(self, c, nchars = 8):
+		return fields.decodeChars(c, nchars)
 
-	def DecodeDF5(self, pkt):
+
+	def DecodeDF5(self, pkt, nbits):
 		# Surveillance identity reply
 		# 56-bit packet
-		df = pkt[0:5].uint
-		fs = pkt[5:8].uint
-		dr = pkt[8:13].uint
-		um = pkt[13:19]
-		id = pkt[19:32]
-		ap = pkt[32:56]
-		iis = um[0:4].uint
+		df = (pkt >> 51) & 0x1F
+		fs = (pkt >> 48) & 0x7
+		dr = (pkt >> 43) & 0x1F
+		um = (pkt >> 37) & 0x3F
+		id = (pkt >> 24) & 0x1FFF
+		ap = pkt & 0xFFFFFF
+		iis = (pkt >> 39) & 0xF
 		fsStr = self.flightStatusStr(fs)
 		squawk = self.squawkDecode(id)
 		drStr = self.downlinkReqStr(dr)
-		crc = self.calcParity(pkt[0:32])
-		aa = crc ^ ap;	
-		a = self.lookupAircraft(aa.uint)
+		crc = self.calcParity(pkt >> 24, 32)
+		aa = crc ^ ap
+		a = self.lookupAircraft(aa)
 		if (a != None):
 			# AA exists in roll-call list so CRC must have been good
-			crcStr = "Aircraft ID %x." % (aa.uint)
+			crcStr = messages.Text("Aircraft ID %x.", aa)
 			a.setCommBIdent(squawk, fsStr, drStr)
-			self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+			self.notify("updateAircraft", a)
 			self.stats.goodPkts += 1
 		else:
-			crcStr = "CRC error or no all-call received yet from ID %x." % (aa.uint)
+			crcStr = messages.Text("CRC error or no all-call received yet from ID %x.", aa)
 			self.stats.CrcErrs += 1
-		self.logMsg( "  DF%u (Identity Reply): IID=%u. %s. Squawk %04u. %s. %s" % (df, iis, fsStr, squawk, drStr, crcStr ))
+		self.logMsg(messages.Message(df, None, aa, a != None, "  DF%u (Identity Reply): IID=%u. %s. Squawk %04u. %s. %s", df, iis, fsStr, squawk, drStr, crcStr))
 
-	def DecodeDF11(self, pkt):
+	def DecodeDF11(self, pkt, nbits):
 		# All-call reply
 		# 56-bit packet
-		df = pkt[0:5].uint
-		ca = pkt[5:8].uint
-		aa = pkt[8:32].uint
-		pi = pkt[32:56]
-		caStr = self.capabilitiesStr(ca)
-		crc = self.calcParity(pkt[0:32])
+		df = (pkt >> 51) & 0x1F
+		ca = (pkt >> 48) & 0x7
+		aa = (pkt >> 24) & 0xFFFFFF
+		pi = pkt & 0xFFFFFF
+		caStr = messages.Lookup(self.capabilitiesStr, ca)
+		crc = self.calcParity(pkt >> 24, 32)
 
 		# replies to interrogators XOR their IIC and SI with the last 7 bits of the CRC	
 		(good, ic, cl, broadcastStr) = self.checkParityInterrogator(pi, crc)
@@ -382,9 +433,13 @@ class AdsbDecoder(QObject):
 				self.stats.IICSeen[ic] = True
 				a.setIICSeen(ic)
 		else:
-			errStr = "CRC error (expected %x, rx %x)." % (crc.uint, pi.uint)
+			fixed = self.correctPacket(pkt, nbits, crc ^ pi)
+			if fixed != None:
+				# decode the repaired packet instead
+				return self.DecodeDF11(fixed, nbits)
+			errStr = messages.Text("CRC error (expected %x, rx %x).", crc, pi)
 			self.stats.CrcErrs += 1
-		self.logMsg("  DF%u (Mode S All-Call Reply): %s Aircraft ID %03hx. IIC %d, CL %d. %s %s" % (df, caStr, aa, ic, cl, broadcastStr, errStr))
+		self.logMsg(messages.Message(df, None, aa, good, "  DF%u (Mode S All-Call Reply): %s Aircraft ID %03hx. IIC %d, CL %d. %s %s", df, caStr, aa, ic, cl, broadcastStr, errStr))
 
 
 	# Problem - Mode S protocol doesn't identify the register number in the reply.  So 
@@ -394,10 +449,10 @@ class AdsbDecoder(QObject):
 	# followed by 48 user bits: 0x00, 0x02, 0x10, 0x20, 0xFE, 0xFF.  
 	# Also, DF16 packets include the register number to decode
 	def decodeBDS(self, bds, mb):
-		# Comm-B message payload, 56 bits
+		# Comm-B message payload, 56 bits (as an int)
 		# contents of a transponder register
 		#bds = mb[0:8].uint	# BDS register number for some registers
-		print "FIXME - Got BDS register 0x%x: 0x%x %s" % (bds, mb[8:].uint, self.decodeChars(mb[8:]))
+		print "FIXME - Got BDS register 0x%x: 0x%x %s" % (bds, mb & fields.CHARS_MASK, self.decodeChars(mb & fields.CHARS_MASK))
 		#print "FIXME - Got Comm-B BDS register 0x%014x %s" % (mb[0:].uint, self.decodeChars(mb[8:]))
 
 		# Comm-B register assignments (BDS)
@@ -423,17 +478,17 @@ class AdsbDecoder(QObject):
 		# 0F Reserved for ACAS
 
 		# 10 Data link capability report (register self identifies)
-		if bds == 0x10 and mb[0:8] == 0x10:
-			continues = mb[8:9]		# 1 continues in next reg
-			modes_ver = mb[16:23]  		# 0 unavailable, 1, 2, 3
-			if mb[23:24] == 0:
+		if bds == 0x10 and (mb >> 48) == 0x10:
+			continues = (mb >> 47) & 0x1		# 1 continues in next reg
+			modes_ver = (mb >> 33) & 0x7F  		# 0 unavailable, 1, 2, 3
+			if (mb >> 32) & 0x1 == 0:
 				transponderLevelStr = "2 to 4";
 			else:
 				transponderLevelStr = "5";
-			srvc_cap = mb[24:25]		# 1 available
-			uplink_throughput = mb[25:28]	# 0 none, otherwise 16 segments in 1/2n seconds
-			downlink_throughput = mb[28:32]	# 0 none
-			id_cap = mb[32:33]		# 1 id capability
+			srvc_cap = (mb >> 31) & 0x1		# 1 available
+			uplink_throughput = (mb >> 28) & 0x7	# 0 none, otherwise 16 segments in 1/2n seconds
+			downlink_throughput = (mb >> 24) & 0xF	# 0 none
+			id_cap = (mb >> 23) & 0x1		# 1 id capability
 			print "Mode S version %d, transponder level, ID capability %d." % (modes_ver, transponderLvlStr, id_cap)
 			
 		# 11-16 Reserved for extension to data link capability reports 
@@ -441,9 +496,9 @@ class AdsbDecoder(QObject):
 		# 18-1F Mode S specific services capability reports 
 
 		# 20 Aircraft identification (register self-identifies)
-		elif bds == 0x20 and mb[0:8] == 0x20:
-			if mb[8:].uint != 0:
-				acid = self.decodeChars(mb[8:])
+		elif bds == 0x20 and (mb >> 48) == 0x20:
+			if mb & fields.CHARS_MASK != 0:
+				acid = fields.decodeCallsign(mb & fields.CHARS_MASK)
 				print "Aircraft identifies as %s" % acid
 
 		# 21 Aircraft and airline registration markings 
@@ -472,11 +527,11 @@ class AdsbDecoder(QObject):
 		# 49-4F Unassigned
 		# 50 Track and turn report 
 		elif bds == 0x50:
-			roll = mb[0:11]
-			true_track = mb[11:23]
-			gnd_speed = mb[23:34]
-			track_ang_rate = mb[34:45]
-			true_airspeed = mb[45:56]
+			roll = (mb >> 45) & 0x7FF
+			true_track = (mb >> 33) & 0xFFF
+			gnd_speed = (mb >> 22) & 0x7FF
+			track_ang_rate = (mb >> 11) & 0x7FF
+			true_airspeed = mb & 0x7FF
 		
 		# 51 Position report coarse
 		# 52 Position report fine
@@ -514,25 +569,25 @@ class AdsbDecoder(QObject):
 		# FE Update Request
 		# FF Search Request
 		else:
-			print "unknown CommB register contents: %s" % mb
+			print "unknown CommB register contents: %014x" % mb
 
 
-	def DecodeDF16(self, pkt):
+	def DecodeDF16(self, pkt, nbits):
 		# Long ACAS air-to-air
 		# 112-bit packet
-		if len(pkt) < 112:
+		if nbits < 112:
 			print "short DF16 pkt"
 			return
 
 		# FIXME - some of this decoding same as DF0
-		df = pkt[0:5].uint
-		vs = pkt[5:6].uint
-		sl = pkt[8:11].uint
-		ri = pkt[13:17].uint
+		df = (pkt >> 107) & 0x1F
+		vs = (pkt >> 106) & 0x1
+		sl = (pkt >> 101) & 0x7
+		ri = (pkt >> 95) & 0xF
 		# 2 spare bits
-		ac = pkt[19:32]
-		mv = pkt[32:88]
-		ap = pkt[88:112]
+		ac = (pkt >> 80) & 0x1FFF
+		mv = (pkt >> 24) & 0xFFFFFFFFFFFFFF
+		ap = pkt & 0xFFFFFF
 
 		[alt, altStr] = self.AltitudeCode(ac)
 
@@ -643,24 +698,24 @@ class AdsbDecoder(QObject):
 		#else:
 			#print "FIXME - DF16: BDS register 0x%x = 0x%x" % (vds, mv[8:].uint)
 
-		crc = self.calcParity(pkt[0:88])
-		aa = crc ^ ap;	
-		a = self.lookupAircraft(aa.uint)
+		crc = self.calcParity(pkt >> 24, 88)
+		aa = crc ^ ap
+		a = self.lookupAircraft(aa)
 		if (a != None):
 			# AA exists in roll-call list so CRC must have been good
-			crcStr = "Aircraft ID %x." % (aa.uint)
+			crcStr = messages.Text("Aircraft ID %x.", aa)
 			a.setACASInfo(None, alt, riStr, acasStr, vsStr)
-			self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+			self.notify("updateAircraft", a)
 			self.stats.goodPkts += 1
 		else:
-			crcStr = "CRC error or no all-call received yet from ID %x." % (aa.uint)
+			crcStr = messages.Text("CRC error or no all-call received yet from ID %x.", aa)
 			self.stats.CrcErrs += 1
-		#print "  DF%u (Long Air-to-Air ACAS): Aircraft ID %03hx. %d ft. %s. %s. %s" % (df, aa.uint, alt, vsStr, acasStr, crcStr)
-		self.logMsg("  DF%u (Long Air-to-Air ACAS): Aircraft ID %03hx. %d ft. %s. %s. %s" % (df, aa.uint, alt, vsStr, acasStr, crcStr))
+		#print "  DF%u (Long Air-to-Air ACAS): Aircraft ID %03hx. %d ft. %s. %s. %s" % (df, aa, alt, vsStr, acasStr, crcStr)
+		self.logMsg(messages.Message(df, None, aa, a != None, "  DF%u (Long Air-to-Air ACAS): Aircraft ID %03hx. %d ft. %s. %s. %s", df, aa, alt, vsStr, acasStr, crcStr))
 	
 
 	# "TYPE" subcode fields are the same for DF17 and DF18
-	def DecodeCommon_DF17_DF18(self, pkt):
+	def DecodeCommon_DF17_DF18(self, pkt, nbits):
 		pass
 		posStr = ""
 		logStr = ""
@@ -670,17 +725,17 @@ class AdsbDecoder(QObject):
 
 		# 112-bit packet
 		# fixme - decode ca, me, lookup ICAO24
-		df = pkt[0:5].uint
-		ca_cf = pkt[5:8].uint	# CA field for DF17, CF field for DF18
-		aa = pkt[8:32].uint
-		me = pkt[32:88]
-		pi = pkt[88:112]
-		tc = me[0:5].uint	# type code 
-		st = me[5:8].uint	# subtype
+		df = (pkt >> 107) & 0x1F
+		ca_cf = (pkt >> 104) & 0x7	# CA field for DF17, CF field for DF18
+		aa = (pkt >> 80) & 0xFFFFFF
+		me = (pkt >> 24) & 0xFFFFFFFFFFFFFF
+		pi = pkt & 0xFFFFFF
+		tc = (me >> 51) & 0x1F	# type code 
+		st = (me >> 48) & 0x7	# subtype
 
 		# check parity, flag if bad
 		# replies to interrogators XOR their IIC and SI with the last 7 bits of the CRC	
-		crc = self.calcParity(pkt[0:88])
+		crc = self.calcParity(pkt >> 24, 88)
 		(good, ic, cl, broadcastStr) = self.checkParityInterrogator(pi, crc)
 
 		if good:
@@ -690,31 +745,35 @@ class AdsbDecoder(QObject):
 			if cl == 0:			# IC is the IIC
 				self.stats.IICSeen[ic] = True
 		else:
+			fixed = self.correctPacket(pkt, nbits, crc ^ pi)
+			if fixed != None:
+				# decode the repaired packet instead
+				return self.DecodeCommon_DF17_DF18(fixed, nbits)
 			crcgood = False
-			errStr = "CRC error (expected %x, rx %x)." % (crc.uint, pi.uint)
+			errStr = messages.Text("CRC error (expected %x, rx %x).", crc, pi)
 			self.stats.CrcErrs += 1
 
 		if aa == 0x555555:
 			aaStr = "Anonymous"
 		else:
-			aaStr = "%hx" % (aa)
+			aaStr = messages.Text("%hx", aa)
 			
 		if df == 17:
 			caStr = self.capabilitiesStr(ca_cf)
 		else:	
 			caStr = ""
 
-		tcStr = self.typeCodeStrDF17_18(tc)
+		tcStr = messages.Lookup(self.typeCodeStrDF17_18, tc)
 
 		# If this is a TIS-B message, it may have a fake AA
 		if df == 18:
-			imf = me[7:8].uint      			# ICAO/Mode A flag
+			imf = (me >> 48) & 0x1      			# ICAO/Mode A flag
 			[ nonIcaoFlag, nonIcaoStr ] = self.decodeDF18_NonICAO(ca_cf, imf)
 
 		# decode the TYPE field
 		if tc >= 1 and tc <=4:
 			# Aircraft Identification String BDS0,8
-			cat = me[5:8].uint
+			cat = (me >> 48) & 0x7
 			catStr = ""
 			if tc == 1:			# ID Set D
 				catStr = "Reserved (%u)" % (cat)
@@ -768,7 +827,7 @@ class AdsbDecoder(QObject):
 				else:
 					catStr = "Category %u" % (cat)
 
-			id = self.decodeChars(me[8:56])
+			id = fields.decodeCallsign(me & fields.CHARS_MASK)
 			if crcgood:
 				a = self.lookupAircraft(aa)
 				if a == None:
@@ -778,20 +837,20 @@ class AdsbDecoder(QObject):
 				a.setIdentityInfo(id, catStr)
 				if cl == 0:
 					a.setIICSeen(ic)
-				logStr = "Identifier: %s, %s." % (id, catStr)
-				self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+				logStr = messages.Text("Identifier: %s, %s.", id, catStr)
+				self.notify("updateAircraft", a)
 			
 		elif tc >=5 and tc <=8:
 			# Surface position BDS0,6
-			movement = me[5:12].uint
-			gtv = me[12:13].uint
-			track = me[13:20].uint
-			timesync = me[20:21].uint
-			oddeven = me[21:22].uint
-			cprlat = me[22:39].uint
-			cprlong = me[39:56].uint
-			[lat, lon] = self.decodeCPR(cprlong, cprlat, 17, 90, oddeven)
-			posStr = "at (%f, %f)" % (lat, lon)
+			movement = (me >> 44) & 0x7F
+			gtv = (me >> 43) & 0x1
+			track = (me >> 36) & 0x7F
+			timesync = (me >> 35) & 0x1
+			oddeven = (me >> 34) & 0x1
+			cprlat = (me >> 17) & 0x1FFFF
+			cprlong = me & 0x1FFFF
+			[lat, lon] = self.decodePosition(aa, cprlong, cprlat, oddeven, True, crcgood)
+			posStr = messages.Text("at (%f, %f)", lat, lon)
 			[vel, velStr] = self.decodeMovement(movement)
 			if crcgood:
 				# store aa, ONGROUND, posStr, moveStr
@@ -803,35 +862,34 @@ class AdsbDecoder(QObject):
 				a.setGroundPos(lat, lon, velStr, caStr)
 				if cl == 0:
 					a.setIICSeen(ic)
-				logStr = "%s CPR: %u, %u %s. %s." % ("Odd" if oddeven else "Even", cprlat, cprlong, posStr, velStr)
-				self.emit(SIGNAL("updateAircraftPosition(PyQt_PyObject)"), a)
+				logStr = messages.Text("%s CPR: %u, %u %s. %s.", "Odd" if oddeven else "Even", cprlat, cprlong, posStr, velStr)
+				self.notify("updateAircraftPosition", a)
 			
 		elif tc >=9 and tc <=22 and tc != 19:	
 			# Airborne position BDS0,5
-			ss = me[5:7].uint				# Surveillance Status
-			imf = me[7:8].uint      			# ICAO/Mode A flag
-			ac = me[8:20]
-			timesync = me[20:21].uint
-			oddeven = me[21:22].uint
-			cprlat = me[22:39].uint
-			cprlong = me[39:56].uint
+			ss = (me >> 49) & 0x3				# Surveillance Status
+			imf = (me >> 48) & 0x1      			# ICAO/Mode A flag
+			ac = (me >> 36) & 0xFFF
+			timesync = (me >> 35) & 0x1
+			oddeven = (me >> 34) & 0x1
+			cprlat = (me >> 17) & 0x1FFFF
+			cprlong = me & 0x1FFFF
 
 			ssStr = self.decodeSurveillanceStatus(ss)		# fixme - make note of Alert condition
 
 			# decode altitude
 			if tc >= 20 and tc <= 22:
-				alt = ac.uint				# GPS HAE (fixme - units?)
+				alt = ac				# GPS HAE (fixme - units?)
 				altStr = "%d units?" % (alt)
 				altTypeStr =  "GPS HAE"
 			else:
-				# m bit is omitted, add it back
-				ac = ac[0:6] + bitstring.BitArray(bin='0') + ac[6:12] 	
-				[alt, altStr] = self.AltitudeCode(ac)	# barometric
+				alt = fields.meAltitude(ac)[0]		# barometric
+				altStr = fields.AltitudeStr(fields.meAltToAc(ac))	# m bit is omitted, add it back
 				altTypeStr =  "barometric"
 	
 			# convert CPR to lat, lon
-			[lat, lon] = self.decodeCPR(cprlong, cprlat, 17, 360, oddeven)
-			posStr = "at (%f, %f)" % (lat, lon)
+			[lat, lon] = self.decodePosition(aa, cprlong, cprlat, oddeven, False, crcgood)
+			posStr = messages.Text("at (%f, %f)", lat, lon)
 
 			if crcgood:
 				# store aa, AIRBORNE, posStr, altStr, posUncertStr, altTypeStr
@@ -843,27 +901,27 @@ class AdsbDecoder(QObject):
 				a.setAirbornePos(lat, lon, alt, posUncertStr, altTypeStr, caStr)
 				if cl == 0:
 					a.setIICSeen(ic)
-				logStr = "%s CPR: %u, %u %s. %s." % ("Odd" if oddeven else "Even", cprlat, cprlong, posStr, ssStr)
-				self.emit(SIGNAL("updateAircraftPosition(PyQt_PyObject)"), a)
+				logStr = messages.Text("%s CPR: %u, %u %s. %s.", "Odd" if oddeven else "Even", cprlat, cprlong, posStr, ssStr)
+				self.notify("updateAircraftPosition", a)
 
 		elif tc == 19:
 			# Airborne velocity BDS0,9
-			subtype = me[5:8].uint		# Subtype 
-			icf = me[8:9].uint		# Intent change flag
-			ifr = me[9:10].uint
-			nuc = me[10:13].uint		# Navigational accuracy
-			baro = me[35:36]
-			down = me[36:37]
-			vrate = me[37:46].uint
-			diff = me[49:56].uint		# Difference between Geometric and Barometric alt
-			diff_below = me[48:49]
+			subtype = (me >> 48) & 0x7		# Subtype 
+			icf = (me >> 47) & 0x1		# Intent change flag
+			ifr = (me >> 46) & 0x1
+			nuc = (me >> 43) & 0x7		# Navigational accuracy
+			baro = (me >> 20) & 0x1
+			down = (me >> 19) & 0x1
+			vrate = (me >> 10) & 0x1FF
+			diff = me & 0x7F		# Difference between Geometric and Barometric alt
+			diff_below = (me >> 7) & 0x1
 
 			if subtype == 1 or subtype == 2:
 				# ground referenced velocity
-				west = me[13:14]
-				vel_ew = me[14:24].uint - 1
-				south = me[24:25]
-				vel_ns = me[25:35].uint - 1
+				west = (me >> 42) & 0x1
+				vel_ew = ((me >> 32) & 0x3FF) - 1
+				south = (me >> 31) & 0x1
+				vel_ns = ((me >> 21) & 0x3FF) - 1
 				if subtype == 2:
 					vel_ew *= 4		
 					vel_ns *= 4
@@ -885,17 +943,17 @@ class AdsbDecoder(QObject):
 
 			elif subtype == 3 or subtype == 4:
 				# air referenced velocity
-				heading_valid = me[13:14]
-				heading = me[14:24].uint
+				heading_valid = (me >> 42) & 0x1
+				heading = (me >> 32) & 0x3FF
 				heading = 360.0 * heading / 1024	#units of 360/1024
 				if heading_valid == False:
 					heading = 0
-				mag_heading = me[54:55]
+				mag_heading = (me >> 1) & 0x1
 				if mag_heading:
 					headingStr = "%u deg Magnetic" % heading
 				else:
 					headingStr = "%u deg True" % heading
-				vel = me[25:35].uint - 1
+				vel = ((me >> 21) & 0x3FF) - 1
 				if subtype == 4:
 					vel *= 4
 				if vel == 0:
@@ -943,18 +1001,18 @@ class AdsbDecoder(QObject):
 					a.setIICSeen(ic)
 				if baroPressure != 0:
 					self.stats.lastPressure = baroPressure
-				logStr = "Heading %s. %s. %s. %s." %  (headingStr, velStr, vertStr, diffStr)
-				self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+				logStr = messages.Text("Heading %s. %s. %s. %s.", headingStr, velStr, vertStr, diffStr)
+				self.notify("updateAircraft", a)
 
 		elif tc == 28:
 			# Emergency/Priority status or TCAS RA broadcast
 			# contents of register BDS 6,1
-			st = me[5:8].uint
+			st = (me >> 48) & 0x7
 			if st == 1:
 				# Emergency/Priority status and Mode A
-				es = me[8:11].uint
-				modea = me[11:24]
-				res = me[24:56]
+				es = (me >> 45) & 0x7
+				modea = (me >> 32) & 0x1FFF
+				res = me & 0xFFFFFFFF
 				esStr = self.decodeEmergencyStatus(es)
 				squawk = self.squawkDecode(modea)
 
@@ -967,83 +1025,83 @@ class AdsbDecoder(QObject):
 					a.setEmergStatus(squawk, esStr)
 					if cl == 0:
 						a.setIICSeen(ic)
-					logStr = "Squawk %u. %s." %  (squawk, esStr)
-					self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+					logStr = messages.Text("Squawk %u. %s.", squawk, esStr)
+					self.notify("updateAircraft", a)
 
 			elif st == 2:
 				# TCAS RA Broadcast.  See Annex 10, 4.3.8.4.2.2
 				# subtype 1 is contents of register BDS 3,0
-				ara = me[8:22]
-				rac = me[22:26]
-				ra_term = me[26:27].uint
-				multiple = me[27:28]
-				tti = me[28:30].uint
-				identity = me[30:56]
+				ara = (me >> 34) & 0x3FFF
+				rac = (me >> 30) & 0xF
+				ra_term = (me >> 29) & 0x1
+				multiple = (me >> 28) & 0x1
+				tti = (me >> 26) & 0x3
+				identity = me & 0x3FFFFFF
 
 				if multiple:
 					threatStr = "Multiple threats"
 					if ra_term:
 						threatStr += " (terminated)"
-				elif not ara[0:1]:
+				elif not (me >> 47) & 0x1:
 					threatStr = "No threats"
 				else:
 					threatStr = "Single threat"
 					if ra_term:
 						threatStr += " (terminated)"
 
-				if ara[0:1]:
+				if (me >> 47) & 0x1:
 					threatStr += ". RA is "
-					if ara[1:2]:
+					if (me >> 46) & 0x1:
 						threatStr += "corrective, "
 					else:
 						threatStr += "preventative, "
-					if ara[2:3]:
+					if (me >> 45) & 0x1:
 						threatStr += "downward, "
 					else:
 						threatStr += "upward, "
-					if ara[3:4]:
+					if (me >> 44) & 0x1:
 						threatStr += "increased rate, "
-					if ara[4:5]:
+					if (me >> 43) & 0x1:
 						threatStr += "sense reversal, "
-					if ara[5:6]:
+					if (me >> 42) & 0x1:
 						threatStr += "altitude crossing, "
-					if ara[6:7]:
+					if (me >> 41) & 0x1:
 						threatStr += "positive, "
 					else:
 						threatStr += "vert limit, "
-					if ara[7:15]:
+					if (me >> 33) & 0xFF:
 						threatStr += "ACAS 3, "
 
 				elif multiple:
-					if ara[1:2]:
+					if (me >> 46) & 0x1:
 						threatStr += "upward correction, "
-					if ara[2:3]:
+					if (me >> 45) & 0x1:
 						threatStr += "positive climb, "
-					if ara[3:4]:
+					if (me >> 44) & 0x1:
 						threatStr += "downward correction, "
-					if ara[4:5]:
+					if (me >> 43) & 0x1:
 						threatStr += "positive descend, "
-					if ara[5:6]:
+					if (me >> 42) & 0x1:
 						threatStr += "crossing, "
-					if ara[6:7]:
+					if (me >> 41) & 0x1:
 						threatStr += "sense reversal, "
-					if ara[7:15]:
+					if (me >> 33) & 0xFF:
 						threatStr += "ACAS 3, "
 				threatStr.strip(", ") 		# strip trailing comma
 				threatStr += "."
 
 				racStr = ""
-				if rac[0:1]:
+				if (me >> 33) & 0x1:
 					racStr += "Do not pass below"
-				if rac[1:2]:
+				if (me >> 32) & 0x1:
 					if len(racStr) > 0:
 						racStr += ", "
 					racStr += "Do not pass above"
-				if rac[2:3]:
+				if (me >> 31) & 0x1:
 					if len(racStr) > 0:
 						racStr += ", "
 					racStr += "Do not turn left"
-				if rac[3:4]:
+				if (me >> 30) & 0x1:
 					if len(racStr) > 0:
 						racStr += ", "
 					racStr += "Do not turn right"
@@ -1053,12 +1111,12 @@ class AdsbDecoder(QObject):
 				aid = 0
 				rangeStr = ""
 				if tti == 1:
-					aid = identity[0:24].uint				# mode S aircraft ID
+					aid = (me >> 2) & 0xFFFFFF				# mode S aircraft ID
 					rangeStr = "Threat ID: %hx" % (aid)
 				elif tti == 2:
-					[alt, altStr] = self.AltitudeCode(identity[0:13])	# altitude of threat
-					tidr = identity[13:20].uint
-					tidb = identity[20:26].uint
+					[alt, altStr] = self.AltitudeCode((me >> 13) & 0x1FFF)	# altitude of threat
+					tidr = (me >> 6) & 0x7F
+					tidb = me & 0x3F
 					if tidr == 0:
 						rangeStr = "Range unavailable. "
 					elif tidr == 127:
@@ -1082,49 +1140,49 @@ class AdsbDecoder(QObject):
 					#log in separate window by timestamp, AA, thread ID, threatStr, rangeStr
 					#snapshot other data at that time: position, alt, airspeed, heading, target alt, 
 					#keep logging until RA is terminated.
-					logStr =  "Aircraft ID %s. %s. %s. %s" %  (aaStr, threatStr, rangeStr, racStr)
+					logStr = messages.Text("Aircraft ID %s. %s. %s. %s", aaStr, threatStr, rangeStr, racStr)
 					print "FIXME - DF17/DF18 %s" % (logStr)
 				
 			else:
-				print "need decoder for DF%u, type %u, subtype %u:" % (df, tc, st), self.ba2hex(pkt)
+				print "need decoder for DF%u, type %u, subtype %u:" % (df, tc, st), self.pkt2hex(pkt, nbits)
 
 		elif tc == 29:
 			# Target State and Status
 			# subtype 1 is contents of register BDS 6,2
-			st = me[5:7].uint
+			st = (me >> 49) & 0x3
 			if st == 0:
-				vert = me[7:9].uint
-				alt_t = me[9:10].uint
-				alt_cap = me[11:13].uint
-				vmode = me[13:15].uint
-				alt = me[15:25].uint
-				horz = me[25:27].uint
-				head = me[27:36].uint
-				head_track = me[36:37].uint
-				hmode = me[37:39].uint
-				nacp = me[39:43].uint
-				nacbaro = me[43:44].uint
-				sil = me[44:46].uint
-				cap = me[51:53].uint
-				es = me[53:56].uint
+				vert = (me >> 47) & 0x3
+				alt_t = (me >> 46) & 0x1
+				alt_cap = (me >> 43) & 0x3
+				vmode = (me >> 41) & 0x3
+				alt = (me >> 31) & 0x3FF
+				horz = (me >> 29) & 0x3
+				head = (me >> 20) & 0x1FF
+				head_track = (me >> 19) & 0x1
+				hmode = (me >> 17) & 0x3
+				nacp = (me >> 13) & 0xF
+				nacbaro = (me >> 12) & 0x1
+				sil = (me >> 10) & 0x3
+				cap = (me >> 3) & 0x3
+				es = me & 0x7
 				esStr = self.decodeEmergencyStatus(es)
 				print "FIXME - DF%u Target Status: %s, %u, %u, %u, %u, %u, %u, %u, %u, %u, %u, %u, %u, %u" % (df, esStr, vert, alt_t, alt_cap, vmode, alt, horz, head, head_track, hmode, nacp, nacbaro, sil, cap)
 				
 			elif st == 1:
-				altsel = me[8:9].uint
-				alt = me[9:20].uint
-				baro = me[20:29].uint	
-				stat = me[29:30].uint
-				sign = me[30:31].uint	
-				head = me[31:39].uint
-				nacp = me[39:43].uint
-				altselValid = me[46:47].uint
-				autopilot = me[47:48].uint
-				vnav = me[48:49].uint
-				altHold = me[49:50].uint
-				adsr = me[50:51].uint
-				approachMode = me[51:52].uint
-				tcas = me[52:53].uint
+				altsel = (me >> 47) & 0x1
+				alt = (me >> 36) & 0x7FF
+				baro = (me >> 27) & 0x1FF	
+				stat = (me >> 26) & 0x1
+				sign = (me >> 25) & 0x1	
+				head = (me >> 17) & 0xFF
+				nacp = (me >> 13) & 0xF
+				altselValid = (me >> 9) & 0x1
+				autopilot = (me >> 8) & 0x1
+				vnav = (me >> 7) & 0x1
+				altHold = (me >> 6) & 0x1
+				adsr = (me >> 5) & 0x1
+				approachMode = (me >> 4) & 0x1
+				tcas = (me >> 3) & 0x1
 
 				targStr = ""
 				if alt == 0:
@@ -1157,43 +1215,43 @@ class AdsbDecoder(QObject):
 					if mbar != 0:
 						self.stats.lastPressure = mbar
 					# FIXME - update aircraft
-					logStr =  "%s. %s. %s" %  (altStr, baroStr, targStr)
+					logStr = messages.Text("%s. %s. %s", altStr, baroStr, targStr)
 					print "FIXME - DF17/DF18 %s" % (logStr)
 
 			else:
-				print "need decoder for DF%u, type %u, subtype %u:" % (df, tc, st), self.ba2hex(pkt)
+				print "need decoder for DF%u, type %u, subtype %u:" % (df, tc, st), self.pkt2hex(pkt, nbits)
 		
 		
 		elif tc == 31:
 			# Aircraft operational status, register BDS 6,5
-			st = me[5:8].uint
-			ver = me[40:43].uint
-			hrd = me[53:54].uint
+			st = (me >> 48) & 0x7
+			ver = (me >> 13) & 0x7
+			hrd = (me >> 2) & 0x1
 			ccStr = ""
 			omStr = ""
 			if st == 0:
-				cc = me[8:24]
-				om = me[24:40]
+				cc = (me >> 32) & 0xFFFF
+				om = (me >> 16) & 0xFFFF
 				ccStr = "Capabilities: "
-				if cc[0:2].uint == 0 and cc[2:3]:
+				if ((me >> 46) & 0x3) == 0 and ((me >> 45) & 0x1):
 					ccStr += "TCAS, "
-				if cc[0:2].uint == 0 and cc[3:4]:
+				if ((me >> 46) & 0x3) == 0 and ((me >> 44) & 0x1):
 					ccStr += "Ext Squitter Rx, "
-				if cc[0:2].uint == 0 and cc[6:7]:
+				if ((me >> 46) & 0x3) == 0 and ((me >> 41) & 0x1):
 					ccStr += "Air-reference velocity report, "
-				if cc[0:2].uint == 0 and cc[7:8]:
+				if ((me >> 46) & 0x3) == 0 and ((me >> 40) & 0x1):
 					ccStr += "Target-state report, "
-				if cc[0:2].uint == 0 and cc[8:10]:
+				if ((me >> 46) & 0x3) == 0 and ((me >> 38) & 0x3):
 					ccStr += "Target-change report, "
-				if cc[0:2].uint == 0 and cc[10:11]:
+				if ((me >> 46) & 0x3) == 0 and ((me >> 37) & 0x1):
 					ccStr += "UAT Rx, "
 				ccStr.strip(", ")					# remove trailing comma
 
-				if om[0:2].uint == 0 and om[2:3]:
+				if ((me >> 30) & 0x3) == 0 and ((me >> 29) & 0x1):
 					omStr += "TCAS RA active, "			# fixme - this should be indicated in table
-				if om[0:2].uint == 0 and om[3:4]:
+				if ((me >> 30) & 0x3) == 0 and ((me >> 28) & 0x1):
 					omStr += "IDENT active, "			# fixme - this should be indicated in table
-				if om[0:2].uint == 0 and om[5:6]:
+				if ((me >> 30) & 0x3) == 0 and ((me >> 26) & 0x1):
 					omStr += "Single antenna, "			# fixme - this should be indicated in table
 				omStr.strip(", ")					# remove trailing comma
 
@@ -1205,16 +1263,16 @@ class AdsbDecoder(QObject):
 						a.setFakeICAO24(True)
 					if cl == 0:
 						a.setIICSeen(ic)
-					logStr =  "Version %u. %s. %s." %  (ver, ccStr, omStr)
+					logStr = messages.Text("Version %u. %s. %s.", ver, ccStr, omStr)
 					print "FIXME - DF17/DF18 %s" % (logStr)
 					# FIXME emit signal
 
 			else:
-				print "need decoder for DF%u, type %u, subtype %u:" % (df, tc, st), self.ba2hex(pkt)
+				print "need decoder for DF%u, type %u, subtype %u:" % (df, tc, st), self.pkt2hex(pkt, nbits)
 		else:
-			print "need decoder for DF%u, type %u:" % (df, tc), self.ba2hex(pkt)
+			print "need decoder for DF%u, type %u:" % (df, tc), self.pkt2hex(pkt, nbits)
 
-		return [ df, ic, tcStr, aaStr, nonIcaoStr, logStr, errStr ]
+		return [ df, tc, aa, crcgood, ic, tcStr, aaStr, nonIcaoStr, logStr, errStr ]
 
 
 	# DF 18 uses the CF/IMF to denote non-ICAO AA.  
@@ -1243,22 +1301,22 @@ class AdsbDecoder(QObject):
 		return [ flag, nonIcaoStr ]
 
 
-	def DecodeDF17(self, pkt):
-		if len(pkt) < 112:
+	def DecodeDF17(self, pkt, nbits):
+		if nbits < 112:
 			print "short DF17 pkt"
 			return
-		[ df, ic, tcStr, aaStr, nonIcaoStr, logStr, errStr ] = self.DecodeCommon_DF17_DF18(pkt)
-		self.logMsg("  DF%u (Extended Squitter): %s Aircraft ID %s. IIC %d. %s %s" % (df, tcStr, aaStr, ic, logStr, errStr))
+		[ df, tc, aa, crcgood, ic, tcStr, aaStr, nonIcaoStr, logStr, errStr ] = self.DecodeCommon_DF17_DF18(pkt, nbits)
+		self.logMsg(messages.Message(df, tc, aa, crcgood, "  DF%u (Extended Squitter): %s Aircraft ID %s. IIC %d. %s %s", df, tcStr, aaStr, ic, logStr, errStr))
 		return
 
 
-	def DecodeDF18(self, pkt):
-		if len(pkt) < 112:
+	def DecodeDF18(self, pkt, nbits):
+		if nbits < 112:
 			print "short DF18 pkt"
 			return
 
-		[ df, ic, tcStr, aaStr, nonIcaoStr, logStr, errStr ] = self.DecodeCommon_DF17_DF18(pkt)
-		self.logMsg("  DF%u (TIS-B): %s Aircraft ID %s%s. IIC %d. %s %s" % (df, tcStr, aaStr, nonIcaoStr, ic, logStr, errStr))
+		[ df, tc, aa, crcgood, ic, tcStr, aaStr, nonIcaoStr, logStr, errStr ] = self.DecodeCommon_DF17_DF18(pkt, nbits)
+		self.logMsg(messages.Message(df, tc, aa, crcgood, "  DF%u (TIS-B): %s Aircraft ID %s%s. IIC %d. %s %s", df, tcStr, aaStr, nonIcaoStr, ic, logStr, errStr))
 		return
 
 	def decodeSurveillanceStatus(self, ss):
@@ -1424,209 +1482,127 @@ class AdsbDecoder(QObject):
 			str = "Ground speed reserved field"
 		return [vel, str]
 
-	# compact position record decoding
+	# Position from a surface or airborne CPR frame, see cpr.py.  Good frames go through the
+	# per-aircraft tracker, which decodes globally once it has an even/odd pair.  Frames which
+	# failed parity are only decoded locally around the origin, for the log.
+	def decodePosition(self, aa, xz, yz, odd, surface, crcgood):
+		if crcgood:
+			return self.cpr.decode(aa, xz, yz, odd, surface, self.origin)[0:2]
+		return self.decodeCPR(xz, yz, 17, 90 if surface else 360, odd)
+
+	# compact position record decoding, local to our origin
 	# Nb = 17 for airborne, 14 for intent, and 12 for TIS-B
 	# odd is True for odd packet, False for even
 	# range is 360.0 deg for airborne format, 90.0 deg for surface format
-	# fixme - the ODD packet seems to decode incorrectly... still a problem for some A/C
+	# Only right if the aircraft is within 180 NM (45 NM on the ground) of the origin.
 	def decodeCPR(self, xz, yz, nbits, _range, odd):
 		# refer to C.2.6.5 and C.2.6.6
-		nz = 15		# number of latitude zones (fixed)
-		yz = float(yz)	# make sure treated as floating point
-		xz = float(xz)	# make sure treated as floating point
-		_range = float(_range)	# must be floating point
-
-		# our 'reference position' within 300 miles of airborne a/c or 45 miles on ground
-		[lats, lons] = self.origin
-
-		if odd:
-			i = float(1)
-		else:
-			i = float(0)
-		# first latitude
-		dlat = _range / (4 * nz - i)
-		j = math.floor(lats / dlat) + math.floor(0.5 + (self.mod(lats, dlat, _range)/dlat) - (yz/2**nbits))
-		rlat = dlat * (j + yz/2**nbits)
-		# then longitude
-		if self.NL(rlat, nz)-i > 0:
-			dlon = _range / (self.NL(rlat, nz)-i)
-		else:	
-			dlon = _range
-		m = math.floor(lons / dlon) + math.floor(0.5 + (self.mod(lons, dlon, _range)/dlon) - (xz/2**nbits))
-		rlon = dlon * (m + xz/2**nbits)
-		return [rlat, rlon]
-
-	def mod(self, a, b, _range):
-		if a < 0:
-			a += _range
-		m = a - b * math.floor(a / b)
-		#print "a, b, m = ", a, b, m
-		return m
+		if nbits != cpr.NBITS:
+			xz <<= cpr.NBITS - nbits
+			yz <<= cpr.NBITS - nbits
+		return cpr.decodeLocal(self.origin, xz, yz, 1 if odd else 0, float(_range))
 
 	# NL - compute number of "longitude zones"
 	# refer to C.2.6.2
-	def NL(self, lat, nz):
-		nl = math.floor (2.0 * math.pi * pow(math.acos( 1.0 - ((1.0 - math.cos(math.pi/2.0/nz)) / pow(math.cos(math.pi/180.0*abs(lat)), 2.0))), -1))
-		#print "NL=", nl
-		return nl;
+	def NL(self, lat, nz = cpr.NZ):
+		return cpr.NL(lat)
 
-	def DecodeDF20(self, pkt):
+	def DecodeDF20(self, pkt, nbits):
 		# Comm-B altitude reply
 		# 112-bit packet
-		if len(pkt) < 112:
+		if nbits < 112:
 			print "short DF20 packet"
 			return
-		df = pkt[0:5].uint
-		fs = pkt[5:8].uint
-		dr = pkt[8:13].uint
-		um = pkt[13:20]
-		ac = pkt[19:32]
-		mb = pkt[32:88]		# we can't decode this since we don't know which register it is
-		ap = pkt[88:112]
-		iis = um[0:4].uint
+		df = (pkt >> 107) & 0x1F
+		fs = (pkt >> 104) & 0x7
+		dr = (pkt >> 99) & 0x1F
+		um = (pkt >> 92) & 0x7F
+		ac = (pkt >> 80) & 0x1FFF
+		mb = (pkt >> 24) & 0xFFFFFFFFFFFFFF		# we can't decode this since we don't know which register it is
+		ap = pkt & 0xFFFFFF
+		iis = (pkt >> 95) & 0xF
 		fsStr = self.flightStatusStr(fs)
 		drStr = self.downlinkReqStr(dr)
 		[alt, altStr] = self.AltitudeCode(ac)
-		crc = self.calcParity(pkt[0:88])
-		aa = crc ^ ap;	
-		a = self.lookupAircraft(aa.uint)
+		crc = self.calcParity(pkt >> 24, 88)
+		aa = crc ^ ap
+		a = self.lookupAircraft(aa)
 		if (a != None):
 			# AA exists in roll-call list so CRC must have been good
-			crcStr = "Aircraft ID %x." % (aa.uint)
+			crcStr = messages.Text("Aircraft ID %x.", aa)
 			a.setCommBAltitude(alt, iis, fsStr, drStr)
-			self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+			self.notify("updateAircraft", a)
 			self.stats.goodPkts += 1
 		else:
-			crcStr = "CRC error or no all-call received yet from ID %x." % (aa.uint)
+			crcStr = messages.Text("CRC error or no all-call received yet from ID %x.", aa)
 			self.stats.CrcErrs += 1
-		self.logMsg("  DF%u (Comm-B Altitude Reply): IID=%u. %s. %s. %s. %s" % (df, iis, altStr, fsStr, drStr, crcStr))
+		self.logMsg(messages.Message(df, None, aa, a != None, "  DF%u (Comm-B Altitude Reply): IID=%u. %s. %s. %s. %s", df, iis, altStr, fsStr, drStr, crcStr))
 
 		
-	def DecodeDF21(self, pkt):
+	def DecodeDF21(self, pkt, nbits):
 		# Comm-B identity reply
 		# 112-bit packet
-		df = pkt[0:5].uint
-		fs = pkt[5:8].uint
-		dr = pkt[8:13].uint
-		um = pkt[13:20]
-		id = pkt[19:32]
-		mb = pkt[32:88]		# we can't decode this since we don't know which register it is
-		ap = pkt[88:112]
-		iis = um[0:4].uint
+		df = (pkt >> 107) & 0x1F
+		fs = (pkt >> 104) & 0x7
+		dr = (pkt >> 99) & 0x1F
+		um = (pkt >> 92) & 0x7F
+		id = (pkt >> 80) & 0x1FFF
+		mb = (pkt >> 24) & 0xFFFFFFFFFFFFFF		# we can't decode this since we don't know which register it is
+		ap = pkt & 0xFFFFFF
+		iis = (pkt >> 95) & 0xF
 		fsStr = self.flightStatusStr(fs)
 		drStr = self.downlinkReqStr(dr)
 		squawk = self.squawkDecode(id)
-		if len(pkt) < 112:
+		if nbits < 112:
 			print "Short DF21 packet"
 			return
-		crc = self.calcParity(pkt[0:88])
-		aa = crc ^ ap;	
-		a = self.lookupAircraft(aa.uint)
+		crc = self.calcParity(pkt >> 24, 88)
+		aa = crc ^ ap
+		a = self.lookupAircraft(aa)
 		if (a != None):
 			# AA exists in roll-call list so CRC must have been good
-			crcStr = "Aircraft ID %x." % (aa.uint)
+			crcStr = messages.Text("Aircraft ID %x.", aa)
 			a.setCommBIdent(squawk, fsStr, drStr)
-			self.emit(SIGNAL("updateAircraft(PyQt_PyObject)"), a)
+			self.notify("updateAircraft", a)
 			self.stats.goodPkts += 1
 		else:
-			crcStr = "CRC error or no all-call received yet from ID %x." % (aa.uint)
+			crcStr = messages.Text("CRC error or no all-call received yet from ID %x.", aa)
 			self.stats.CrcErrs += 1
-		self.logMsg("  DF%u (Comm-B Identity Reply): IID=%u. Squawk %04u. %s. %s %s" % (df, iis, squawk, fsStr, drStr, crcStr))
+		self.logMsg(messages.Message(df, None, aa, a != None, "  DF%u (Comm-B Identity Reply): IID=%u. Squawk %04u. %s. %s %s", df, iis, squawk, fsStr, drStr, crcStr))
 
 		
 	# FIXME - this is pressure-altitude.  height = PA - 30*(1013-QNH) or PA - 1000*(29.92 - alt. setting)
+	# ac is the 13-bit AC field as an int.  Returns [ alt, altStr ], altStr is only formatted when printed
 	def AltitudeCode(self, ac):
-		# Refer to section 3.1.2.6.5.4
-		# The bit number in the ICAO annex assume this ac covers bit positions 20-32
-		if len(ac) != 13:
-			print "Bad length %u for AltitudeCode!" % (len(ac))
-			return [-1, "Bad Altitude Code" ];
-		if ac.uint == 0:
-			return [-1, "Altitude not available" ];
-		alt = 0
-		m = ac[26-20]		# feet(0) or meters(1)
-		q = ac[28-20]		
-		#print "AltitudeCode: m=%u, q=%u, ac=%s" % (m, q, ac.bin)	
-		if m:
-			ustr = "m"
-			conv = 3.2808399;	# feet per meter
-		else:
-			ustr = "ft"
-			conv = 1.0;
-			if q:
-				units = 25
-			else:
-				units = 100
-		if m == 1:
-			# altitude in meters
-			alt = (ac[20-20:26-20] + ac[27-20:32-20]).uint
-			#print "meters altitude encoding. alt = %u" % (alt)
-			conv = 3.2808399;	# feet per meter
-			return [alt*conv, "%d m (%d ft)" % (alt, alt*conv)]
-		elif q == 0:
-			# m = 0, q = 0
-			# mode c encoding - gillham code
-			# FIXME - this is pressure-altitude.  height = PA - 30*(1013-QNH) or PA - 1000*(29.92 - alt. setting)
-			c1 = ac[20-20]
-			a1 = ac[21-20]
-			c2 = ac[22-20]
-			a2 = ac[23-20]
-			c4 = ac[24-20]
-			a4 = ac[25-20]
-			x  = ac[26-20]
-			b1 = ac[27-20]
-			d1 = 0
-			b2 = ac[29-20]
-			d2 = ac[30-20]
-			b4 = ac[31-20]
-			d4 = ac[32-20]
-			code = bitstring.BitArray([d2, d4, a1, a2, a4, b1, b2, b4, c1, c2, c4])
-			alt = self.modeCtoAltitude(code.uint)
-			return [alt, "%d ft (mode c encoding)" % (alt)]
-		else:
-			# m = 0, q = 1
-			# feet
-			# 11-bit field represented by bits 20 to 25, 27 and 29 to 32 
-			n = ac[20-20:26-20] + ac[27-20:28-20] + ac[29-20:33-20]
-			alt = 25*n.uint - 1000;
-			return [alt*conv, "%d ft (direct encoding)" % (alt)]
-
-	# these three from Ron Silvernail http://control.com/thread/1011798010	
+		return [ fields.altitude(ac)[0], fields.AltitudeStr(ac) ]
+
 	def grayToBinary(self, g):
-		b = g ^ (g>>8)
-		b ^= (b>>4)
-		b ^= (b>>2)
-		b ^= (b>>1)
-		return b
+		return fields.grayToBinary(g)
 
 	def getParity(self, v):
-		v ^= (v>>16)
-		v ^= (v>>8)
-		v ^= (v>>4)
-		v &= 0xf
-		return (0x6996>>v) & 1;
+		return fields.getParity(v)
 
 	# takes a uint
 	def modeCtoAltitude(self, code):
-		c = self.grayToBinary(code & 0x7) - 1
-		if(c == 6):
-			c = 4
-		dab = code >> 3
-		if(self.getParity(dab)):
-			c = 4 - c
-		return ((self.grayToBinary(dab)*500)-1200) + (c*100)
+		return fields.modeCtoAltitude(code)
 
 	def recordAircraft(self, aa):
 		# The aircraft has been identified by an all-call reply
 		a = aircraft.Aircraft(self, aa)
-		self.recentAircraft[ aa ] =  a
-		self.emit(SIGNAL("addAircraft(PyQt_PyObject)"), a)
+		self.registry.add(a)
+		self.notify("addAircraft", a)
 		return a
 
 	def oldRecordAircraft(self, aa):
 		# The aircraft has been identified by an all-call reply
 		self.recentAircraft[ aa ] =  time.time() 
 
+	# [ airline, country, callsign ] for a flight ID, blank if we have no airline codes
+	def lookupFlightID(self, idStr):
+		if self.airlineCodes == None:
+			return [ '', '', '' ]
+		return self.airlineCodes.lookupByFlightID(idStr)
+
 	def lookupAircraft(self, aa):
 		# return TRUE if this AA is listed in our roll-call list
 		if aa in self.recentAircraft:
@@ -1641,17 +1617,17 @@ class AdsbDecoder(QObject):
 		else:
 			return False;
 
-	def ageRecentAircraft(self):
-		# remove aircraft IDs older than 5 minutes
-		for aa in self.recentAircraft.keys():
-			a = self.recentAircraft[aa]
-			t = a.getTimestamp()
-			if time.time() > (t+(2*60)):
-				print "aging %x out of queue." % (aa)
-				a.dumpTrack()
-				self.emit(SIGNAL("delAircraft()"))
-				del self.recentAircraft[aa]
-				# fixme - restart iterator after deletion
+	# remove aircraft we haven't heard from for a while, see registry.py for the timeouts
+	def ageRecentAircraft(self, now = None):
+		if now == None:
+			now = clock.now()
+		if now - self.lastAging < AGING_INTERVAL:
+			return
+		self.lastAging = now
+		for a in self.registry.expire(now):
+			print "aging %x out of queue." % (a.aa)
+			self.cpr.forget(a.aa)
+			self.notify("delAircraft", a)		# its track isn't written out, kmlServer.delAircraft is a stub
 
 	def dumpAircraftTracks(self):
 		for aa in sorted(self.recentAircraft.keys()):
@@ -1668,36 +1644,37 @@ class AdsbDecoder(QObject):
 	def printRecentAircraft(self):
 		str = "%u recent aircraft: " % (len(self.recentAircraft))
 		for aa in sorted(self.recentAircraft.keys()):
-			c = self.lookupCountry(aa)
+			c = self.recentAircraft[aa].countryStr		# looked up when the aircraft was recorded
 			if c != "":
 				str += "%x (%s), " % (aa, c)
 			else:
 				str += "%x, " % (aa)
 		print str
 
-	# Decode the 24 bit PI field
+	# Decode the 24 bit PI field (pi and crc are ints)
 	def checkParityInterrogator(self, pi, crc):
 		# CL and IC are overlaid with parity
 		par_check = crc ^ pi
-		cl = par_check[17:20].uint		# if 0, IC = IIC (interrogator code), otherwise its an SI code
-		ic = par_check[20:24].uint
+		cl = (par_check >> 4) & 0x7		# if 0, IC = IIC (interrogator code), otherwise its an SI code
+		ic = par_check & 0xF
 		if ic == 0 and cl == 0:
 			broadcastStr = "Broadcast."
 		else:
 			broadcastStr = ""
-		good = par_check[0:17].uint == 0
+		good = (par_check >> 7) == 0
 		return (good, ic, cl, broadcastStr)
 
 	# refer to 3.1.2.3.3 and "EUROCONTROL - CRC Calculation for Mode-S Transponders"
-	def calcParity(self, data):
-		# try to speed up the calculation.  It was by far taking the most CPU time
-		if(len(data) == 32):
-			return self.calcParityFast32(data)
-		elif(len(data) == 88):
-			return self.calcParityFast88(data)	
+	# data is the packet without its parity field, as an nbits-long int.
+	# Returns the 24-bit parity as an int.  Uses the table-driven engine in crc.py;
+	# the bit-loop versions below take a BitArray and are kept as a cross-check for testParity()
+	def calcParity(self, data, nbits):
+		if nbits == 32 or nbits == 88:
+			return crc.calcCrcInt(data, nbits)
 		else:
 			return 0		# shouldn't happen
-	
+
+	# bit-at-a-time reference implementations
 	def calcParityFast32(self, data):
 		poly = 0xFFFA0480
 		data = data.uint
@@ -1783,412 +1760,13 @@ class AdsbDecoder(QObject):
 		return bitstring.BitArray(uint=crc, length=24)	# 24 bit checksum
 
 
+	# lookup country assigment for an AA, see icao24.py
 	def lookupCountry(self, aa):
-		# lookup country assigment for an AA
-		# taken from http://www.libhomeradar.org/databasequery/icao24allocations.php using this:
-		# cat /tmp/tmp1 |sed "s? - ?    ?g" |awk 'BEGIN { FS = "[\t]" } { print $3 "\t" $4 "\t" $1 }' |sort |awk 'BEGIN { FS = "[\t]" } {print "elif aa >= 0x" $1 " and aa < 0x" $2 ":\n\techo \"" $3 "\"" }' > /tmp/tmp2
-		# then some additions and modifications
-		if aa >= 0xA00000 and aa < 0xADFE00:		# most common first
-			c = "USA"
-		elif aa >= 0xADFE00 and aa < 0xAF0000:		
-			c = "US Military"
-		elif aa >= 0xAF0000 and aa < 0xB00000:		
-			c = "USA"
-		elif aa >= 0x000000 and aa < 0x000000:		# then the rest
-			c = "(undefined)"
-		elif aa >= 0x004000 and aa < 0x004400:
-			c = "Zimbabwe"
-		elif aa >= 0x006000 and aa < 0x007000:
-			c = "Mozambique"
-		elif aa >= 0x008000 and aa < 0x010000:
-			c = "South Africa"
-		elif aa >= 0x010000 and aa < 0x018000:
-			c = "Egypt"
-		elif aa >= 0x018000 and aa < 0x020000:
-			c = "Libyan Arab Jamahiriya"
-		elif aa >= 0x020000 and aa < 0x028000:
-			c = "Morocco"
-		elif aa >= 0x028000 and aa < 0x030000:
-			c = "Tunisia"
-		elif aa >= 0x030000 and aa < 0x030400:
-			c = "Botswana"
-		elif aa >= 0x032000 and aa < 0x033000:
-			c = "Burundi"
-		elif aa >= 0x034000 and aa < 0x035000:
-			c = "Cameroon"
-		elif aa >= 0x035000 and aa < 0x035400:
-			c = "Comoros"
-		elif aa >= 0x036000 and aa < 0x037000:
-			c = "Congo"
-		elif aa >= 0x038000 and aa < 0x039000:
-			c = "Ivory Coast"
-		elif aa >= 0x03E000 and aa < 0x03F000:
-			c = "Gabon"
-		elif aa >= 0x040000 and aa < 0x041000:
-			c = "Ethiopia"
-		elif aa >= 0x042000 and aa < 0x043000:
-			c = "Equatorial Guinea"
-		elif aa >= 0x044000 and aa < 0x045000:
-			c = "Ghana"
-		elif aa >= 0x046000 and aa < 0x047000:
-			c = "Guinea"
-		elif aa >= 0x048000 and aa < 0x048400:
-			c = "Guinea-Bissau"
-		elif aa >= 0x04A000 and aa < 0x04A400:
-			c = "Lesotho"
-		elif aa >= 0x04C000 and aa < 0x04D000:
-			c = "Kenya"
-		elif aa >= 0x050000 and aa < 0x051000:
-			c = "Liberia"
-		elif aa >= 0x054000 and aa < 0x055000:
-			c = "Madagascar"
-		elif aa >= 0x058000 and aa < 0x059000:
-			c = "Malawi"
-		elif aa >= 0x05A000 and aa < 0x05A400:
-			c = "Maldives"
-		elif aa >= 0x05C000 and aa < 0x05D000:
-			c = "Mali"
-		elif aa >= 0x05E000 and aa < 0x05E400:
-			c = "Mauritania"
-		elif aa >= 0x060000 and aa < 0x060400:
-			c = "Mauritius"
-		elif aa >= 0x062000 and aa < 0x063000:
-			c = "Niger"
-		elif aa >= 0x064000 and aa < 0x065000:
-			c = "Nigeria"
-		elif aa >= 0x068000 and aa < 0x069000:
-			c = "Uganda"
-		elif aa >= 0x06A000 and aa < 0x06A400:
-			c = "Qatar"
-		elif aa >= 0x06C000 and aa < 0x06D000:
-			c = "Central African Republic"
-		elif aa >= 0x06E000 and aa < 0x06F000:
-			c = "Rwanda"
-		elif aa >= 0x070000 and aa < 0x071000:
-			c = "Senegal"
-		elif aa >= 0x074000 and aa < 0x074400:
-			c = "Seychelles"
-		elif aa >= 0x076000 and aa < 0x076400:
-			c = "Sierra Leone"
-		elif aa >= 0x078000 and aa < 0x079000:
-			c = "Somalia"
-		elif aa >= 0x07A000 and aa < 0x07A400:
-			c = "Swaziland"
-		elif aa >= 0x07C000 and aa < 0x07D000:
-			c = "Sudan"
-		elif aa >= 0x080000 and aa < 0x081000:
-			c = "Tanzania"
-		elif aa >= 0x084000 and aa < 0x085000:
-			c = "Chad"
-		elif aa >= 0x088000 and aa < 0x089000:
-			c = "Togo"
-		elif aa >= 0x08A000 and aa < 0x08B000:
-			c = "Zambia"
-		elif aa >= 0x08C000 and aa < 0x08D000:
-			c = "Democratic Republic of Congo"
-		elif aa >= 0x090000 and aa < 0x091000:
-			c = "Angola"
-		elif aa >= 0x094000 and aa < 0x094400:
-			c = "Benin"
-		elif aa >= 0x096000 and aa < 0x096400:
-			c = "Cape Verde"
-		elif aa >= 0x098000 and aa < 0x098400:
-			c = "Djibouti"
-		elif aa >= 0x09A000 and aa < 0x09B000:
-			c = "Gambia"
-		elif aa >= 0x09C000 and aa < 0x09D000:
-			c = "Burkina Faso"
-		elif aa >= 0x09E000 and aa < 0x09E400:
-			c = "Sao Tome and Principe"
-		elif aa >= 0x0A0000 and aa < 0x0A8000:
-			c = "Algeria"
-		elif aa >= 0x0A8000 and aa < 0x0A9000:
-			c = "Bahamas"
-		elif aa >= 0x0AA000 and aa < 0x0AA400:
-			c = "Barbados"
-		elif aa >= 0x0AB000 and aa < 0x0AB400:
-			c = "Belize"
-		elif aa >= 0x0AC000 and aa < 0x0AD000:
-			c = "Colombia"
-		elif aa >= 0x0AE000 and aa < 0x0AF000:
-			c = "Costa Rica"
-		elif aa >= 0x0B0000 and aa < 0x0B1000:
-			c = "Cuba"
-		elif aa >= 0x0B2000 and aa < 0x0B3000:
-			c = "El Salvador"
-		elif aa >= 0x0B4000 and aa < 0x0B5000:
-			c = "Guatemala"
-		elif aa >= 0x0B6000 and aa < 0x0B7000:
-			c = "Guyana"
-		elif aa >= 0x0B8000 and aa < 0x0B9000:
-			c = "Haiti"
-		elif aa >= 0x0BA000 and aa < 0x0BB000:
-			c = "Honduras"
-		elif aa >= 0x0BC000 and aa < 0x0BC400:
-			c = "Saint Vincent and the Grenadines"
-		elif aa >= 0x0BE000 and aa < 0x0BF000:
-			c = "Jamaica"
-		elif aa >= 0x0C0000 and aa < 0x0C1000:
-			c = "Nicaragua"
-		elif aa >= 0x0C2000 and aa < 0x0C3000:
-			c = "Panama"
-		elif aa >= 0x0C4000 and aa < 0x0C5000:
-			c = "Dominican Republic"
-		elif aa >= 0x0C6000 and aa < 0x0C7000:
-			c = "Trinidad and Tobago"
-		elif aa >= 0x0C8000 and aa < 0x0C9000:
-			c = "Suriname"
-		elif aa >= 0x0CA000 and aa < 0x0CA400:
-			c = "Antigua and Barbuda"
-		elif aa >= 0x0CC000 and aa < 0x0CC400:
-			c = "Grenada"
-		elif aa >= 0x0D0000 and aa < 0x0D8000:
-			c = "Mexico"
-		elif aa >= 0x0D8000 and aa < 0x0E0000:
-			c = "Venezuela"
-		elif aa >= 0x100000 and aa < 0x200000:
-			c = "Russian Federation"
-		elif aa >= 0x201000 and aa < 0x201400:
-			c = "Namibia"
-		elif aa >= 0x202000 and aa < 0x202400:
-			c = "Eritrea"
-		elif aa >= 0x300000 and aa < 0x340000:
-			c = "Italy"
-		elif aa >= 0x340000 and aa < 0x380000:
-			c = "Spain"
-		elif aa >= 0x380000 and aa < 0x3C0000:
-			c = "France"
-		elif aa >= 0x3C0000 and aa < 0x400000:
-			c = "Germany"
-		elif aa >= 0x400000 and aa < 0x440000:
-			c = "United Kingdom"
-		elif aa >= 0x400080 and aa < 0x4000FF:
-			c = "Bermuda"
-		elif aa >= 0x400100 and aa < 0x40017F:
-			c = "Bermuda"
-		elif aa >= 0x400180 and aa < 0x4001BF:
-			c = "Bermuda"
-		elif aa >= 0x424000 and aa < 0x4240FF:
-			c = "Bermuda"
-		elif aa >= 0x440000 and aa < 0x448000:
-			c = "Austria"
-		elif aa >= 0x448000 and aa < 0x450000:
-			c = "Belgium"
-		elif aa >= 0x450000 and aa < 0x458000:
-			c = "Bulgaria"
-		elif aa >= 0x458000 and aa < 0x460000:
-			c = "Denmark"
-		elif aa >= 0x460000 and aa < 0x468000:
-			c = "Finland"
-		elif aa >= 0x468000 and aa < 0x470000:
-			c = "Greece"
-		elif aa >= 0x470000 and aa < 0x478000:
-			c = "Hungary"
-		elif aa >= 0x478000 and aa < 0x480000:
-			c = "Norway"
-		elif aa >= 0x480000 and aa < 0x488000:
-			c = "Netherlands"
-		elif aa >= 0x488000 and aa < 0x490000:
-			c = "Poland"
-		elif aa >= 0x490000 and aa < 0x498000:
-			c = "Portugal"
-		elif aa >= 0x498000 and aa < 0x4A0000:
-			c = "Czech Republic"
-		elif aa >= 0x4A0000 and aa < 0x4A8000:
-			c = "Romania"
-		elif aa >= 0x4A8000 and aa < 0x4B0000:
-			c = "Sweden"
-		elif aa >= 0x4B0000 and aa < 0x4B8000:
-			c = "Switzerland"
-		elif aa >= 0x4B8000 and aa < 0x4C0000:
-			c = "Turkey"
-		elif aa >= 0x4C0000 and aa < 0x4C8000:
-			c = "Yugoslavia"
-		elif aa >= 0x4C8000 and aa < 0x4C8400:
-			c = "Cyprus"
-		elif aa >= 0x4CA000 and aa < 0x4CB000:
-			c = "Ireland"
-		elif aa >= 0x4CC000 and aa < 0x4CD000:
-			c = "Iceland"
-		elif aa >= 0x4D0000 and aa < 0x4D0400:
-			c = "Luxembourg"
-		elif aa >= 0x4D2000 and aa < 0x4D2400:
-			c = "Malta"
-		elif aa >= 0x4D4000 and aa < 0x4D4400:
-			c = "Monaco"
-		elif aa >= 0x500000 and aa < 0x500400:
-			c = "San Marino"
-		elif aa >= 0x501000 and aa < 0x501400:
-			c = "Albania"
-		elif aa >= 0x501C00 and aa < 0x502000:
-			c = "Croatia"
-		elif aa >= 0x502C00 and aa < 0x503000:
-			c = "Latvia"
-		elif aa >= 0x503C00 and aa < 0x504000:
-			c = "Lithuania"
-		elif aa >= 0x504C00 and aa < 0x505000:
-			c = "Moldova"
-		elif aa >= 0x505C00 and aa < 0x506000:
-			c = "Slovakia"
-		elif aa >= 0x506C00 and aa < 0x507000:
-			c = "Slovenia"
-		elif aa >= 0x507C00 and aa < 0x508000:
-			c = "Uzbekistan"
-		elif aa >= 0x508000 and aa < 0x510000:
-			c = "Ukraine"
-		elif aa >= 0x510000 and aa < 0x510400:
-			c = "Belarus"
-		elif aa >= 0x511000 and aa < 0x511400:
-			c = "Estonia"
-		elif aa >= 0x512000 and aa < 0x512400:
-			c = "Macedonia"
-		elif aa >= 0x513000 and aa < 0x513400:
-			c = "Bosnia and Herzegovina"
-		elif aa >= 0x514000 and aa < 0x514400:
-			c = "Georgia"
-		elif aa >= 0x515000 and aa < 0x515400:
-			c = "Tajikistan"
-		elif aa >= 0x516000 and aa < 0x516400:
-			c = "Montenegro"
-		elif aa >= 0x600000 and aa < 0x600400:
-			c = "Armenia"
-		elif aa >= 0x600800 and aa < 0x600C00:
-			c = "Azerbaijan"
-		elif aa >= 0x601000 and aa < 0x601400:
-			c = "Kyrgyzstan"
-		elif aa >= 0x601800 and aa < 0x601C00:
-			c = "Turkmenistan"
-		elif aa >= 0x680000 and aa < 0x680400:
-			c = "Bhutan"
-		elif aa >= 0x681000 and aa < 0x681400:
-			c = "Micronesia"
-		elif aa >= 0x682000 and aa < 0x682400:
-			c = "Mongolia"
-		elif aa >= 0x683000 and aa < 0x683400:
-			c = "Kazakhstan"
-		elif aa >= 0x684000 and aa < 0x684400:
-			c = "Palau"
-		elif aa >= 0x700000 and aa < 0x701000:
-			c = "Afghanistan"
-		elif aa >= 0x702000 and aa < 0x703000:
-			c = "Bangladesh"
-		elif aa >= 0x704000 and aa < 0x705000:
-			c = "Myanmar"
-		elif aa >= 0x706000 and aa < 0x707000:
-			c = "Kuwait"
-		elif aa >= 0x708000 and aa < 0x709000:
-			c = "Laos"
-		elif aa >= 0x70A000 and aa < 0x70B000:
-			c = "Nepal"
-		elif aa >= 0x70C000 and aa < 0x70C400:
-			c = "Oman"
-		elif aa >= 0x70E000 and aa < 0x70F000:
-			c = "Cambodia"
-		elif aa >= 0x710000 and aa < 0x718000:
-			c = "Saudi Arabia"
-		elif aa >= 0x718000 and aa < 0x720000:
-			c = "Korea"
-		elif aa >= 0x720000 and aa < 0x728000:
-			c = "Korea"
-		elif aa >= 0x728000 and aa < 0x730000:
-			c = "Iraq"
-		elif aa >= 0x730000 and aa < 0x738000:
-			c = "Iran"
-		elif aa >= 0x738000 and aa < 0x740000:
-			c = "Israel"
-		elif aa >= 0x740000 and aa < 0x748000:
-			c = "Jordan"
-		elif aa >= 0x748000 and aa < 0x750000:
-			c = "Lebanon"
-		elif aa >= 0x750000 and aa < 0x758000:
-			c = "Malaysia"
-		elif aa >= 0x758000 and aa < 0x760000:
-			c = "Philippines"
-		elif aa >= 0x760000 and aa < 0x768000:
-			c = "Pakistan"
-		elif aa >= 0x768000 and aa < 0x770000:
-			c = "Singapore"
-		elif aa >= 0x770000 and aa < 0x778000:
-			c = "Sri Lanka"
-		elif aa >= 0x778000 and aa < 0x780000:
-			c = "Syrian Arab Republic"
-		elif aa >= 0x780000 and aa < 0x7C0000:
-			c = "China"
-		elif aa >= 0x7C0000 and aa < 0x800000:
-			c = "Australia"
-		elif aa >= 0x800000 and aa < 0x840000:
-			c = "India"
-		elif aa >= 0x840000 and aa < 0x880000:
-			c = "Japan"
-		elif aa >= 0x880000 and aa < 0x888000:
-			c = "Thailand"
-		elif aa >= 0x888000 and aa < 0x890000:
-			c = "Vietnam"
-		elif aa >= 0x890000 and aa < 0x891000:
-			c = "Yemen"
-		elif aa >= 0x894000 and aa < 0x895000:
-			c = "Bahrain"
-		elif aa >= 0x895000 and aa < 0x895400:
-			c = "Brunei"
-		elif aa >= 0x896000 and aa < 0x897000:
-			c = "United Arab Emirates"
-		elif aa >= 0x897000 and aa < 0x897400:
-			c = "Solomon Islands"
-		elif aa >= 0x898000 and aa < 0x899000:
-			c = "Papua New Guinea"
-		elif aa >= 0x899000 and aa < 0x899400:
-			c = "Taiwan"
-		elif aa >= 0x8A0000 and aa < 0x8A8000:
-			c = "Indonesia"
-		elif aa >= 0x900000 and aa < 0x900400:
-			c = "Marshall Islands"
-		elif aa >= 0x901000 and aa < 0x901400:
-			c = "Cook Islands"
-		elif aa >= 0x902000 and aa < 0x902400:
-			c = "Samoa"
-		elif aa >= 0xC00000 and aa < 0xC40000:
-			c = "Canada"
-		elif aa >= 0xC80000 and aa < 0xC87E00:
-			c = "New Zealand"
-		elif aa >= 0xC87E00 and aa < 0xC87F00:
-			c = "New Zealand (Ground)"
-		elif aa >= 0xC87F00 and aa < 0xC88000:
-			c = "New Zealand Military"
-		elif aa >= 0xC88000 and aa < 0xC89000:
-			c = "Fiji"
-		elif aa >= 0xC8A000 and aa < 0xC8A400:
-			c = "Nauru"
-		elif aa >= 0xC8C000 and aa < 0xC8C400:
-			c = "Saint Lucia"
-		elif aa >= 0xC8D000 and aa < 0xC8D400:
-			c = "Tonga"
-		elif aa >= 0xC8E000 and aa < 0xC8E400:
-			c = "Kiribati"
-		elif aa >= 0xC90000 and aa < 0xC90400:
-			c = "Vanuatu"
-		elif aa >= 0xE00000 and aa < 0xE40000:
-			c = "Argentina"
-		elif aa >= 0xE40000 and aa < 0xE80000:
-			c = "Brazil"
-		elif aa >= 0xE80000 and aa < 0xE81000:
-			c = "Chile"
-		elif aa >= 0xE84000 and aa < 0xE85000:
-			c = "Ecuador"
-		elif aa >= 0xE88000 and aa < 0xE89000:
-			c = "Paraguay"
-		elif aa >= 0xE8C000 and aa < 0xE8D000:
-			c = "Peru"
-		elif aa >= 0xE90000 and aa < 0xE91000:
-			c = "Uruguay"
-		elif aa >= 0xE94000 and aa < 0xE95000:
-			c = "Bolivia"
-		elif aa >= 0xF00000 and aa < 0xF08000:
-			c = "ICAO (1)"
-		elif aa >= 0xF09000 and aa < 0xF09400:
-			c = "ICAO (3)"
-		else:
-			c = ""	
-		return c
+		return icao24.allocations().lookupCountry(aa)
+
+	# True if the AA belongs to a military allocation
+	def isMilitary(self, aa):
+		return icao24.allocations().isMilitary(aa)
 
 	# Haversine formula example in Python
 	# return distance in km bewteen origin and position (not incl altitude)
@@ -2227,21 +1805,39 @@ class AdsbDecoder(QObject):
 	def testParity(self):
 		# Test the parity checker
 		d = bitstring.BitArray(hex='0x5D3C6614')
-		pe = bitstring.BitArray(hex='0xc315d2')
-		pc = calcParity(d)
+		pe = 0xc315d2
+		pc = self.calcParity(d.uint, len(d))
 		if pe != pc: 
 			print "Parity check failed on %d bit input:" % (len(d)), pe, pc
 		else:
 			print "Parity check successful on %d bit input:" % (len(d)), pe, pc
 
 		d = bitstring.BitArray(hex='0x8F45AC5260BDF348222A58')
-		pe = bitstring.BitArray(hex='0xB98284')
-		pc = calcParity(d)
+		pe = 0xB98284
+		pc = self.calcParity(d.uint, len(d))
 		if pe != pc: 
 			print "Parity check failed on %d bit input:" % (len(d)), pe, pc
 		else:
 			print "Parity check successful on %d bit input:" % (len(d)), pe, pc
 
+		# cross-check the table-driven CRC against the bit-loop and dump1090 implementations
+		import random
+		errs = 0
+		for i in range(1000):
+			for nbits in (32, 88):
+				d = bitstring.BitArray(uint=random.getrandbits(nbits), length=nbits)
+				pc = self.calcParity(d.uint, len(d))
+				if nbits == 32:
+					pr = self.calcParityFast32(d).uint
+				else:
+					pr = self.calcParityFast88(d).uint
+				pa = self.calcParityAlternate(d).uint
+				pb = crc.calcCrc(bytearray(d.bytes))
+				if pc != pr or pc != pa or pc != pb:
+					print "Parity mismatch on %s: table %x, bit loop %x, alternate %x, bytes %x" % (d.hex, pc, pr, pa, pb)
+					errs += 1
+		print "Parity cross-check: %u mismatches" % (errs)
+
 	def testPackets(self):
 		#d = (0xa8, 0x00, 0x0b, 0x0a, 0x10, 0x01, 0x00, 0x00)
 		#d = (0x5d, 0xae, 0x01, 0x3f, 0x79, 0x48, 0xba, 0x00, 0x00, 0x00, 0x00, 0x00, 0x09, 0x50)
@@ -2386,5 +1982,6 @@ if __name__ == "__main__":
 	args = a
 	args.origin = (37.7, -122.02)
 	reader = None
-	d = AdsbDecoder(args, reader)
+	d = Decoder(args, reader)
+	d.testParity()
 	d.testPackets()
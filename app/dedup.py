@@ -0,0 +1,104 @@
+# Cross-feed de-duplication of raw frames, for several receivers merged into one display
+#
+# When two receivers (USB dongles, network feeds, the client/server ingest) hear the same
+# transmission, each reader would decode and count it.  Readers sharing a DedupCache ask it
+# first: a frame whose exact bytes another feed already reported within the last window seconds
+# is a duplicate, and is not decoded again.  The same bytes from the same feed are a new
+# transmission (a receiver can't hear one transmission twice), e.g. repeated DF11 replies.
+#
+# Frames are kept in a dict keyed on their bytes, with a bitmask of the feeds which heard them,
+# and in a deque in arrival order.  Arrival times only increase, so expired frames are always
+# at the left of the deque: insert and expiry are both O(1).
+# When a frame expires, its bitmask is final, and goes into each feed's coverage counts.
+# Readers run in their own threads, so everything is done under a lock.
+# Nothing in here depends on Qt.
+#
+
+import time
+import threading
+from collections import deque
+
+DEFAULT_WINDOW = 1.0		# seconds
+
+# coverage counts for one feed
+class Feed(object):
+	def __init__(self, name, bit):
+		self.name = name
+		self.bit = bit
+		self.heard = 0			# frames this feed heard (expired ones only)
+		self.first = 0			# ... of which it reported first, and were decoded from it
+		self.exclusive = 0		# ... of which no other feed heard
+		self.duplicates = 0		# frames dropped because another feed reported them first
+
+class DedupCache(object):
+	def __init__(self, window = DEFAULT_WINDOW):
+		self.window = window
+		self.feeds = []
+		self.frames = {}		# frame bytes -> [ arrival time, bitmask of feeds, first feed ]
+		self.order = deque()		# ( arrival time, frame bytes ), oldest on the left
+		self.lock = threading.Lock()
+
+	def addFeed(self, name):
+		with self.lock:
+			f = Feed(name, 1 << len(self.feeds))
+			self.feeds.append(f)
+			return f
+
+	# True if the frame d from feed should be decoded, False if it is a duplicate
+	def check(self, feed, d, now = None):
+		if not isinstance(d, str):
+			d = str(bytearray(d))
+		with self.lock:
+			if now == None:
+				now = time.time()		# under the lock, so arrival times only increase
+			self.expire(now)
+			e = self.frames.get(d)
+			if e != None and not e[1] & feed.bit:
+				e[1] |= feed.bit
+				feed.duplicates += 1
+				return False
+			if e != None:
+				self.count(e)		# the same feed again: a new transmission
+			self.frames[d] = [ now, feed.bit, feed ]
+			self.order.append((now, d))
+			return True
+
+	# forget frames older than the window; call with the lock held
+	def expire(self, now):
+		order = self.order
+		frames = self.frames
+		limit = now - self.window
+		while order and order[0][0] <= limit:
+			(t, d) = order.popleft()
+			e = frames.get(d)
+			if e != None and e[0] == t:
+				del frames[d]
+				self.count(e)
+
+	def count(self, e):
+		(t, mask, first) = e
+		first.first += 1
+		for f in self.feeds:
+			if mask & f.bit:
+				f.heard += 1
+				if mask == f.bit:
+					f.exclusive += 1
+
+	# coverage counts, including frames still in the window:
+	# [ ( feed name, heard, first, exclusive, duplicates ), ... ]
+	def coverage(self):
+		with self.lock:
+			counts = dict([ (f, [ f.heard, f.first, f.exclusive ]) for f in self.feeds ])
+			for (t, mask, first) in self.frames.values():
+				counts[first][1] += 1
+				for f in self.feeds:
+					if mask & f.bit:
+						counts[f][0] += 1
+						if mask == f.bit:
+							counts[f][2] += 1
+			return [ tuple([ f.name ] + counts[f] + [ f.duplicates ]) for f in self.feeds ]
+
+	def printCoverage(self):
+		print "%-30s %10s %10s %10s %10s" % ("Feed", "Heard", "First", "Only", "Duplicate")
+		for c in self.coverage():
+			print "%-30s %10u %10u %10u %10u" % c
@@ -0,0 +1,174 @@
+# Regression check and benchmark for the integer field extraction core (fields.py, crc.py)
+#
+# Replays a recorded packetlog.txt and, for every packet, extracts the same fields twice:
+# once with the original bitstring slicing code (kept here as the reference), and once
+# with the shift/mask core used by the decoder.  Any mismatch is printed.
+# With --bench, also reports the per-packet time of each path.
+#
+#	python fieldcheck.py packetlog.txt [--bench] [-c NUM]
+#
+
+import sys
+import time
+import argparse
+import binascii
+import bitstring
+import fields
+import crc
+
+# ---- reference implementation, the bitstring path the decoder used to take ----
+
+def refParity(data):
+	poly = 0xFFFA0480
+	if len(data) == 32:
+		data = data.uint
+		for i in range(32):
+			if (data & 0x80000000):
+				data ^= poly
+			data = (data<<1) & 0xFFFFFFFF
+		return data >> 8
+	data0 = data[0:32].uint
+	data1 = data[32:64].uint
+	data2 = data[64:88].uint << 8
+	for i in range(88):
+		if (data0 & 0x80000000):
+			data0 ^= poly
+		data0 = ((data0<<1) | (data1>>31)) & 0xFFFFFFFF
+		data1 = ((data1<<1) | (data2>>31)) & 0xFFFFFFFF
+		data2 = ((data2<<1)) & 0xFFFFFFFF
+	return data0 >> 8
+
+def refSquawk(b):
+	a = b[5:6] + b[3:4] + b[1:2]
+	bb = b[11:12] + b[9:10] + b[7:8]
+	c = b[4:5] + b[2:3] + b[0:1]
+	d = b[12:13] + b[10:11] + b[8:9]
+	return (a.uint * 1000) + (bb.uint * 100) + (c.uint * 10) + d.uint
+
+def refChars(c):
+	set1 = [' ', 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O']
+	set2 = ['P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z']
+	set3 = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
+	str = ""
+	c = bitstring.BitArray(c)
+	while len(c) != 0:
+		b_hi = c[0:2].uint
+		b_lo = c[2:6].uint
+		if b_hi == 0:
+			if b_lo == 0:
+				str += '_'
+			else:
+				str += set1[b_lo]
+		elif b_hi == 1:
+			if b_lo < 0xB:
+				str += set2[b_lo]
+			else:
+				str += '_'
+		elif b_hi == 2:
+			str += ' '
+		elif b_hi == 3:
+			if b_lo < 0xA:
+				str += set3[b_lo]
+			else:
+				str += '_'
+		del c[0:6]
+	return str
+
+def refAltitude(ac):
+	if ac.uint == 0:
+		return [-1, "Altitude not available" ]
+	m = ac[26-20]
+	q = ac[28-20]
+	if m:
+		alt = (ac[20-20:26-20] + ac[27-20:32-20]).uint
+		conv = 3.2808399
+		return [alt*conv, "%d m (%d ft)" % (alt, alt*conv)]
+	elif q == 0:
+		code = bitstring.BitArray([ac[30-20], ac[32-20], ac[21-20], ac[23-20], ac[25-20], ac[27-20], ac[29-20], ac[31-20], ac[20-20], ac[22-20], ac[24-20]])
+		alt = fields.modeCtoAltitude(code.uint)
+		return [alt, "%d ft (mode c encoding)" % (alt)]
+	else:
+		n = ac[20-20:26-20] + ac[27-20:28-20] + ac[29-20:33-20]
+		alt = 25*n.uint - 1000
+		return [alt*1.0, "%d ft (direct encoding)" % (alt)]
+
+def refFields(d):
+	b = bitstring.BitArray(bytearray(d))
+	n = len(b)
+	df = b[0:5].uint
+	r = [ df, refParity(b[0:n-24]) ^ b[n-24:n].uint, refAltitude(b[19:32]), refSquawk(b[19:32]) ]
+	if n == 112 and (df == 17 or df == 18):
+		me = b[32:88]
+		ac = me[8:20]
+		ac = ac[0:6] + bitstring.BitArray(bin='0') + ac[6:12]
+		r += [ b[8:32].uint, me[0:5].uint, refChars(me[8:56]), refAltitude(ac), me[21:22].uint, me[22:39].uint, me[39:56].uint ]
+	return r
+
+# ---- the integer core ----
+
+def intFields(d):
+	[pkt, n] = fields.loadFrame(d)
+	df = (pkt >> (n - 5)) & fields.DF_MASK
+	ac = (pkt >> (n - 32)) & fields.AC_MASK
+	r = [ df, crc.calcCrcInt(pkt >> fields.DATA_SHIFT, n - 24) ^ (pkt & fields.PARITY_MASK), fields.altitudeCode(ac), fields.squawkDecode(ac) ]
+	if n == 112 and (df == 17 or df == 18):
+		me = (pkt >> 24) & fields.ME_MASK
+		r += [ (pkt >> 80) & fields.AA_MASK, me >> 51, fields.decodeCallsign(me & fields.CHARS_MASK), fields.altitudeCode(fields.meAltToAc((me >> 36) & 0xFFF)),
+			(me >> 34) & 0x1, (me >> 17) & 0x1FFFF, me & 0x1FFFF ]
+	return r
+
+def readPackets(fname, count):
+	pkts = []
+	for line in open(fname, "r"):
+		if count == 0:
+			break
+		s = line.strip().split()
+		if len(s) < 3:
+			continue
+		try:
+			d = binascii.unhexlify("".join(s[2:]))
+		except TypeError:
+			continue
+		if len(d) == 7 or len(d) == 14:
+			pkts.append(d)
+			count -= 1
+	return pkts
+
+def timePath(f, pkts):
+	start = time.time()
+	for d in pkts:
+		f(d)
+	return (time.time() - start) / len(pkts)
+
+def main():
+	parser = argparse.ArgumentParser(description="Compare the integer field core against the bitstring reference")
+	parser.add_argument('filename', metavar="FILE", help="previously recorded packetlog FILE")
+	parser.add_argument('-c', '--count', dest="count", type=int, default=-1, metavar="NUM", help="how many packets to check")
+	parser.add_argument('-b', '--bench', dest="bench", action="store_true", help="also time both paths")
+	args = parser.parse_args()
+
+	pkts = readPackets(args.filename, args.count)
+	if len(pkts) == 0:
+		print "No packets in %s" % (args.filename)
+		sys.exit(1)
+
+	errs = 0
+	for d in pkts:
+		ref = refFields(d)
+		new = intFields(d)
+		if ref != new:
+			errs += 1
+			print "Mismatch on %s:\n  bitstring: %s\n  integer:   %s" % (binascii.hexlify(d), ref, new)
+	print "%u packets checked, %u mismatches" % (len(pkts), errs)
+
+	if args.bench:
+		tRef = timePath(refFields, pkts)
+		tNew = timePath(intFields, pkts)
+		print "bitstring: %.1f us/packet" % (tRef * 1e6)
+		print "integer:   %.1f us/packet" % (tNew * 1e6)
+		print "speedup:   %.1fx" % (tRef / tNew)
+
+	sys.exit(errs != 0)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,210 @@
+# Integer field extraction for Mode S packets
+#
+# A packet is loaded once into a single Python int, MSB first, and fields are read with
+# shifts and masks rather than by slicing bitstring objects (each slice allocated a new object).
+# In the decoder, a field at ICAO annex bits [A:B] of an N-bit packet is (pkt >> (N-B)) & mask,
+# and likewise for the 56-bit ME/MB fields.  Nothing in here depends on Qt.
+#
+
+import binascii
+
+SHORT_BITS = 56
+LONG_BITS = 112
+
+# shift/mask constants for the fields common to every packet
+DF_MASK = 0x1F
+SHORT_DF_SHIFT = SHORT_BITS - 5
+LONG_DF_SHIFT = LONG_BITS - 5
+PARITY_MASK = 0xFFFFFF		# AP or PI field, last 24 bits
+DATA_SHIFT = 24			# everything before the parity field
+AA_SHIFT = 24			# AA field of DF11/17/18, bits 8:32 of the data
+AA_MASK = 0xFFFFFF
+ME_MASK = 0xFFFFFFFFFFFFFF	# 56-bit ME/MB/MV field of a long packet
+AC_MASK = 0x1FFF		# 13-bit AC/ID field, bits 19:32
+CHARS_MASK = 0xFFFFFFFFFFFF	# 48-bit, 8-character identification field
+
+# Load a packet (str, bytearray or array of bytes) into an int.  Returns [ pkt, nbits ]
+def loadFrame(d):
+	b = bytearray(d)
+	return [ int(binascii.hexlify(b), 16), len(b) * 8 ]
+
+# decode 6-bit encoded characters.  c is an int holding nchars characters, first character in the MSBs
+CHARSET = "_ABCDEFGHIJKLMNOPQRSTUVWXYZ_____" + " " * 16 + "0123456789______"	# '_' marks illegal codes
+CHARPAIRS = [ a + b for a in CHARSET for b in CHARSET ]		# every 12-bit pair of characters
+def decodeChars(c, nchars = 8):
+	str = ""
+	shift = 6 * (nchars - 1)
+	while shift >= 0:
+		str += CHARSET[(c >> shift) & 0x3F]
+		shift -= 6
+	return str
+
+# Identification squitters repeat the same callsign over and over, so remember the last few
+CALLSIGN_CACHE_SIZE = 256
+_callsignCache = {}
+
+# 48-bit identification field to its 8-character callsign, two characters per table lookup
+def decodeCallsign(c):
+	str = _callsignCache.get(c)
+	if str == None:
+		str = CHARPAIRS[c >> 36] + CHARPAIRS[(c >> 24) & 0xFFF] + CHARPAIRS[(c >> 12) & 0xFFF] + CHARPAIRS[c & 0xFFF]
+		if len(_callsignCache) >= CALLSIGN_CACHE_SIZE:
+			_callsignCache.clear()
+		_callsignCache[c] = str
+	return str
+
+# the other way, up to 8 characters (padded with spaces) to a 48-bit identification field
+def encodeChars(str, nchars = 8):
+	c = 0
+	for ch in str.upper().ljust(nchars)[0:nchars]:
+		c = (c << 6) | CHARSET.index(ch)
+	return c
+
+# 13-bit Mode A identity field (C1 A1 C2 A2 C4 A4 X B1 D1 B2 D2 B4 D4) to a 4-digit squawk
+def _decodeSquawk(b):
+	a = (((b >> 7) & 1) << 2) | (((b >> 9) & 1) << 1) | ((b >> 11) & 1)
+	bb = (((b >> 1) & 1) << 2) | (((b >> 3) & 1) << 1) | ((b >> 5) & 1)
+	c = (((b >> 8) & 1) << 2) | (((b >> 10) & 1) << 1) | ((b >> 12) & 1)
+	d = ((b & 1) << 2) | (((b >> 2) & 1) << 1) | ((b >> 4) & 1)
+	return (a * 1000) + (bb * 100) + (c * 10) + d
+
+SQUAWK_TABLE = [ _decodeSquawk(b) for b in range(8192) ]
+
+def squawkDecode(b):
+	# refer to section 3.1.1.6
+	if b & 0x40:
+		print "Error - expected 0 for bit 6 of mode A response."
+	return SQUAWK_TABLE[b]
+
+# 4-digit squawk to its 13-bit identity field
+SQUAWK_CODES = dict([ (SQUAWK_TABLE[b], b) for b in range(8192) if not b & 0x40 ])
+def squawkEncode(squawk):
+	return SQUAWK_CODES[squawk]
+
+# Bit i (numbered from the MSB, as in the ICAO annex, 0 = bit 20) of a 13-bit AC field
+def _acBit(ac, i):
+	return (ac >> (12 - i)) & 1
+
+# Altitude encodings of the 13-bit AC field
+ALT_NONE = 0		# all zeros, altitude not available
+ALT_METRIC = 1		# M bit set, meters
+ALT_GILLHAM = 2		# M = 0, Q = 0, mode C gillham code, 100 ft steps
+ALT_DIRECT = 3		# M = 0, Q = 1, binary, 25 ft steps
+
+FEET_PER_METER = 3.2808399
+
+# The AC field only has 8192 values, so every one is decoded once (on first use) into
+# ( altitude in feet, unit, encoding ), and the decoder just indexes the table.
+# Altitude is -1 when not available.  Strings are only built by altitudeStr(), for display.
+_altTable = None
+_meAltTable = None
+
+# FIXME - this is pressure-altitude.  height = PA - 30*(1013-QNH) or PA - 1000*(29.92 - alt. setting)
+# bit-by-bit decode of one AC field, only used to build the table
+def _decodeAltitude(ac):
+	# Refer to section 3.1.2.6.5.4
+	# The bit number in the ICAO annex assume this ac covers bit positions 20-32
+	if ac == 0:
+		return (-1, "", ALT_NONE)
+	m = _acBit(ac, 26-20)		# feet(0) or meters(1)
+	q = _acBit(ac, 28-20)
+	if m:
+		return (_metricAltitude(ac) * FEET_PER_METER, "m", ALT_METRIC)
+	elif q == 0:
+		# m = 0, q = 0
+		# mode c encoding - gillham code, reordered as D2 D4 A1 A2 A4 B1 B2 B4 C1 C2 C4
+		code = 0
+		for i in (30, 32, 21, 23, 25, 27, 29, 31, 20, 22, 24):
+			code = (code << 1) | _acBit(ac, i-20)
+		return (modeCtoAltitude(code), "ft", ALT_GILLHAM)
+	else:
+		# m = 0, q = 1
+		# 11-bit field represented by bits 20 to 25, 27 and 29 to 32
+		n = ((ac >> 7) << 5) | (_acBit(ac, 27-20) << 4) | (ac & 0xF)
+		return (float(25*n - 1000), "ft", ALT_DIRECT)
+
+# altitude in meters, bits 20 to 25 and 27 to 31
+def _metricAltitude(ac):
+	return ((ac >> 7) << 5) | ((ac >> 1) & 0x1F)
+
+def altitudeTable():
+	global _altTable
+	if _altTable == None:
+		_altTable = [ _decodeAltitude(ac) for ac in range(8192) ]
+	return _altTable
+
+# ( altitude_ft, unit, encoding ) of a 13-bit AC field
+def altitude(ac):
+	return (_altTable or altitudeTable())[ac]
+
+# ( altitude_ft, unit, encoding ) of the 12-bit altitude field of an airborne position message
+def meAltitude(ac):
+	global _meAltTable
+	if _meAltTable == None:
+		t = altitudeTable()
+		_meAltTable = [ t[meAltToAc(x)] for x in range(4096) ]
+	return _meAltTable[ac]
+
+# display string for a 13-bit AC field
+def altitudeStr(ac):
+	(alt, unit, enc) = altitude(ac)
+	if enc == ALT_NONE:
+		return "Altitude not available"
+	elif enc == ALT_METRIC:
+		return "%d m (%d ft)" % (_metricAltitude(ac), alt)
+	elif enc == ALT_GILLHAM:
+		return "%d ft (mode c encoding)" % (alt)
+	else:
+		return "%d ft (direct encoding)" % (alt)
+
+# Stands in for an altitude string until it is formatted
+class AltitudeStr(object):
+	__slots__ = ('ac',)
+
+	def __init__(self, ac):
+		self.ac = ac
+
+	def __str__(self):
+		return altitudeStr(self.ac)
+
+# Returns [ altitude, altStr ]
+def altitudeCode(ac):
+	return [ altitude(ac)[0], altitudeStr(ac) ]
+
+# 12-bit altitude field of an airborne position message has the M bit omitted, add it back
+def meAltToAc(ac):
+	return ((ac & 0xFC0) << 1) | (ac & 0x3F)
+
+# altitude in feet to a 13-bit AC field, in 25 ft steps (Q = 1)
+def altitudeEncode(alt):
+	n = max(0, min(0x7FF, int(round((alt + 1000) / 25.0))))
+	return ((n >> 5) << 7) | (((n >> 4) & 1) << 5) | 0x10 | (n & 0xF)
+
+# the other way from meAltToAc, drop the M bit
+def acToMeAlt(ac):
+	return ((ac >> 7) << 6) | (ac & 0x3F)
+
+# these three from Ron Silvernail http://control.com/thread/1011798010
+def grayToBinary(g):
+	b = g ^ (g>>8)
+	b ^= (b>>4)
+	b ^= (b>>2)
+	b ^= (b>>1)
+	return b
+
+def getParity(v):
+	v ^= (v>>16)
+	v ^= (v>>8)
+	v ^= (v>>4)
+	v &= 0xf
+	return (0x6996>>v) & 1;
+
+# takes a uint
+def modeCtoAltitude(code):
+	c = grayToBinary(code & 0x7) - 1
+	if(c == 6):
+		c = 4
+	dab = code >> 3
+	if(getParity(dab)):
+		c = 4 - c
+	return ((grayToBinary(dab)*500)-1200) + (c*100)
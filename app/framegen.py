@@ -0,0 +1,272 @@
+# Synthetic Mode S / ADS-B traffic, for load testing the decoder, server and GUI
+#
+# FrameGenerator flies a number of made-up aircraft around the receiver and produces the frames
+# they would send: DF11 all-call replies, DF17 identification, airborne position and velocity
+# squitters, and DF4/5/20/21 altitude and identity replies (with a BDS 2,0 identification in
+# the MB field of the long ones).  The parity is the CRC of the frame (crc.py), XOR'ed with the
+# aircraft address for the replies, positions are CPR encoded (cpr.encode), and even and odd
+# positions alternate per aircraft, so everything decodes as if it had been received.
+#
+# Frame arrival times are random (Poisson) at the rate asked for, and spread over the aircraft
+# and the frame types by the mix asked for.  A fraction of frames can have 1 or 2 bits flipped.
+# The same seed gives the same frames.
+#
+#	python framegen.py [-a AIRCRAFT] [-r FRAMES/SEC] [-n FRAMES] [-o packetlog.txt] [-B FILE] [-S PORT]
+#
+# Output goes to a packet log in the usual text format (-o, what -f reads), a binary packet log
+# (-B, see binlog.py, also read by -f), and/or a TCP server (-S, what -H connects to),
+# which sends the frames in real time, or --speed times faster.  --check decodes the frames and
+# compares what the decoder made of them with where the aircraft really were.
+#
+
+import sys
+import time
+import math
+import random
+import binascii
+import argparse
+import crc
+import cpr
+import fields
+import binlog
+
+KINDS = ('id', 'pos', 'vel', 'df11', 'df4', 'df5', 'df20', 'df21')
+DEFAULT_MIX = { 'id': 5, 'pos': 25, 'vel': 20, 'df11': 15, 'df4': 10, 'df5': 10, 'df20': 10, 'df21': 5 }
+
+KTS = 1.0 / 3600.0			# NM per second, per knot
+NM_PER_DEGREE = 60.0			# of latitude
+
+# a frame from its data bits (everything before the parity) and the address to overlay
+# on the parity (None for DF11/17/18, where the parity is the plain CRC)
+def frame(data, nbits, aa = None):
+	p = crc.calcCrcInt(data, nbits - 24)
+	if aa != None:
+		p ^= aa
+	return binascii.unhexlify("%0*x" % (nbits // 4, (data << 24) | p))
+
+class SimAircraft(object):
+	def __init__(self, rnd, aa, origin, radius):
+		self.aa = aa
+		self.callsign = "%s%u" % (rnd.choice([ "UAL", "SWA", "AAL", "DAL", "ASA", "N" ]), rnd.randrange(1, 9999))
+		self.squawk = int("%o" % rnd.randrange(0o1000, 0o7700))		# 4 octal digits
+		r = radius * math.sqrt(rnd.random())
+		b = rnd.uniform(0, 2 * math.pi)
+		self.lat = origin[0] + r * math.cos(b) / NM_PER_DEGREE
+		self.lon = origin[1] + r * math.sin(b) / (NM_PER_DEGREE * math.cos(math.radians(origin[0])))
+		self.alt = float(rnd.randrange(2000, 41000, 100))
+		self.heading = rnd.uniform(0, 360)
+		self.speed = rnd.uniform(250, 480)				# knots
+		self.vrate = rnd.choice([ 0.0, 0.0, 0.0, -1500.0, 1500.0 ])	# ft/min
+		self.t = None
+		self.odd = 0
+		self.origin = origin
+		self.radius = radius
+
+	# fly on to time t, turning back towards the receiver at the edge of the area
+	def advance(self, t):
+		if self.t != None and t > self.t:
+			dt = t - self.t
+			d = self.speed * KTS * dt
+			self.lat += d * math.cos(math.radians(self.heading)) / NM_PER_DEGREE
+			self.lon += d * math.sin(math.radians(self.heading)) / (NM_PER_DEGREE * math.cos(math.radians(self.lat)))
+			self.alt = min(max(self.alt + self.vrate * dt / 60.0, 1000.0), 45000.0)
+			if cpr.distance(self.origin, [ self.lat, self.lon ]) > self.radius:
+				self.heading = (self.heading + 180.0) % 360
+		self.t = t
+
+	def ident(self):
+		return (4 << 51) | (3 << 48) | fields.encodeChars(self.callsign)
+
+	def position(self):
+		self.odd ^= 1
+		[xz, yz] = cpr.encode(self.lat, self.lon, self.odd)
+		ac = fields.acToMeAlt(fields.altitudeEncode(self.alt))
+		return (11 << 51) | (ac << 36) | (self.odd << 34) | (yz << 17) | xz
+
+	def velocity(self):
+		ew = self.speed * math.sin(math.radians(self.heading))
+		ns = self.speed * math.cos(math.radians(self.heading))
+		v = int(round(abs(self.vrate) / 64.0))
+		return (19 << 51) | (1 << 48) | ((ew < 0) << 42) | ((int(round(abs(ew))) + 1) << 32) | \
+			((ns < 0) << 31) | ((int(round(abs(ns))) + 1) << 21) | (1 << 20) | ((self.vrate < 0) << 19) | ((v + 1) << 10)
+
+	# a frame of the given kind, as a string of bytes
+	def frame(self, kind):
+		if kind == 'df11':
+			return frame((11 << 27) | (5 << 24) | self.aa, 56)
+		if kind in ('id', 'pos', 'vel'):
+			me = getattr(self, { 'id': 'ident', 'pos': 'position', 'vel': 'velocity' }[kind])()
+			return frame((17 << 83) | (5 << 80) | (self.aa << 56) | me, 112)
+		if kind in ('df4', 'df20'):
+			field = fields.altitudeEncode(self.alt)
+		else:
+			field = fields.squawkEncode(self.squawk)
+		df = int(kind[2:])
+		data = (df << 27) | field			# FS 0 (airborne, no alert), DR 0, UM 0
+		if df >= 20:
+			mb = (0x20 << 48) | fields.encodeChars(self.callsign)
+			return frame((data << 56) | mb, 112, self.aa)
+		return frame(data, 56, self.aa)
+
+class FrameGenerator(object):
+	def __init__(self, aircraft = 100, rate = 1000.0, origin = (37.7, -122.02), radius = 150.0, errors = 0.0, mix = None, seed = 1, start = None):
+		self.rnd = random.Random(seed)
+		self.rate = float(rate)
+		self.errors = errors
+		self.t = start
+		if self.t == None:
+			self.t = time.time()
+		addrs = self.rnd.sample(xrange(0x000001, 0xFFFFFF), aircraft)
+		self.aircraft = [ SimAircraft(self.rnd, aa, origin, radius) for aa in addrs ]
+		mix = mix or DEFAULT_MIX
+		self.kinds = [ k for k in KINDS if mix.get(k, 0) > 0 ]
+		total = float(sum([ mix[k] for k in self.kinds ]))
+		self.cumulative = []
+		c = 0.0
+		for k in self.kinds:
+			c += mix[k] / total
+			self.cumulative.append(c)
+
+	def pickKind(self):
+		r = self.rnd.random()
+		for (k, c) in zip(self.kinds, self.cumulative):
+			if r < c:
+				return k
+		return self.kinds[-1]
+
+	# flip 1 bit, sometimes 2, anywhere after the DF
+	def corrupt(self, d):
+		b = bytearray(d)
+		for i in range(self.rnd.random() < 0.25 and 2 or 1):
+			bit = self.rnd.randrange(5, len(b) * 8)
+			b[bit // 8] ^= 0x80 >> (bit % 8)
+		return str(b)
+
+	# ( timestamp, frame bytes ) for count frames, or forever if count is None
+	def frames(self, count = None):
+		n = 0
+		while count == None or n < count:
+			self.t += self.rnd.expovariate(self.rate)
+			a = self.rnd.choice(self.aircraft)
+			a.advance(self.t)
+			d = a.frame(self.pickKind())
+			if self.errors and self.rnd.random() < self.errors:
+				d = self.corrupt(d)
+			yield (self.t, d)
+			n += 1
+
+# a line of the text packet log, as AdsbReaderThread.logPacket writes it
+def textLine(t, d):
+	return "%u %u %s\n" % (t, len(d), "".join([ "%02hx " % b for b in bytearray(d) ]))
+
+# "pos=25,vel=20,..." -> { 'pos': 25, 'vel': 20, ... }
+def parseMix(s):
+	mix = {}
+	for item in s.split(','):
+		(k, w) = item.split('=')
+		if k.strip() not in KINDS:
+			raise ValueError("unknown frame type %s, expected one of %s" % (k, ", ".join(KINDS)))
+		mix[k.strip()] = float(w)
+	return mix
+
+# serve frames in real time (or speed times faster) to the clients of a packet server
+def serve(gen, count, port, speed):
+	import server
+	s = server.ServerThread('', port, 5, "none")
+	s.server.daemon_threads = True		# client handlers don't keep us running when done
+	s.setFriendlyName("framegen")
+	s.setDeviceName("synthetic")
+	s.start()
+	print "Serving synthetic frames on port %u, waiting for a client..." % port
+	while s.numClients() == 0:
+		time.sleep(0.1)
+	t0 = time.time()
+	first = None
+	try:
+		for (t, d) in gen.frames(count):
+			if first == None:
+				first = t
+			wait = (t - first) / speed - (time.time() - t0)
+			if wait > 0.01:
+				time.sleep(wait)
+			s.put(textLine(t, d))
+		while [ q for q in s.outgoing_queuelist if not q.empty() ]:
+			time.sleep(0.1)			# let the clients have what was sent
+	finally:
+		s.shutdown()
+
+# decode the frames and compare the aircraft the decoder ends up with against the simulated ones
+def check(gen, count):
+	import decoder
+	class Args:
+		origin = (37.7, -122.02)
+	dec = decoder.Decoder(Args())
+	stdout = sys.stdout
+	sys.stdout = open("/dev/null", "w")
+	try:
+		for (t, d) in gen.frames(count):
+			dec.decode(d)
+	finally:
+		sys.stdout = stdout
+	errors = 0
+	worst = 0.0
+	for a in gen.aircraft:
+		r = dec.recentAircraft.get(a.aa)
+		if r == None:
+			continue
+		if r.idStr.strip() != a.callsign or r.squawk != a.squawk:
+			errors += 1
+			print "%06X: decoded %r %04u, sent %r %04u" % (a.aa, r.idStr, r.squawk, a.callsign, a.squawk)
+		if r.lat or r.lon:
+			worst = max(worst, cpr.distance([ r.lat, r.lon ], [ a.lat, a.lon ]))
+	st = dec.stats
+	print "%u frames: %u good, %u CRC errors, %u repaired; %u of %u aircraft seen, %u mismatched" % \
+		(st.totalPkts, st.goodPkts, st.CrcErrs, st.correctedPkts, len(dec.recentAircraft), len(gen.aircraft), errors)
+	print "furthest decoded position from where the aircraft is now: %.2f NM" % worst
+	return errors
+
+def main():
+	parser = argparse.ArgumentParser(description='Generate synthetic Mode S / ADS-B frames')
+	parser.add_argument('-a', '--aircraft', type=int, default=100, help='number of aircraft (default 100)', metavar='NUM')
+	parser.add_argument('-r', '--rate', type=float, default=1000.0, help='frames per second, over all aircraft (default 1000)', metavar='NUM')
+	parser.add_argument('-n', '--frames', type=int, default=100000, help='number of frames (default 100000)', metavar='NUM')
+	parser.add_argument('-R', '--radius', type=float, default=150.0, help='aircraft are spread over this many NM around the origin (default 150)', metavar='NM')
+	parser.add_argument('-O', '--origin', nargs=2, type=float, default=[ 37.7, -122.02 ], help='latitude and longitude of the receiver', metavar='FLOAT')
+	parser.add_argument('-e', '--errors', type=float, default=0.0, help='fraction of frames with 1 or 2 bits flipped (default 0)', metavar='FRACTION')
+	parser.add_argument('-m', '--mix', help='frame types and their weights, default %s' % ",".join([ "%s=%u" % (k, DEFAULT_MIX[k]) for k in KINDS ]), metavar='TYPE=WEIGHT,...')
+	parser.add_argument('--seed', type=int, default=1, help='random seed (default 1)')
+	parser.add_argument('-o', '--output', help='write a text packet log to FILE', metavar='FILE')
+	parser.add_argument('-B', '--binary', help='write a binary packet log to FILE', metavar='FILE')
+	parser.add_argument('-S', '--serve', type=int, help='serve the frames to TCP clients on PORT, in real time', metavar='PORT')
+	parser.add_argument('--speed', type=float, default=1.0, help='with -S, send this many times faster than real time', metavar='X')
+	parser.add_argument('--check', action='store_true', help='decode the frames and compare with the simulated aircraft')
+	args = parser.parse_args()
+	if args.check and (args.output or args.binary or args.serve):
+		parser.error("--check only decodes the frames, it can't be given with -o, -B or -S")
+
+	def generator():
+		return FrameGenerator(args.aircraft, args.rate, args.origin, args.radius, args.errors, \
+			args.mix and parseMix(args.mix), args.seed)
+	if args.check:
+		sys.exit(check(generator(), args.frames) and 1 or 0)
+	if args.serve:
+		serve(generator(), args.frames, args.serve, args.speed)
+		return
+	if not args.output and not args.binary:
+		print "Nothing to do: give an output file (-o, -B), a port to serve on (-S), or --check"
+		sys.exit(1)
+	text = args.output and open(args.output, "w")
+	binary = args.binary and binlog.Writer(args.binary, append = False)
+	t0 = time.time()
+	for (t, d) in generator().frames(args.frames):
+		if text:
+			text.write(textLine(t, d))
+		if binary:
+			binary.write(d, t)
+	for f in (text, binary):
+		if f:
+			f.close()
+	print "%u frames in %.1f s" % (args.frames, time.time() - t0)
+
+if __name__ == '__main__':
+	main()
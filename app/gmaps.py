@@ -96,6 +96,22 @@ function plotTrack(aa, lat, lon, alt)
     //var n = getNumPlines();
     //printer.text(n);
 }
+function removeTrack(aa)
+{
+    var pline = plines[aa];
+    if(pline != null) {
+	pline.setMap(null);
+	delete plines[aa];
+    }
+}
+function moveTrackEnd(aa, lat, lon, alt)
+{
+    var pline = plines[aa];
+    if(pline != null) {
+	var path = pline.getPath();
+	path.setAt(path.getLength() - 1, new google.maps.LatLng(lat, lon, alt));
+    }
+}
 """
 # save these in our settings, and restore on restart
 #map.getCenter()
@@ -122,6 +138,7 @@ class gmaps(QWebView):
 		self.load(url)
 		self.frame = self.page().mainFrame()
 		self.frame.evaluateJavaScript(js);		# load the functions above
+		self.plotted = {}		# aa -> track sequence number we have plotted up to
 
 		# Allow javascript to call back into Qt
                 printer = ConsolePrinter(self.frame)
@@ -139,10 +156,24 @@ class gmaps(QWebView):
 	def updateAircraftPosition(self, ac):
 		l = len(ac.track)
 		if l > 1:
-			end = ac.track[l-1]
-			[ lon, lat, alt, head ] = end
-			s = "plotTrack(%s, %f, %f, %f);" % (ac.aa, lat, lon, alt)
-			self.frame.evaluateJavaScript(s)
+			end = ac.track.end()
+			seq = self.plotted.get(ac.aa, end - 1)
+			if seq == end:
+				# no new point, the track simplifier moved the last one
+				[ lon, lat, alt, t ] = ac.track[-1]
+				s = "moveTrackEnd(%s, %f, %f, %f);" % (ac.aa, lat, lon, alt)
+				self.frame.evaluateJavaScript(s)
+			for [ lon, lat, alt, t ] in ac.track.since(seq):
+				s = "plotTrack(%s, %f, %f, %f);" % (ac.aa, lat, lon, alt)
+				self.frame.evaluateJavaScript(s)
+			self.plotted[ac.aa] = end
+
+	# aged out: forget its track, so if we hear it again it starts a new one
+	def delAircraft(self, ac):
+		if ac.aa in self.plotted:
+			del self.plotted[ac.aa]
+		s = "removeTrack(%s);" % (ac.aa)
+		self.frame.evaluateJavaScript(s)
 
 	def setTrackVisible(self, aa, enable):
 		s = "showTrack(%s, %d);" % (aa, enable)
@@ -0,0 +1,86 @@
+# ICAO24 address allocations: which country (or military) an aircraft address belongs to
+#
+# The allocation blocks live in datafiles/icao24-allocations.csv, one per line:
+#	start,end,country,military
+# with start and end in hex (end exclusive) and military 0 or 1.  Ranges were
+# taken from http://www.libhomeradar.org/databasequery/icao24allocations.php, plus some additions.
+# A block may sit inside a bigger one (Bermuda inside the United Kingdom); the smaller block wins.
+#
+# The blocks are flattened once into sorted, non-overlapping ranges, and looked up with bisect.
+#
+
+import os
+import csv
+from bisect import bisect_right
+
+ALLOCATIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datafiles', 'icao24-allocations.csv')
+
+class Icao24Allocations():
+	def __init__(self, fname = ALLOCATIONS_FILE):
+		blocks = []
+		with open(fname, 'r') as csvfile:
+			for row in csv.reader(csvfile):
+				(start, end, country, military) = row
+				blocks.append((int(start, 16), int(end, 16), country.strip(), military.strip() == '1'))
+
+		# every start/end splits the address space, each piece belongs to the smallest block covering it
+		points = sorted(set([ b[0] for b in blocks ] + [ b[1] for b in blocks ]))
+		self.starts = []
+		self.ends = []
+		self.countries = []
+		self.military = []
+		for (lo, hi) in zip(points, points[1:]):
+			best = None
+			for b in blocks:
+				if b[0] <= lo and hi <= b[1] and (best == None or b[1] - b[0] < best[1] - best[0]):
+					best = b
+			if best == None:
+				continue
+			if self.ends and self.ends[-1] == lo and self.countries[-1] == best[2] and self.military[-1] == best[3]:
+				self.ends[-1] = hi		# merge with the previous piece
+			else:
+				self.starts.append(lo)
+				self.ends.append(hi)
+				self.countries.append(best[2])
+				self.military.append(best[3])
+
+	# index of the range holding aa, or -1
+	def find(self, aa):
+		i = bisect_right(self.starts, aa) - 1
+		if i >= 0 and aa < self.ends[i]:
+			return i
+		return -1
+
+	# country the address aa was allocated to, "" if unallocated
+	def lookupCountry(self, aa):
+		i = self.find(aa)
+		if i < 0:
+			return ""
+		return self.countries[i]
+
+	# True if aa is in a block set aside for military aircraft
+	def isMilitary(self, aa):
+		i = self.find(aa)
+		return i >= 0 and self.military[i]
+
+	# returns [ country, military ]
+	def lookup(self, aa):
+		i = self.find(aa)
+		if i < 0:
+			return [ "", False ]
+		return [ self.countries[i], self.military[i] ]
+
+_allocations = None
+
+# the allocation table, loaded on first use and shared by all decoders
+def allocations():
+	global _allocations
+	if _allocations == None:
+		_allocations = Icao24Allocations()
+	return _allocations
+
+# for testing
+if __name__ == '__main__':
+	import sys
+	for a in sys.argv[1:]:
+		print "%06X: %s" % (int(a, 16), allocations().lookup(int(a, 16)))
@@ -0,0 +1,227 @@
+# Sidecar index for text packet logs: seek by packet number or by time without reading from the start
+#
+# For packetlog.txt the index is packetlog.txt.idx, a 16-byte header (magic "OADSBIDX", version,
+# stride) and then one entry per STRIDE lines of the log: the byte offset of line k * STRIDE and
+# the timestamp on it (uint64, double, little-endian).  Finding packet n is then a lookup and at
+# most STRIDE - 1 readlines, and finding a time is a binary search of the entries and the same.
+#
+# The index is kept up to date by whoever writes the log (AdsbReaderThread.logPacket calls add()
+# for each line), and otherwise is brought up to date when the log is opened for reading: update()
+# checks the last entry still matches the log and indexes whatever has been appended since, or
+# rebuilds it if the log has been replaced.  Indexing a whole log reads it in large blocks, and
+# only looks at the lines which get an entry.  If the index can't be written (a read-only
+# directory), it is kept in memory for the run.
+#
+# Seeking by time assumes the log is in time order, which it is when written by one reader.
+# Binary logs (binlog.py) don't need an index, their records are a fixed size and are searched
+# in place (binlog.Reader.search).
+#
+#	python logindex.py packetlog.txt [-t TIME]
+#
+
+import os
+import time
+import bisect
+import struct
+import argparse
+
+MAGIC = "OADSBIDX"
+VERSION = 1
+STRIDE = 1000			# lines per index entry
+HEADER = struct.Struct("<8sII")
+ENTRY = struct.Struct("<Qd")
+BLOCK = 1 << 20			# bytes read at a time when indexing
+
+# timestamp of a log line, or None if it hasn't one
+def lineTime(line):
+	try:
+		return float(line.split(None, 1)[0])
+	except (ValueError, IndexError):
+		return None
+
+# seconds since the epoch, or a local date and time: "2012-05-28 12:37:53", "2012-05-28T12:37", "2012-05-28"
+def parseTime(s):
+	try:
+		return float(s)
+	except ValueError:
+		pass
+	for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+		try:
+			return time.mktime(time.strptime(s, fmt))
+		except ValueError:
+			pass
+	raise argparse.ArgumentTypeError("can't make a time of '%s', give seconds since the epoch or YYYY-MM-DD HH:MM:SS" % s)
+
+class Index(object):
+	def __init__(self, logName, stride = STRIDE):
+		self.logName = logName
+		self.idxName = logName + ".idx"
+		self.stride = stride
+		self.offsets = []		# of line k * stride
+		self.times = []			# on line k * stride
+		self.count = 0			# lines indexed
+		self.end = 0			# bytes indexed
+		self.f = None			# the index file, None if we couldn't open it
+
+	# make the index match the log, reading as little of either as we can
+	def update(self):
+		self.load()
+		if self.offsets:
+			# index again from the last entry, to count the lines after it
+			(offset, ordinal) = (self.offsets.pop(), (len(self.offsets)) * self.stride)
+			self.times.pop()
+		else:
+			(offset, ordinal) = (0, 0)
+		self.truncate()
+		log = open(self.logName, "rb")
+		self.scan(log, offset, ordinal)
+		log.close()
+		if self.f != None:
+			self.f.flush()
+
+	# read the index file, keeping it only if it still agrees with the log
+	def load(self):
+		self.offsets = []
+		self.times = []
+		try:
+			self.f = open(self.idxName, "r+b")
+		except IOError:
+			try:
+				self.f = open(self.idxName, "w+b")
+			except IOError:
+				self.f = None
+				return
+		data = self.f.read()
+		if len(data) < HEADER.size or HEADER.unpack_from(data)[0:2] != (MAGIC, VERSION) or HEADER.unpack_from(data)[2] != self.stride:
+			return
+		for off in xrange(HEADER.size, len(data) - ENTRY.size + 1, ENTRY.size):
+			(offset, t) = ENTRY.unpack_from(data, off)
+			self.offsets.append(offset)
+			self.times.append(t)
+		if self.offsets and not self.matches(len(self.offsets) - 1):
+			self.offsets = []	# the log has been replaced, start again
+			self.times = []
+
+	# True if entry k is still right about the log
+	def matches(self, k):
+		try:
+			with open(self.logName, "rb") as log:
+				log.seek(self.offsets[k])
+				if k > 0:
+					log.seek(-1, os.SEEK_CUR)
+					if log.read(1) != "\n":
+						return False
+				t = lineTime(log.readline())
+		except IOError:
+			return False
+		return t == self.times[k] or (t == None and k > 0 and self.times[k] == self.times[k - 1])
+
+	# rewrite the index file with the entries we have
+	def truncate(self):
+		if self.f == None:
+			return
+		self.f.seek(0)
+		self.f.truncate()
+		self.f.write(HEADER.pack(MAGIC, VERSION, self.stride))
+		self.f.write("".join([ ENTRY.pack(o, t) for (o, t) in zip(self.offsets, self.times) ]))
+
+	def addEntry(self, offset, t):
+		if t == None:
+			t = self.times and self.times[-1] or 0.0
+		self.offsets.append(offset)
+		self.times.append(t)
+		if self.f != None:
+			self.f.write(ENTRY.pack(offset, t))
+
+	# index the lines of log from offset, the start of line ordinal, to the end
+	def scan(self, log, offset, ordinal):
+		log.seek(offset)
+		tail = ""
+		while True:
+			block = log.read(BLOCK)
+			if not block:
+				break
+			block = tail + block
+			lines = block.split("\n")
+			tail = lines.pop()		# not a whole line yet
+			lens = map(len, lines)
+			pos = offset
+			i = 0
+			k = (-ordinal) % self.stride	# lines[k] is the next to get an entry
+			while k < len(lines):
+				pos += sum(lens[i:k]) + (k - i)
+				i = k
+				self.addEntry(pos, lineTime(lines[k]))
+				k += self.stride
+			ordinal += len(lines)
+			offset += len(block) - len(tail)
+		self.count = ordinal
+		self.end = offset
+
+	# a line is being written to the log at offset, with timestamp t
+	def add(self, offset, t):
+		if self.count % self.stride == 0:
+			self.addEntry(offset, t)
+			if self.f != None:
+				self.f.flush()
+		self.count += 1
+
+	# ( line number, offset ) of the entry at or before line n
+	def seekLine(self, n):
+		k = min(n // self.stride, len(self.offsets) - 1)
+		if k < 0:
+			return (0, 0)
+		return (k * self.stride, self.offsets[k])
+
+	# ( line number, offset ) of the last entry before time t
+	def seekTime(self, t):
+		k = bisect.bisect_left(self.times, t) - 1
+		if k < 0:
+			return (0, 0)
+		return (k * self.stride, self.offsets[k])
+
+	def close(self):
+		if self.f != None:
+			self.f.close()
+			self.f = None
+
+# Open a text log at the first line which is at least skip lines in and at least time start (if
+# not None), using (and updating) its index.  Returns the file and the line number it's at
+def openAt(logName, skip = 0, start = None):
+	log = open(logName, "r")
+	if skip <= 0 and start == None:
+		return (log, 0)
+	index = Index(logName)
+	index.update()
+	(ordinal, offset) = index.seekLine(skip)
+	if start != None:
+		(ordinal, offset) = max((ordinal, offset), index.seekTime(start))
+	index.close()
+	log.seek(offset)
+	while True:
+		pos = log.tell()
+		line = log.readline()
+		if not line or (ordinal >= skip and (start == None or lineTime(line) >= start)):
+			log.seek(pos)
+			return (log, ordinal)
+		ordinal += 1
+
+def main():
+	parser = argparse.ArgumentParser(description='Build or update the index of a text packet log, and look up a time in it')
+	parser.add_argument('log', help='packet log to index')
+	parser.add_argument('-t', '--time', type=parseTime, help='print where TIME is in the log', metavar='TIME')
+	args = parser.parse_args()
+	t0 = time.time()
+	index = Index(args.log)
+	index.update()
+	index.close()
+	print "%s: %u lines, %u index entries, %.1f s" % (args.log, index.count, len(index.offsets), time.time() - t0)
+	if index.times:
+		print "from %s to %s" % (time.ctime(index.times[0]), time.ctime(index.times[-1]))
+	if args.time != None:
+		(log, ordinal) = openAt(args.log, 0, args.time)
+		print "%s: line %u, offset %u" % (time.ctime(args.time), ordinal, log.tell())
+		log.close()
+
+if __name__ == '__main__':
+	main()
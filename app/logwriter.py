@@ -0,0 +1,279 @@
+# Packet log writer: a thread of its own, so reading and decoding never wait for the disk
+#
+# Readers put() each frame on a bounded queue, which costs a copy of the frame and never blocks:
+# if the writer falls so far behind that the queue is full, the frame isn't logged, and is
+# counted as dropped.  The writer thread takes whatever has queued up (up to BATCH frames),
+# formats it, text or binary (binlog.py), and writes it in one go.  The file is flushed at least
+# every FLUSH_INTERVAL, and the text log's index (logindex.py) is kept up to date as lines go in.
+#
+# With --log-rotate-size or --log-rotate-time, the log is closed when it gets that big or old,
+# renamed with the time it was started (packetlog.txt.20120528-123753.250, with its index),
+# and a new one started.  Closed segments are compressed in the background with zstd if the
+# zstandard module is there, else gzip (--log-compress), and the uncompressed segment and its
+# index removed once that's done.  A compressed segment has to be decompressed to replay it.
+#
+# Readers writing to the same file share one LogWriter (openShared()), which stops, printing
+# its counters (report()), when the last of them releases it.
+# Nothing in here depends on Qt.
+#
+
+import os
+import time
+import gzip
+import Queue
+import shutil
+import threading
+import binlog
+import logindex
+
+QUEUE_SIZE = 100000		# frames waiting to be written, at most
+BATCH = 5000			# frames written at a time, at most
+FLUSH_INTERVAL = 1.0		# seconds
+BLOCK = 1 << 20			# bytes copied at a time when compressing
+
+# text log line for frame d, in the format the file reader reads
+def textLine(d, t):
+	return "%u %u %s\n" % (t, len(d), "".join([ "%02hx " % b for b in bytearray(d) ]))
+
+# the compression to use for "auto": zstd if we have it, else gzip
+def defaultCompression():
+	try:
+		import zstandard
+		return "zstd"
+	except ImportError:
+		return "gzip"
+
+# compress fname to fname.gz or fname.zst, removing fname once done.  Returns the new name
+def compressFile(fname, kind):
+	ext = kind == "zstd" and ".zst" or ".gz"
+	part = fname + ext + ".part"		# renamed when complete, so a partial file is never mistaken for a segment
+	src = open(fname, "rb")
+	if kind == "zstd":
+		import zstandard
+		with open(part, "wb") as dst:
+			zstandard.ZstdCompressor().copy_stream(src, dst, read_size = BLOCK, write_size = BLOCK)
+	else:
+		dst = gzip.open(part, "wb")
+		shutil.copyfileobj(src, dst, BLOCK)
+		dst.close()
+	src.close()
+	os.rename(part, fname + ext)
+	os.remove(fname)
+	if os.path.exists(fname + ".idx"):
+		os.remove(fname + ".idx")	# offsets into the uncompressed segment
+	return fname + ext
+
+class LogWriter(threading.Thread):
+	def __init__(self, fname, binary = False, rotateBytes = 0, rotateSecs = 0, compress = "auto", queueSize = QUEUE_SIZE):
+		threading.Thread.__init__(self, name = "log writer")
+		self.daemon = True
+		self.fname = fname
+		self.binary = binary
+		self.rotateBytes = rotateBytes
+		self.rotateSecs = rotateSecs
+		if compress == "auto":
+			compress = defaultCompression()
+		self.compress = compress != "none" and compress or None
+		self.q = Queue.Queue(queueSize)
+		self.closed = False
+		self.users = 0			# readers sharing us, see openShared()
+		self.f = None			# the current segment
+		self.index = None		# its index (text only)
+		self.segmentSize = 0		# bytes in the current segment
+		self.segmentStart = 0.0		# when the current segment was started
+		self.compressQ = Queue.Queue()
+		self.compressor = None
+		# counters
+		self.started = time.time()
+		self.frames = 0			# frames written
+		self.bytes = 0			# bytes written
+		self.batches = 0
+		self.dropped = 0		# frames not logged because the queue was full
+		self.dropLock = threading.Lock()	# readers put() from threads of their own
+		self.maxQueued = 0		# the most frames waiting at once
+		self.segments = 0		# segments closed
+		self.compressedIn = 0		# bytes compressed
+		self.compressedOut = 0		# bytes they compressed to
+
+	# log frame d, received at time t (default now), without waiting.  False if it couldn't be
+	def put(self, d, t = None, receiver = 0, rxlevel = 0):
+		if t == None:
+			t = time.time()
+		if not self.closed:
+			try:
+				self.q.put_nowait((str(bytearray(d)), t, receiver, rxlevel))
+				return True
+			except Queue.Full:
+				pass
+		with self.dropLock:
+			self.dropped += 1
+		return False
+
+	# bytes in the current segment
+	def size(self):
+		return self.segmentSize
+
+	def openSegment(self):
+		if self.binary:
+			self.f = binlog.Writer(self.fname)
+		else:
+			self.f = open(self.fname, "a")
+			self.f.seek(0, os.SEEK_END)
+			self.index = logindex.Index(self.fname)
+			self.index.update()
+		self.segmentSize = self.f.tell()
+		self.segmentStart = time.time()
+
+	def closeSegment(self):
+		self.f.close()
+		if self.index != None:
+			self.index.close()
+		self.f = None
+		self.index = None
+
+	# close the current segment, rename it for when it was started, compress it in the background
+	# and start another
+	def rotate(self):
+		self.closeSegment()
+		t = self.segmentStart
+		while True:
+			name = "%s.%s.%03u" % (self.fname, time.strftime("%Y%m%d-%H%M%S", time.localtime(t)), int(t * 1000) % 1000)
+			if not (os.path.exists(name) or os.path.exists(name + ".gz") or os.path.exists(name + ".zst")):
+				break
+			t += 0.001
+		os.rename(self.fname, name)
+		if os.path.exists(self.fname + ".idx"):
+			os.rename(self.fname + ".idx", name + ".idx")
+		self.segments += 1
+		print "Closed log segment %s" % name
+		if self.compress:
+			if self.compressor == None:
+				self.compressor = threading.Thread(target = self.compressSegments, name = "log compressor")
+				self.compressor.daemon = True
+				self.compressor.start()
+			self.compressQ.put(name)
+		self.openSegment()
+
+	def dueForRotation(self):
+		if self.segmentSize == 0:
+			return False
+		if self.rotateBytes > 0 and self.segmentSize >= self.rotateBytes:
+			return True
+		return self.rotateSecs > 0 and time.time() - self.segmentStart >= self.rotateSecs
+
+	def compressSegments(self):
+		while True:
+			name = self.compressQ.get()
+			if name == None:
+				return
+			try:
+				size = os.path.getsize(name)
+				out = compressFile(name, self.compress)
+				self.compressedIn += size
+				self.compressedOut += os.path.getsize(out)
+			except (IOError, OSError, ImportError), e:
+				print "Couldn't compress log segment %s: %s" % (name, e)
+
+	# write a batch of ( frame, time, receiver, rxlevel )
+	def write(self, batch):
+		if self.binary:
+			s = "".join([ binlog.pack(d, t, receiver, rxlevel) for (d, t, receiver, rxlevel) in batch ])
+			self.f.writePacked(s)
+		else:
+			lines = []
+			offset = self.segmentSize
+			for (d, t, receiver, rxlevel) in batch:
+				line = textLine(d, t)
+				self.index.add(offset, float(int(t)))
+				offset += len(line)
+				lines.append(line)
+			s = "".join(lines)
+			self.f.write(s)
+		self.segmentSize += len(s)
+		self.bytes += len(s)
+		self.frames += len(batch)
+		self.batches += 1
+
+	def run(self):
+		self.openSegment()		# here, as bringing a big log's index up to date takes a while
+		lastFlush = time.time()
+		done = False
+		while not done:
+			try:
+				batch = [ self.q.get(True, FLUSH_INTERVAL) ]
+			except Queue.Empty:
+				batch = []
+			self.maxQueued = max(self.maxQueued, self.q.qsize() + len(batch))
+			while len(batch) < BATCH:
+				try:
+					batch.append(self.q.get_nowait())
+				except Queue.Empty:
+					break
+			if None in batch:		# close() was called
+				batch = batch[0:batch.index(None)]
+				done = True
+			if batch:
+				self.write(batch)
+			if self.dueForRotation():
+				self.rotate()
+			elif done or time.time() - lastFlush >= FLUSH_INTERVAL:
+				self.f.flush()
+				lastFlush = time.time()
+		self.closeSegment()
+		if self.compressor != None:
+			self.compressQ.put(None)
+			print "Waiting for log segments to be compressed..."
+			self.compressor.join()
+
+	# write what's queued and stop (waiting for any compression to finish)
+	def close(self):
+		if self.closed:
+			return
+		self.closed = True
+		self.q.put(None)
+		if self.isAlive():
+			self.join()
+		print self.report()
+
+	def report(self):
+		elapsed = max(time.time() - self.started, 1e-6)
+		text = "Log %s: %u frames, %.1f MB in %u batches, %.0f frames/s, %.2f MB/s, %u dropped, at most %u queued" % \
+			(self.fname, self.frames, self.bytes / 1048576.0, self.batches, self.frames / elapsed, \
+			self.bytes / 1048576.0 / elapsed, self.dropped, self.maxQueued)
+		if self.segments:
+			text += ", %u segments closed" % self.segments
+		if self.compressedIn:
+			text += ", %.1f MB compressed to %.1f MB" % (self.compressedIn / 1048576.0, self.compressedOut / 1048576.0)
+		return text
+
+# one LogWriter per file, shared by the readers logging to it
+shared = {}
+sharedLock = threading.Lock()
+
+# the (started) LogWriter for fname, which stops when everyone who opened it has released it
+def openShared(fname, *args, **kwargs):
+	with sharedLock:
+		w = shared.get(fname)
+		if w == None:
+			w = shared[fname] = LogWriter(fname, *args, **kwargs)
+			w.start()
+		w.users += 1
+		return w
+
+def release(w):
+	with sharedLock:
+		w.users -= 1
+		if w.users > 0:
+			return
+		del shared[w.fname]
+	w.close()
+
+def addArguments(parser):
+	parser.add_argument('--log-rotate-size', dest="logrotatesize", type=float, metavar="MB", help="start a new packet log when it reaches MB megabytes")
+	parser.add_argument('--log-rotate-time', dest="logrotatetime", type=float, metavar="SECS", help="start a new packet log every SECS seconds")
+	parser.add_argument('--log-compress', dest="logcompress", choices=["auto", "gzip", "zstd", "none"], default="auto", help="how to compress packet logs once they are rotated (default auto: zstd if installed, else gzip)")
+
+# a shared LogWriter on fname for the options given
+def fromArgs(args, fname):
+	return openShared(fname, getattr(args, 'binarylog', False), int((getattr(args, 'logrotatesize', None) or 0) * 1048576), \
+		getattr(args, 'logrotatetime', None) or 0, getattr(args, 'logcompress', None) or "auto")
@@ -26,11 +26,22 @@ import yappi
 from kmlserver import *
 import feeds
 import airline_codes
-
-class ar():
-	host = ''
-	port = 0
-	origin = [ 0, 0 ]
+import dedup
+import prefilter
+import profiler
+import logindex
+import logwriter
+import replay
+import chunkreplay
+
+# options for a network feed's reader: the command line's (--jobs, the filters, logging, ...),
+# with the feed's own host and port
+def feedArgs(args, host = '', port = 0):
+	a = argparse.Namespace(**vars(args))
+	a.host = host
+	a.port = port
+	a.origin = [ 0, 0 ]
+	return a
 
 # to support non-gui operation, use a subclassed QApplication as the main class rather than QMainWindow 
 class MyApplication(QApplication):
@@ -46,6 +57,10 @@ class MyApplication(QApplication):
 		self.dbThread = db.AircraftDbThread() 		# Create the database thread 
 		self.fr24Thread = flightradar24.fr24Thread() 	# Create thread to query flightradar24.com
 		self.airlineCodes = airline_codes.airlineCodes()	# only need one of these per app
+		self.dedup = None
+		if self.args.dedup:
+			self.dedup = dedup.DedupCache(self.args.dedup)	# shared by all readers
+		self.profiler = profiler.fromArgs(self.args)		# None unless --profile
 
 		if en_gui:
 			self.mainWindow = MainWindow(self)
@@ -69,10 +84,7 @@ class MyApplication(QApplication):
 		# Network data source
 		if self.args.host != None:
 			h = self.args.host.split(':')
-			a = ar()
-			a.origin = [ 0, 0 ]
-			a.host = h[0]
-			a.port = int(h[1])
+			a = feedArgs(self.args, h[0], int(h[1]))
 			# fixme - use new ClientThread instead...
 			# thread should run in the background and attempt to (re)connect to server indefinitely. add reader should be done by that thread ,not here
 			#self.client = client.ClientThread(a.host, a.port)
@@ -87,7 +99,8 @@ class MyApplication(QApplication):
 
 		# connect the signals from the reader/parser to the slots
 		dec = reader.getDecoder()
-		self.connect(dec, SIGNAL("appendText(const QString&)"), self.logMsg)	# so we can print to console too
+		if self.args.verbose:
+			self.connect(dec, SIGNAL("appendText(const QString&)"), self.logMsg)	# so we can print to console too
 		self.connect(dec, SIGNAL("addAircraft(PyQt_PyObject)"), self.fr24Thread.addAircraft)	# fixme - better way to order this after db.addAircraft has been executed
 		self.connect(dec, SIGNAL("addAircraft(PyQt_PyObject)"), self.dbThread.db.addAircraft)
 
@@ -194,6 +207,7 @@ class MainWindow(QMainWindow):
 		grid.addWidget(QLabel("Packet rate:"), 3, 0)
 		grid.addWidget(QLabel("Good Packets:"), 4, 0)
 		grid.addWidget(QLabel("CRC Errors:"), 5, 0)
+		grid.addWidget(QLabel("Corrected Packets:"), 21, 0)
 		grid.addWidget(QLabel("Bad Short Packets:"), 6, 0)
 		grid.addWidget(QLabel("Bad Long Packets:"), 7, 0)
 		grid.addWidget(QLabel("Logfile Size:"), 8, 0)
@@ -215,6 +229,7 @@ class MainWindow(QMainWindow):
 		self.packetRate = QLabel("0")
 		self.goodPkts = QLabel("0")
 		self.CrcErrs = QLabel("0")
+		self.correctedPkts = QLabel("0")
 		self.DF0 = QLabel("0")
 		self.DF4 = QLabel("0")
 		self.DF5 = QLabel("0")
@@ -251,6 +266,7 @@ class MainWindow(QMainWindow):
 		grid.addWidget(self.DFOther, 18, 1)
 		grid.addWidget(self.IICs, 19, 1)
 		grid.addWidget(self.lastPressure, 20, 1)
+		grid.addWidget(self.correctedPkts, 21, 1)
 		statsWindow = QWidget()
 		statsWindow.setLayout(grid)
 
@@ -264,6 +280,9 @@ class MainWindow(QMainWindow):
 		# Google Maps window
 		self.gmapsWindow = gmaps.gmaps(self)
 		self.gmapsWindow.show()
+		if self.app.profiler != None:
+			self.app.profiler.instrument(self.t, [ 'addAircraft', 'updateAircraft', 'delAircraft' ], "gui table")
+			self.app.profiler.instrument(self.gmapsWindow, [ 'updateAircraftPosition', 'delAircraft' ], "gui map")
 		#self.t.connect(self.dec, SIGNAL("updateAircraftPosition(PyQt_PyObject)"), self.gmapsWindow.updateAircraftPosition)
 		self.t.connect(self.gmapsWindow, SIGNAL("highlightAircraft(int)"), self.t.highlightAircraft)
 		self.t.connect(self.gmapsWindow, SIGNAL("unhighlightAircraft(int)"), self.t.unhighlightAircraft)
@@ -367,7 +386,8 @@ class MainWindow(QMainWindow):
 		self.connect(dec, SIGNAL("addAircraft(PyQt_PyObject)"), self.t.addAircraft)
 		self.connect(dec, SIGNAL("updateAircraft(PyQt_PyObject)"), self.t.updateAircraft)
 		self.connect(dec, SIGNAL("updateAircraftPosition(PyQt_PyObject)"), self.t.updateAircraftPosition)
-		self.connect(dec, SIGNAL("delAircraft()"), self.t.delAircraft)
+		self.connect(dec, SIGNAL("delAircraft(PyQt_PyObject)"), self.t.delAircraft)
+		self.connect(dec, SIGNAL("delAircraft(PyQt_PyObject)"), self.gmapsWindow.delAircraft)
 		self.connect(dec, SIGNAL("updateStats(PyQt_PyObject)"), self.updateStats)
 		self.connect(dec, SIGNAL("updateAircraftPosition(PyQt_PyObject)"), self.gmapsWindow.updateAircraftPosition)
 		self.connect(dec, SIGNAL("appendText(const QString&)"), self.logmsg.append)
@@ -414,11 +434,6 @@ class MainWindow(QMainWindow):
 			s.beginGroup(groupName)
 			dlg_sharing.DlgConfigSharing.dumpSettings()
 
-			class ar():
-				host = ''
-				port = 0
-				origin = [ 0, 0 ]
-
 			# two-way data sharing with openadsb acting as a server
 			if self.server != None:
 				self.server.shutdown()
@@ -432,14 +447,14 @@ class MainWindow(QMainWindow):
 				print "started server thread(s) on port %d" % (s.value("serverPort").toInt()[0])
 
 				# connect a reader to the incoming traffic
-				a = ar()
-				a.origin = [ 0, 0 ]
+				a = feedArgs(self.app.args)
 				socketReader = reader.AdsbReaderThreadClientServer(a, self.server, self.app)
 				dec = socketReader.getDecoder()
 				self.connect(dec, SIGNAL("addAircraft(PyQt_PyObject)"), self.t.addAircraft)
 				self.connect(dec, SIGNAL("updateAircraft(PyQt_PyObject)"), self.t.updateAircraft)
 				self.connect(dec, SIGNAL("updateAircraftPosition(PyQt_PyObject)"), self.t.updateAircraftPosition)
-				self.connect(dec, SIGNAL("delAircraft()"), self.t.delAircraft)
+				self.connect(dec, SIGNAL("delAircraft(PyQt_PyObject)"), self.t.delAircraft)
+				self.connect(dec, SIGNAL("delAircraft(PyQt_PyObject)"), self.gmapsWindow.delAircraft)
 				self.readers.append(socketReader)
 				socketReader.start()
 
@@ -452,9 +467,7 @@ class MainWindow(QMainWindow):
 				self.client = None
 
 			if s.value('enableClient').toBool():
-				#a = [ host = s.value('client').toString(), port = s.value('clientPort').toInt()[0] ]
-				a.host = s.value('client').toString()
-				a.port = s.value('clientPort').toInt()[0]
+				a = feedArgs(self.app.args, s.value('client').toString(), s.value('clientPort').toInt()[0])
 				self.client = client.ClientThread(a.host, a.port)
 				self.client.start()
 				print "started client thread(s) for %s port %d" % (a.host, a.port)
@@ -482,7 +495,7 @@ class MainWindow(QMainWindow):
 				self.connect(self.dec, SIGNAL("updateAircraft(PyQt_PyObject)"), self.kmlServer.updateAircraft)
 				self.connect(self.dec, SIGNAL("updateAircraftPosition(PyQt_PyObject)"), self.kmlServer.updateAircraftPosition)
 				#self.connect(self.dec, SIGNAL("updateAircraftFR24Info(PyQt_PyObject)"), self.kmlServer.updateAircraftFR24Info)
-				self.connect(self.dec, SIGNAL("delAircraft()"), self.kmlServer.delAircraft)
+				self.connect(self.dec, SIGNAL("delAircraft(PyQt_PyObject)"), self.kmlServer.delAircraft)
 
 	# bk - make new one - using server and client
 	def cfgServer(self, enable, port, maxConn, fmt):
@@ -515,6 +528,7 @@ class MainWindow(QMainWindow):
 		self.totalPkts.setNum(stats.totalPkts)
 		self.goodPkts.setNum(stats.goodPkts)
 		self.CrcErrs.setNum(stats.CrcErrs)
+		self.correctedPkts.setNum(stats.correctedPkts)
 		self.badShortPkts.setNum(stats.badShortPkts)
 		self.badLongPkts.setNum(stats.badLongPkts)
 		self.rxLevel.setNum(stats.rxLevel)
@@ -585,9 +599,19 @@ def main():
 	desc += 'By default, will read from USB dongle.\n'
 	desc += 'Otherwise, read from file or network.\n'
 	parser = argparse.ArgumentParser(description=desc)
-	parser.add_argument('-f', '--file', dest="filename", help="read from previously recorded packetlog FILE", metavar="FILE")
+	parser.add_argument('-f', '--file', dest="filename", help="read from previously recorded packetlog FILE (text or binary)", metavar="FILE")
 	parser.add_argument('-s', '--skip', dest="skip", help="when using -f, how many packets to skip from the start of file", default=0, metavar="NUM")
+	parser.add_argument('--start-time', dest="starttime", help="when using -f, start at the first packet at or after TIME (seconds since the epoch, or YYYY-MM-DD HH:MM:SS local time)", type=logindex.parseTime, metavar="TIME")
+	parser.add_argument('--end-time', dest="endtime", help="when using -f, stop at the first packet at or after TIME", type=logindex.parseTime, metavar="TIME")
+	parser.add_argument('-b', '--bulk', dest="bulk", help="when using -f, decode packets in chunks of NUM with the vectorized batch decoder (needs numpy)", type=int, metavar="NUM")
 	parser.add_argument('-c', '--count', dest="count", help="how many packets to process", metavar="NUM", default=-1)
+	parser.add_argument('-e', '--fix-errors', dest="fixerrors", help="repair DF11/17/18 packets with up to NUM (1 or 2) bit errors, default 0 (off)", type=int, choices=[0, 1, 2], default=0, metavar="NUM")
+	parser.add_argument('-x', '--expire', dest="expire", nargs=3, type=float, metavar="SECS", help="seconds without a packet before an airborne, on-ground, or TIS-B aircraft is dropped (default 120 300 60)")
+	parser.add_argument('-t', '--track-points', dest="trackpoints", help="keep at most NUM track points per aircraft, dropping the oldest half when full (default 4096)", type=int, metavar="NUM")
+	parser.add_argument('-T', '--track-tolerance', dest="tracktolerance", nargs=3, type=float, metavar=("METERS", "FEET", "SECS"), help="drop track points within METERS sideways and FEET vertically of a straight line, keeping one at least every SECS (default 100 100 60, 0 0 0 keeps every point)")
+	parser.add_argument('--raw-track', dest="rawtrack", help="with track simplification, also keep every track point", action="store_true")
+	parser.add_argument('-j', '--jobs', dest="jobs", help="decode in NUM worker processes, each handling its share of the aircraft (default 1, decode in the reader thread)", type=int, metavar="NUM")
+	parser.add_argument('--dedup', dest="dedup", help="with several receivers, decode a frame only once if more than one hears it within SECS (e.g. 1.0)", type=float, metavar="SECS")
 	parser.add_argument('-n', '--nogui', dest="nogui", help="command-line only - no GUI", action="store_true")
 	parser.add_argument('-v', '--verbose', dest="verbose", metavar="LEVEL", help="increasing output levels 1 to 5")
 	parser.add_argument('-H', '--host', dest="host", help="read packets from ipaddr:port")
@@ -596,11 +620,23 @@ def main():
 	parser.add_argument('-D', '--dither', dest="ditherdac", help="automatically control DAC value", action='store_true' )
 	parser.add_argument('-O', '--origin', dest="origin", nargs=2, metavar="FLOAT",  help="Latitude and Longitude of Origin in degrees (-90 to 90, -180 to 180)", default=default_origin)
 	#parser.add_argument('-o', '--output', dest='output', metavar="FILE", help="log packets to FILE")
+	parser.add_argument('--analyze', dest="analyze", help="with -f, decode the log in parallel chunks on -j processes (default one per CPU), write the aircraft and their tracks to FILE as JSON, and exit (see chunkreplay.py)", metavar="FILE")
+	parser.add_argument('--binary-log', dest="binarylog", help="log received packets in the compact binary format, to packetlog.bin (see binlog.py)", action="store_true")
+	prefilter.addArguments(parser)
+	profiler.addArguments(parser)
+	logwriter.addArguments(parser)
+	replay.addArguments(parser)
 	parser.add_argument('-p')		# MacOS starts programs with -psn_XXXXXXX "process serial number" argument.  Ignore it. FIXME SetFrontProcess()
 	args = parser.parse_args()
 	print args
 	args.origin = [float(args.origin[0]), float(args.origin[1])]
 
+	if args.analyze != None:
+		if args.filename == None:
+			parser.error("--analyze needs a packet log, -f FILE")
+		chunkreplay.analyze(args)
+		sys.exit(0)
+
 	# Open the correct reader
 	#if args.host != None:
 		#h = args.host.split(':')
@@ -638,6 +674,12 @@ def main():
 	#app.addReader(r)
 
 	ret = app.exec_()
+	if app.dedup != None:
+		app.dedup.printCoverage()
+	if app.profiler != None:
+		app.profiler.dump()
+	for rd in app.readers:
+		rd.closeLogfile()		# write out what's queued
 	r.kill_received = True
 	r.wait()
 	#yappi.print_stats()			# profiling
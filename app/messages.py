@@ -0,0 +1,47 @@
+# Decoded message records, rendered to text only when someone wants to read them
+#
+# The decoder used to format a full log sentence (and wrap it in a QString) for every packet,
+# even with no log window open.  Instead it now hands out a Message: the downlink format,
+# type code, aircraft address and CRC status as plain numbers, plus the format string and raw
+# arguments of the sentence.  Nothing is formatted until render() (or str()) is called.
+# Arguments may themselves be lazy (Text, Lookup, fields.AltitudeStr), they render along with the message.
+# Nothing in here depends on Qt.
+#
+
+# A "%"-format string and its arguments, formatted on demand
+class Text(object):
+	__slots__ = ('fmt', 'args')
+
+	def __init__(self, fmt, *args):
+		self.fmt = fmt
+		self.args = args
+
+	def __str__(self):
+		return self.fmt % self.args
+
+# A value and the function which describes it, called on demand
+class Lookup(object):
+	__slots__ = ('func', 'value')
+
+	def __init__(self, func, value):
+		self.func = func
+		self.value = value
+
+	def __str__(self):
+		return self.func(self.value)
+
+# One decoded packet.  tc is the DF17/18 type code, None for other formats.
+# aa is the aircraft address (for addressed replies, the one recovered from the parity), crcok
+# whether the packet passed parity or matched a known aircraft.
+class Message(Text):
+	__slots__ = ('df', 'tc', 'aa', 'crcok')
+
+	def __init__(self, df, tc, aa, crcok, fmt, *args):
+		Text.__init__(self, fmt, *args)
+		self.df = df
+		self.tc = tc
+		self.aa = aa
+		self.crcok = crcok
+
+def render(msg):
+	return str(msg)
@@ -0,0 +1,26 @@
+# Minimal observer interface, so the decoder core can report events without Qt
+#
+# Subscribers register a callback for an event name; notify() calls each of them in turn,
+# on the caller's thread.  The Qt adapters (qtdecoder.py) subscribe and re-emit as Qt signals.
+#
+
+class Observable(object):
+	def __init__(self):
+		self.observers = {}
+
+	def subscribe(self, event, callback):
+		self.observers.setdefault(event, []).append(callback)
+
+	def unsubscribe(self, event, callback):
+		if callback in self.observers.get(event, []):
+			self.observers[event].remove(callback)
+			if len(self.observers[event]) == 0:
+				del self.observers[event]
+
+	# True if anyone is listening for event, so callers can skip building its arguments
+	def subscribed(self, event):
+		return event in self.observers
+
+	def notify(self, event, *args):
+		for callback in self.observers.get(event, ()):
+			callback(*args)
@@ -0,0 +1,289 @@
+# Multi-process decoding, sharded by aircraft address
+#
+# DecodePool stands in for decoder.Decoder (same decode(), updateStats(), setOrigin() and
+# events), but only does a little work itself: it pulls the aircraft address out of each raw
+# frame with integer ops (the AA field of DF11/17/18, the address recovered from the parity for
+# the others), and hands the frame to worker process (address mod N).  So every frame from one
+# aircraft goes to the same worker, and the per-aircraft state (CPR frame pairs, tracks, the
+# aircraft table itself) lives in that worker's own Decoder.
+#
+# Frames go out in batches.  After each batch a worker sends back one record per aircraft it
+# touched: the aircraft's state (aircraft.STATE_SLOTS) and the track points added since its last
+# record, plus the addresses it aged out and its statistics.  The pool keeps a mirror Aircraft
+# for each, and emits addAircraft/updateAircraft/updateAircraftPosition/delAircraft with it, so
+# the GUI can't tell the difference.  Statistics are summed over the workers.
+#
+# Decoded messages are only sent back (rendered to text) while someone wants them: the pool asks
+# wantMessages() with each batch, which by default is whether anyone subscribes to "message",
+# and with the Qt adapter whether anything is connected to its message signals.
+#
+# Results are picked up as batches go out, and by a flusher thread every FLUSH_INTERVAL, so a
+# quiet feed's last frames are still decoded and shown.  The flusher and the reader both go
+# through the pool's lock.  Readers close() the pool when their input ends, which decodes what
+# is still held back and stops the workers.
+# Nothing in here depends on Qt.
+#
+
+import time
+import threading
+import multiprocessing
+import Queue
+import crc
+import icao24
+import aircraft
+import decoder
+import messages
+import observer
+import track
+
+BATCH = 256			# frames sent to a worker at once ...
+FLUSH_INTERVAL = 0.1		# ... or after this many seconds, for slow feeds
+QUEUE_BATCHES = 8		# batches queued per worker before decode() waits for it
+
+# flags in an aircraft record
+ADDED = 1
+UPDATED = 2
+POSITION = 4
+
+# Worker process: decode batches of frames from inq, send records back on outq
+def runWorker(index, args, inq, outq):
+	dec = decoder.Decoder(args)
+	touched = {}		# aa -> flags, since the last batch
+	deleted = []
+	sent = {}		# aa -> track sequence number sent up to
+	texts = []
+	keep = lambda msg: texts.append(messages.render(msg))
+	wanted = False		# subscribed to messages
+	def flag(f):
+		def touch(a):
+			touched[a.aa] = touched.get(a.aa, 0) | f
+		return touch
+	def gone(a):
+		touched.pop(a.aa, None)
+		sent.pop(a.aa, None)
+		deleted.append(a.aa)
+	dec.subscribe("addAircraft", flag(ADDED))
+	dec.subscribe("updateAircraft", flag(UPDATED))
+	dec.subscribe("updateAircraftPosition", flag(POSITION))
+	dec.subscribe("delAircraft", gone)
+
+	while True:
+		item = inq.get()
+		if item == None:
+			break
+		(cmd, arg) = item
+		if cmd == 'origin':
+			dec.setOrigin(arg)
+			continue
+		(frames, want) = arg
+		if want != wanted:
+			if want:
+				dec.subscribe("message", keep)
+			else:
+				dec.unsubscribe("message", keep)
+			wanted = want
+		for d in frames:
+			try:
+				dec.decode(d)
+			except:
+				pass
+
+		records = []
+		for (aa, flags) in touched.items():
+			a = dec.recentAircraft.get(aa)
+			if a == None:
+				continue
+			if flags & ADDED:
+				sent[aa] = 0
+			# resend the newest point we sent, in case the track simplifier has moved it since
+			first = max(sent.get(aa, 0) - 1, a.track.first)
+			records.append((aa, flags, a.getState(), first, a.track.since(first)))
+			sent[aa] = a.track.end()
+		outq.put((index, records, deleted[:], dec.stats, texts[:]))
+		touched.clear()
+		del deleted[:]
+		del texts[:]
+
+class DecodePool(observer.Observable):
+	def __init__(self, args, reader = None, airlineCodes = None, workers = None):
+		observer.Observable.__init__(self)
+		self.args = args
+		self.reader = reader
+		self.airlineCodes = airlineCodes
+		self.origin = self.args.origin
+		self.stats = decoder.DecoderStats()
+		self.recentAircraft = {}		# aa -> mirror Aircraft
+		self.trackPoints = int(getattr(args, 'trackpoints', 0) or track.DEFAULT_CAPACITY)
+		self.trackTolerance = None		# the workers simplify, the mirrors take the points as sent
+		self.rawTrack = False
+
+		n = int(workers or getattr(args, 'jobs', 0) or multiprocessing.cpu_count())
+		self.workerStats = [ decoder.DecoderStats() for i in range(n) ]
+		self.outq = multiprocessing.Queue()
+		self.inqs = [ multiprocessing.Queue(QUEUE_BATCHES) for i in range(n) ]
+		self.pending = [ [] for i in range(n) ]
+		self.outstanding = 0			# batches sent but not answered
+		self.lastFlush = time.time()
+		self.wantMessages = lambda: self.subscribed("message")	# replaced by the Qt adapter
+		self.closed = False
+		self.lock = threading.RLock()		# the reader's thread and the flusher's
+		self.workers = []
+		for i in range(n):
+			p = multiprocessing.Process(target = runWorker, args = (i, args, self.inqs[i], self.outq))
+			p.daemon = True
+			p.start()
+			self.workers.append(p)
+		self.stopping = threading.Event()
+		self.flusher = threading.Thread(target = self.flushPeriodically, name = "decode pool flusher")
+		self.flusher.daemon = True
+		self.flusher.start()
+
+	# send out what's held back and apply what has come back, even when no frames arrive
+	def flushPeriodically(self):
+		while not self.stopping.wait(FLUSH_INTERVAL):
+			with self.lock:
+				if not self.closed:
+					self.flushIfDue()
+
+	# front stage: send the frame to the worker for its aircraft
+	def decode(self, d):
+		aa = crc.frameAddress(d)
+		i = (aa or 0) % len(self.inqs)
+		if not isinstance(d, str):
+			d = str(bytearray(d))
+		with self.lock:
+			pending = self.pending[i]
+			pending.append(d)
+			if len(pending) >= BATCH:
+				self.send(i)
+				self.poll()
+			self.flushIfDue()
+
+	# results are picked up when a batch goes out, and at least every FLUSH_INTERVAL
+	def flushIfDue(self):
+		if time.time() - self.lastFlush > FLUSH_INTERVAL:
+			self.flush(wait = False)
+
+	# the pool decodes frame by frame, rows of frames are just split up
+	def decodeBatch(self, frames, detail = True):
+		for f in frames:
+			self.decode(f.tostring())
+
+	def send(self, i):
+		self.inqs[i].put(('frames', (self.pending[i], self.wantMessages())))
+		self.pending[i] = []
+		self.outstanding += 1
+
+	# Send out every frame held back, and (with wait) apply the results of all of them
+	def flush(self, wait = True):
+		with self.lock:
+			for i in range(len(self.inqs)):
+				if self.pending[i]:
+					self.send(i)
+			self.lastFlush = time.time()
+			while wait and self.outstanding > 0:
+				self.apply(self.outq.get())
+			self.poll()
+
+	# apply whatever results have come back
+	def poll(self):
+		while self.outstanding > 0:
+			try:
+				result = self.outq.get_nowait()
+			except Queue.Empty:
+				return
+			self.apply(result)
+
+	def apply(self, result):
+		(index, records, deleted, stats, texts) = result
+		self.outstanding -= 1
+		# deletes first: a worker drops the record of an aircraft it ages out, so a record for
+		# an address it also deleted means it was heard again afterwards
+		for aa in deleted:
+			a = self.recentAircraft.pop(aa, None)
+			if a != None:
+				self.notify("delAircraft", a)
+		for (aa, flags, state, first, points) in records:
+			a = self.recentAircraft.get(aa)
+			added = a == None or (flags & ADDED)
+			if added:
+				a = aircraft.Aircraft(self, aa)
+				self.recentAircraft[aa] = a
+			idStr = a.idStr
+			a.setState(state)
+			if a.idStr != idStr:
+				(a.airlineStr, a.callsignStr) = a.lookupAirlineByFlightID(a.idStr)
+			end = a.track.end()
+			for (seq, p) in enumerate(points, first):
+				if seq == end - 1:
+					a.track.replace(*p)
+				elif seq >= end:
+					a.track.append(*p)
+			if added:
+				self.notify("addAircraft", a)
+			if flags & UPDATED:
+				self.notify("updateAircraft", a)
+			if flags & POSITION:
+				self.notify("updateAircraftPosition", a)
+		for text in texts:
+			self.logMsg(messages.Text("%s", text))
+		self.workerStats[index] = stats
+		self.sumStats()
+
+	# add up the workers' statistics; the reader's own (rx level etc.) are kept
+	def sumStats(self):
+		s = self.stats
+		keep = (s.logfileSize, s.rxLevel, s.badShortPkts, s.badLongPkts)
+		s.reset()
+		(s.logfileSize, s.rxLevel, s.badShortPkts, s.badLongPkts) = keep
+		for w in self.workerStats:
+			s.add(w)
+
+	def updateStats(self, rxLevel, badShort, badLong, logfilesize):
+		with self.lock:
+			self.flushIfDue()
+			self.stats.logfileSize = int(logfilesize)
+			self.stats.rxLevel = int(rxLevel)
+			self.stats.badShortPkts = int(badShort)
+			self.stats.badLongPkts = int(badLong)
+			self.notify("rxLevelChanged", self.stats.rxLevel)
+			self.notify("updateStats", self.stats)
+
+	def logMsg(self, msg):
+		if self.subscribed("message"):
+			self.notify("message", msg)
+
+	def getOrigin(self):
+		return self.origin
+
+	def setOrigin(self, origin):
+		with self.lock:
+			self.origin = origin
+			self.flush(wait = False)		# frames already received are decoded with the old origin
+			for q in self.inqs:
+				q.put(('origin', origin))
+
+	def lookupFlightID(self, idStr):
+		if self.airlineCodes == None:
+			return [ '', '', '' ]
+		return self.airlineCodes.lookupByFlightID(idStr)
+
+	def lookupCountry(self, aa):
+		return icao24.allocations().lookupCountry(aa)
+
+	def isMilitary(self, aa):
+		return icao24.allocations().isMilitary(aa)
+
+	# decode what's held back, apply the results, and stop the workers
+	def close(self):
+		self.stopping.set()
+		with self.lock:
+			if self.closed:
+				return
+			self.flush()
+			self.closed = True
+		self.flusher.join()
+		for q in self.inqs:
+			q.put(None)
+		for p in self.workers:
+			p.join()
@@ -0,0 +1,126 @@
+# Pre-filter: drop unwanted frames from their raw bytes, before they reach the decoder
+#
+# A PreFilter takes the downlink formats wanted, the DF17/18 type codes wanted, lists of aircraft
+# addresses to allow or deny, and whether DF11/17/18 frames must pass parity.  These are compiled
+# into a table keyed on the first byte of the frame (5 bits DF, 3 bits CA/CF), saying for each
+# value: drop, keep, or look closer.  A frame which can be dropped on its DF alone costs one table
+# index.  Only the "look closer" frames have their type code (another table, keyed on byte 4),
+# parity or address checked.
+#
+# With parity required, DF11/17/18 frames which fail it are dropped before --fix-errors could
+# repair them.  Replies with the address overlaid on the parity (DF0/4/5/16/20/21) can't be
+# checked without the aircraft table, and are left to the decoder.
+# Nothing in here depends on Qt.
+#
+
+import crc
+
+DROP = False
+KEEP = True
+CHECK = 2
+
+ALL_DFS = range(32)
+SQUITTER_DFS = (17, 18)
+PARITY_DFS = (11, 17, 18)	# frames with a plain CRC in the parity field
+
+# a table keyed on a byte, whether it comes as an int (bytearray, USB array) or a char (str)
+def byteTable(values):
+	table = {}
+	for (b, v) in enumerate(values):
+		table[b] = v
+		table[chr(b)] = v
+	return table
+
+class PreFilter(object):
+	def __init__(self, dfs = None, tcs = None, allow = None, deny = None, crcRequired = False):
+		self.dfs = set(dfs or ALL_DFS)
+		self.tcs = tcs != None and set(tcs) or None
+		self.allow = allow and set(allow) or None
+		self.deny = deny and set(deny) or None
+		self.crcRequired = crcRequired
+		self.first = [ self.compile(b) for b in range(256) ]
+		self.firstTable = byteTable(self.first)
+		self.tcTable = byteTable([ self.tcs == None or (b >> 3) in self.tcs for b in range(256) ])
+
+	# what to do with a frame whose first byte is b
+	def compile(self, b):
+		df = b >> 3
+		if df not in self.dfs:
+			return DROP
+		if self.tcs != None and df in SQUITTER_DFS:
+			return CHECK
+		if self.crcRequired and df in PARITY_DFS:
+			return CHECK
+		if self.allow != None or self.deny != None:
+			return CHECK
+		return KEEP
+
+	# True if the frame d (str, bytearray or USB array) should be decoded
+	def accept(self, d):
+		v = self.firstTable[d[0]]
+		if v is not CHECK:
+			return v
+		return self.check(bytearray(d))
+
+	def check(self, d):
+		df = d[0] >> 3
+		nbytes = df < 16 and 7 or 14
+		if len(d) < nbytes:
+			return False
+		if self.tcs != None and df in SQUITTER_DFS and not self.tcTable[d[4]]:
+			return False
+		if self.crcRequired and df in PARITY_DFS:
+			syn = crc.syndrome(d[0:nbytes])
+			if df == 11:
+				syn &= ~0x7F		# IIC/SI overlaid on the low 7 bits
+			if syn != 0:
+				return False
+		if self.allow != None or self.deny != None:
+			aa = crc.frameAddress(d[0:nbytes])
+			if self.allow != None and aa not in self.allow:
+				return False
+			if self.deny != None and aa in self.deny:
+				return False
+		return True
+
+	# Boolean mask of the rows of an (N, 14) uint8 array of frames to keep (needs numpy)
+	def acceptRows(self, frames):
+		import numpy
+		v = numpy.array([ int(x) for x in self.first ], dtype = numpy.uint8)[frames[:, 0]]
+		mask = v == int(KEEP)
+		for i in (v == CHECK).nonzero()[0]:
+			mask[i] = self.check(bytearray(frames[i].tostring()))
+		return mask
+
+# "17,18" or "9-18,19" -> [ 17, 18 ] or [ 9, 10, ..., 18, 19 ]
+def parseList(s, base = 10):
+	values = []
+	for item in s.split(','):
+		item = item.strip()
+		if item == '':
+			continue
+		if '-' in item:
+			(lo, hi) = item.split('-', 1)
+			values += range(int(lo, base), int(hi, base) + 1)
+		else:
+			values.append(int(item, base))
+	return values
+
+def addArguments(parser):
+	parser.add_argument('--df', dest="filterdf", help="only decode these downlink formats, e.g. 11,17,18", metavar="LIST")
+	parser.add_argument('--tc', dest="filtertc", help="only decode DF17/18 frames with these type codes, e.g. 9-18,19", metavar="LIST")
+	parser.add_argument('--icao', dest="filtericao", help="only decode frames from these aircraft addresses (hex), e.g. A1B2C3,A1B2C4", metavar="LIST")
+	parser.add_argument('--icao-deny', dest="filterdeny", help="drop frames from these aircraft addresses (hex)", metavar="LIST")
+	parser.add_argument('--crc', dest="filtercrc", help="drop DF11/17/18 frames which fail parity", action="store_true")
+
+# a PreFilter for the options given, or None if there is nothing to filter
+def fromArgs(args):
+	dfs = getattr(args, 'filterdf', None)
+	tcs = getattr(args, 'filtertc', None)
+	allow = getattr(args, 'filtericao', None)
+	deny = getattr(args, 'filterdeny', None)
+	crcRequired = getattr(args, 'filtercrc', False)
+	if not (dfs or tcs or allow or deny or crcRequired):
+		return None
+	return PreFilter(dfs and parseList(dfs), tcs and parseList(tcs), allow and parseList(allow, 16), \
+		deny and parseList(deny, 16), crcRequired)
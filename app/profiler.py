@@ -0,0 +1,211 @@
+# Pipeline profiling: per-stage latency histograms, and optionally yappi
+#
+# With --profile, each stage of the pipeline is timed on every call, into a fixed-bucket
+# histogram (one bucket per power of two, 2 us to 16 s), so the cost is two clock reads and an
+# increment whatever the load.  The stages are:
+#	read		USB read (UsbServiceThread) or readline from a socket or file; includes any
+#			wait for the next frame
+#	parse		hex text to frame bytes
+#	decode DFnn	the decoder, per downlink format; includes the stages below
+#	crc		parity calculation
+#	aircraft	creating and updating Aircraft
+#	emit		events to the Qt adapter, and on as signals
+#	gui table	the aircraft table slots, on the GUI thread
+#	gui map		the map slot, on the GUI thread
+# Stages are timed by wrapping the methods concerned when profiling is turned on (instrument()),
+# so nothing changes when it is off.  With --jobs, the decoder stages run in the worker processes
+# and aren't timed, decode(), in the front stage, is.
+#
+# The histograms are printed every --profile seconds and on exit.  With --profile-yappi, yappi
+# also profiles everything for that many seconds out of each interval, and the functions with
+# the most time are printed along with the histograms.
+# Histograms are updated without a lock, so two threads in the same stage at once may, rarely,
+# lose a count.  Nothing in here depends on Qt.
+#
+
+import sys
+import math
+import time
+import threading
+
+MIN_EXP = -19			# first bucket: under 2**-19 s (~2 us)
+NBUCKETS = 24			# last bucket: 2**4 s and over
+YAPPI_TOP = 25			# functions printed per yappi sample
+
+# the Aircraft methods the decoder calls
+AIRCRAFT_UPDATES = ('setIdentityInfo', 'setGroundPos', 'setAirbornePos', 'setAirborneVel', 'setACASInfo',
+	'setCommBAltitude', 'setCommBIdent', 'setAltitude', 'setEmergStatus', 'setIICSeen', 'setFakeICAO24')
+
+class Histogram(object):
+	__slots__ = ('counts', 'total', 'max')
+
+	def __init__(self):
+		self.counts = [ 0 ] * NBUCKETS
+		self.total = 0.0
+		self.max = 0.0
+
+	def add(self, dt):
+		e = 0
+		if dt > 0:
+			e = math.frexp(dt)[1] - MIN_EXP		# dt < 2**(e + MIN_EXP)
+		self.counts[min(max(e, 0), NBUCKETS - 1)] += 1
+		self.total += dt
+		if dt > self.max:
+			self.max = dt
+
+	def count(self):
+		return sum(self.counts)
+
+	# upper edge of the bucket holding the p'th percentile, in seconds
+	def percentile(self, p):
+		n = self.count()
+		if n == 0:
+			return 0.0
+		limit = p / 100.0 * n
+		c = 0
+		for (i, k) in enumerate(self.counts):
+			c += k
+			if c >= limit:
+				break
+		return min(math.ldexp(1.0, i + MIN_EXP), self.max)
+
+# upper edge of bucket i, for display
+def bucketStr(i):
+	t = math.ldexp(1.0, i + MIN_EXP)
+	if i == NBUCKETS - 1:
+		return ">=%gs" % (t / 2)
+	if t < 1e-3:
+		return "<%.0fus" % (t * 1e6)
+	if t < 1.0:
+		return "<%.0fms" % (t * 1e3)
+	return "<%.0fs" % t
+
+class Profiler(object):
+	def __init__(self, interval = 60.0, yappiSecs = 0.0, out = None):
+		self.interval = interval
+		self.yappiSecs = yappiSecs
+		self.out = out or sys.stdout
+		self.stages = {}		# name -> Histogram
+		self.order = []			# names, in the order first seen
+		self.started = time.time()
+		self.lock = threading.Lock()	# for adding stages and printing, not for timing
+		self.yappiText = ""
+		self.thread = None
+
+	def histogram(self, stage):
+		with self.lock:
+			h = self.stages.get(stage)
+			if h == None:
+				h = self.stages[stage] = Histogram()
+				self.order.append(stage)
+			return h
+
+	# fn, timed as stage
+	def wrap(self, stage, fn):
+		add = self.histogram(stage).add
+		clock = time.time
+		def timed(*args, **kwargs):
+			t = clock()
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				add(clock() - t)
+		timed.profiledStage = stage
+		return timed
+
+	# time the named methods of obj as stage: an instance's own, or a class's for every instance
+	def instrument(self, obj, names, stage):
+		for name in names:
+			if isinstance(obj, type):
+				fn = obj.__dict__.get(name)
+			else:
+				fn = getattr(obj, name, None)
+			if fn == None or hasattr(fn, 'profiledStage'):
+				continue		# not there, or already timed
+			setattr(obj, name, self.wrap(stage, fn))
+
+	# the decoder's stages: per-DF decoding, CRC, aircraft updates and events
+	def instrumentDecoder(self, dec):
+		import aircraft
+		for name in dir(dec):
+			if name.startswith('DecodeDF'):
+				self.instrument(dec, [ name ], "decode DF%s" % name[8:])
+		if not hasattr(dec, 'DecodeDF17'):
+			self.instrument(dec, [ 'decode' ], "decode")	# the pool's front stage
+		self.instrument(dec, [ 'calcParity' ], "crc")
+		self.instrument(dec, [ 'recordAircraft' ], "aircraft")
+		self.instrument(aircraft.Aircraft, AIRCRAFT_UPDATES, "aircraft")
+		self.instrument(dec, [ 'notify' ], "emit")
+
+	def report(self):
+		lines = []
+		elapsed = time.time() - self.started
+		lines.append("---- profile after %.0f s ----" % elapsed)
+		lines.append("%-14s %10s %9s %6s %9s %9s %9s %9s" % ("Stage", "Calls", "Calls/s", "Busy", "Mean us", "p50 us", "p99 us", "Max us"))
+		with self.lock:
+			stages = [ (name, self.stages[name]) for name in self.order ]
+		for (name, h) in stages:
+			n = h.count()
+			if n == 0:
+				continue
+			lines.append("%-14s %10u %9.0f %5.1f%% %9.1f %9.1f %9.1f %9.0f" % (name, n, n / elapsed, 100.0 * h.total / elapsed, \
+				h.total / n * 1e6, h.percentile(50) * 1e6, h.percentile(99) * 1e6, h.max * 1e6))
+			lines.append("    " + " ".join([ "%s:%u" % (bucketStr(i), k) for (i, k) in enumerate(h.counts) if k ]))
+		if self.yappiText:
+			lines.append(self.yappiText)
+		return "\n".join(lines)
+
+	def dump(self):
+		text = self.report()
+		with self.lock:
+			print >>self.out, text
+			self.out.flush()
+
+	# print every interval seconds from a background thread, sampling with yappi if asked
+	def start(self):
+		if self.thread == None and self.interval > 0:
+			self.thread = threading.Thread(target = self.run, name = "profiler")
+			self.thread.daemon = True
+			self.thread.start()
+
+	def run(self):
+		while True:
+			wait = self.interval
+			if self.yappiSecs > 0:
+				secs = min(self.yappiSecs, self.interval)
+				self.yappiText = sampleYappi(secs)
+				wait -= secs
+			time.sleep(max(wait, 0))
+			self.dump()
+
+# profile everything with yappi for secs, and return the top functions as text
+def sampleYappi(secs):
+	import yappi
+	import StringIO
+	yappi.clear_stats()
+	yappi.start()
+	time.sleep(secs)
+	yappi.stop()
+	out = StringIO.StringIO()
+	print >>out, "---- yappi, %g s sample ----" % secs
+	if hasattr(yappi, 'get_func_stats'):
+		stats = yappi.get_func_stats().sort("ttot")
+		for s in list(stats)[0:YAPPI_TOP]:
+			print >>out, "%10u %10.3f %10.3f  %s:%u %s" % (s.ncall, s.ttot, s.tsub, s.module, s.lineno, s.name)
+	else:
+		yappi.print_stats(out, yappi.SORTTYPE_TTOTAL, limit = YAPPI_TOP)	# older yappi
+	yappi.clear_stats()
+	return out.getvalue().rstrip()
+
+def addArguments(parser):
+	parser.add_argument('--profile', dest="profile", nargs='?', const=60.0, type=float, metavar="SECS", help="time each pipeline stage, printing the histograms every SECS (default 60) and on exit")
+	parser.add_argument('--profile-yappi', dest="profileyappi", type=float, metavar="SECS", help="with --profile, also profile everything with yappi for SECS out of every interval")
+
+# a started Profiler for the options given, or None
+def fromArgs(args):
+	interval = getattr(args, 'profile', None)
+	if interval == None:
+		return None
+	p = Profiler(interval, getattr(args, 'profileyappi', None) or 0.0)
+	p.start()
+	return p
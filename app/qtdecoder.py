@@ -0,0 +1,56 @@
+# Qt adapter for the decoder core
+# B. Kuschak, OpenADSB Project <brian@openadsb.com>
+#
+# decoder.Decoder knows nothing about Qt.  AdsbDecoder owns one (or a pool.DecodePool of them, with
+# --jobs), subscribes to its events and re-emits them as the Qt signals the GUI connects to:
+#	addAircraft(PyQt_PyObject), updateAircraft(PyQt_PyObject), updateAircraftPosition(PyQt_PyObject),
+#	delAircraft(PyQt_PyObject), updateStats(PyQt_PyObject), rxLevelChanged(int),
+#	decodedMessage(PyQt_PyObject) and appendText(const QString&)
+# Everything else (decode(), stats, recentAircraft, ...) is passed through to the core.
+#
+
+from PyQt4.QtCore import *
+import decoder
+import pool
+import messages
+
+class AdsbDecoder(QObject):
+
+	def __init__(self, args, reader):
+		QObject.__init__(self, parent = None)
+		app = getattr(reader, 'app', None)
+		if int(getattr(args, 'jobs', 0) or 0) > 1:
+			self.core = pool.DecodePool(args, reader, getattr(app, 'airlineCodes', None))
+			self.core.wantMessages = self.wantMessages	# so the workers only render messages we show
+		else:
+			self.core = decoder.Decoder(args, reader, getattr(app, 'airlineCodes', None))
+		for event in ("addAircraft", "updateAircraft", "updateAircraftPosition", "delAircraft"):
+			self.core.subscribe(event, self.emitter(event + "(PyQt_PyObject)"))
+		self.core.subscribe("updateStats", self.emitter("updateStats(PyQt_PyObject)"))
+		self.core.subscribe("rxLevelChanged", self.emitter("rxLevelChanged(int)"))
+		self.core.subscribe("message", self.message)
+		profiler = getattr(app, 'profiler', None)
+		if profiler != None:
+			profiler.instrumentDecoder(self.core)
+
+	def __getattr__(self, name):
+		# only called for attributes we don't have ourselves
+		if name == 'core':
+			raise AttributeError(name)
+		return getattr(self.core, name)
+
+	def emitter(self, signature):
+		sig = SIGNAL(signature)
+		return lambda *args: self.emit(sig, *args)
+
+	# True if anything is connected to the signals decoded messages go out on
+	def wantMessages(self):
+		return self.receivers(SIGNAL("decodedMessage(PyQt_PyObject)")) > 0 or \
+			self.receivers(SIGNAL("appendText(const QString&)")) > 0
+
+	# Decoded messages are only rendered to text if someone is connected to appendText
+	def message(self, msg):
+		if self.receivers(SIGNAL("decodedMessage(PyQt_PyObject)")) > 0:
+			self.emit(SIGNAL("decodedMessage(PyQt_PyObject)"), msg)
+		if self.receivers(SIGNAL("appendText(const QString&)")) > 0:
+			self.emit(SIGNAL("appendText(const QString&)"), QString(messages.render(msg)))
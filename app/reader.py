@@ -11,10 +11,18 @@ import argparse
 import Queue
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
-import decoder
+import qtdecoder
+import prefilter
+import binlog
+import logindex
+import logwriter
+import replay
+import itertools
 import yappi
 
 packetlog_fname = "packetlog.txt"
+binlog_fname = "packetlog.bin"
+receiverIds = itertools.count()		# receiver ids for the binary log, in the order readers are created
 
 # Base class for readers (from USB, serial, file, other?)
 #class AdsbReaderThread(threading.Thread):
@@ -29,9 +37,17 @@ class AdsbReaderThread(QThread):
 	self.bad_short_pkts = 0
 	self.bad_long_pkts = 0
 	self.kill_received = False
-	self.decoder = decoder.AdsbDecoder(args, self)
+	self.decoder = qtdecoder.AdsbDecoder(args, self)
 	self.decoder.moveToThread(self)
-	self.PACKETLOG = None
+	self.prefilter = prefilter.fromArgs(args)	# None if every frame is wanted
+	self.profiler = getattr(app, 'profiler', None)	# see profiler.py
+	if self.profiler != None:
+		self.profiler.instrument(self, [ 'parseLine' ], "parse")
+	self.dedup = getattr(app, 'dedup', None)	# shared with the other readers, see dedup.py
+	self.feed = None
+	self.PACKETLOG = None		# a LogWriter, see logwriter.py
+	self.binaryLog = getattr(args, 'binarylog', False)	# log in the binary format, see binlog.py
+	self.receiverId = receiverIds.next()
 	#self.yappi = yappi
 	#self.yappi.start()
 
@@ -42,29 +58,67 @@ class AdsbReaderThread(QThread):
     def getDecoder(self):
 	return self.decoder
 
-    def logPacket(self, d):
-	ts = time.time()
-	str = ""
-	for byte in d:
-		str += "%02hx " % byte
-	str2 = "%u %u %s\n" % (ts, len(d), str)
-	self.PACKETLOG.write(str2)
+    # name of this feed in the coverage stats
+    def feedName(self):
+	return self.__class__.__name__
+
+    # decode a frame, unless it is filtered out or another reader has already decoded the same one
+    def decodeFrame(self, d):
+	if self.prefilter != None and not self.prefilter.accept(d):
+		return
+	if self.dedup != None:
+		if self.feed == None:
+			self.feed = self.dedup.addFeed(self.feedName())
+		if not self.dedup.check(self.feed, d):
+			return
+	self.decoder.decode(d)
+
+    # a packet log or network line ("timestamp length hex bytes ...") to the frame bytes
+    def parseLine(self, line):
+	s = line.strip().split()
+	return binascii.unhexlify("".join(s[2:]))		# hex string to binary
+
+    # a line parseLine couldn't make sense of, counted as a bad short or long packet by its length
+    def countBadLine(self, line):
+	if len("".join(line.strip().split()[2:])) > 14:
+		self.bad_long_pkts += 1
+	else:
+		self.bad_short_pkts += 1
+
+    # f.readline, timed as the read stage if profiling
+    def lineReader(self, f):
+	if self.profiler != None:
+		return self.profiler.wrap("read", f.readline)
+	return f.readline
 
-    def logPacketStr(self, str):
-	self.PACKETLOG.write(str)
+    # queue a frame for the log writer thread, which formats and writes it
+    def logPacket(self, d, rxlevel = 0):
+	self.PACKETLOG.put(d, time.time(), self.receiverId, rxlevel)
+
+    # log a line received from the network, d being its frame bytes
+    def logPacketStr(self, str, d):
+	self.PACKETLOG.put(d, logindex.lineTime(str), self.receiverId)
 
     def openLogfile(self, name):
+	fname = self.binaryLog and binlog_fname or packetlog_fname
 	if name != "":
-		name = "%s.%s" % (packetlog_fname, name)
+		name = "%s.%s" % (fname, name)
 	else:
-		name = packetlog_fname
-	self.PACKETLOG = open(name, "a")
+		name = fname
+	self.PACKETLOG = logwriter.fromArgs(self.args, name)	# shared with any other reader logging to name
 	print "Opened logfile %s" % name
 	print self.PACKETLOG
 
-	
+    # write out what's still queued for the log, and stop logging
+    def closeLogfile(self):
+	if self.PACKETLOG != None:
+		logwriter.release(self.PACKETLOG)
+		self.PACKETLOG = None
+
     def logfileSize(self):
-	return self.PACKETLOG.tell()
+	if self.PACKETLOG == None:
+		return 0
+	return self.PACKETLOG.size()
 
     def dumpPacket(self, d):
 	ts = time.asctime()
@@ -100,62 +154,165 @@ class AdsbReaderThread(QThread):
 	pass
 
     def setOrigin(self, origin):
-	self.decoder.origin = origin
+	self.decoder.setOrigin(origin)
 
 # This class interfaces to a previously recorded file of packets
 class AdsbReaderThreadFile(AdsbReaderThread):
 
     def __init__(self, args, app):
 	AdsbReaderThread.__init__(self, args, app)
+	self.pacer = replay.fromArgs(args, lambda: self.kill_received)	# None unless --speed, see replay.py
 
     def __del__(self):
 	pass
 	#AdsbReaderThread.__del__(self)
 
-    # fixme - handle timestamps in file
+    def feedName(self):
+	return "file %s" % self.args.filename
+
+    # the log, read only, at the packet to start from: --skip packets in, and not before --start-time.
+    # A text log's index finds it without reading what comes before, see logindex.py
+    def openLog(self):
+	return logindex.openAt(self.args.filename, int(self.args.skip), getattr(self.args, 'starttime', None))[0]
+
     def read(self):
+	if binlog.isBinLog(self.args.filename):
+		return self.readBinary()
+	if getattr(self.args, 'bulk', None):
+		return self.readBulk()
 	fname = self.args.filename;
 	count = int(self.args.count);
-	skip = int(self.args.skip);
+	end = getattr(self.args, 'endtime', None)
 	ls = 0
 	pktCnt = 0
-	RDONLY_PACKETLOG = open(fname, "r")	# read only
-	while skip > 0:
-		d = RDONLY_PACKETLOG.readline();
-		skip -= 1
+	RDONLY_PACKETLOG = self.openLog()
 
-	d = RDONLY_PACKETLOG.readline();
+	readline = self.lineReader(RDONLY_PACKETLOG)
+	d = readline();
 	while count != 0 and len(d) > 0 and not self.kill_received:
+		if end != None or self.pacer != None:
+			t = logindex.lineTime(d)
+			if end != None and t >= end:
+				break
+			if self.pacer != None:
+				self.pacer.wait(t)
 		count -= 1
 		if len(d) > 0:
-			# extract fields
-			s = d.strip().split()
-			#print s
-			(ts, nbytes) = (s[0], s[1])
-			d = ""
-			d = d.join(s[2:]).strip()
-			#print d
-			#print type(d), len(d)
-			#print type(binascii.a2b_hex(d))
 			try:
-				d = binascii.unhexlify(d)		# hex string to binary
+				d = self.parseLine(d)
 				#self.dumpPacket(d)
 				self.servePacket(d)
-				self.decoder.decode(d)
+				self.decodeFrame(d)
 				self.decoder.updateStats(0, self.bad_short_pkts, self.bad_long_pkts, RDONLY_PACKETLOG.tell())
 			except:
 				pass
 		ls += len(d)
-		d = RDONLY_PACKETLOG.readline();
+		d = readline();
 		if (count%5000) == 0:
 			time.sleep(0.02)		# yield briefly, since we cannot control thread priority
+	self.decoder.flush()
+	self.decoder.updateStats(0, self.bad_short_pkts, self.bad_long_pkts, RDONLY_PACKETLOG.tell())
 	#decoder.dumpAircraftTracks()
 	return 0
 
+    # Bulk replay: collect packets into chunks and hand each chunk to the vectorized batch decoder.
+    # Packets are not served to network clients in this mode.
+    def readBulk(self):
+	import numpy
+	fname = self.args.filename;
+	count = int(self.args.count);
+	end = getattr(self.args, 'endtime', None)
+	chunk = int(self.args.bulk)
+	frames = numpy.zeros((chunk, 14), dtype=numpy.uint8)
+	n = 0
+	t = None
+	RDONLY_PACKETLOG = self.openLog()
+
+	d = RDONLY_PACKETLOG.readline();
+	while count != 0 and len(d) > 0 and not self.kill_received:
+		if end != None or self.pacer != None:
+			t = logindex.lineTime(d)
+			if end != None and t >= end:
+				break
+		count -= 1
+		try:
+			d = self.parseLine(d)
+		except TypeError:
+			d = ""
+		if len(d) == 7 or len(d) == 14:
+			frames[n, 0:len(d)] = numpy.frombuffer(d, dtype=numpy.uint8)
+			frames[n, len(d):] = 0
+			n += 1
+			if n == chunk:
+				if self.pacer != None:
+					self.pacer.wait(t, n)
+				self.decodeChunk(frames, RDONLY_PACKETLOG.tell())
+				n = 0
+		d = RDONLY_PACKETLOG.readline();
+	if n > 0:
+		if self.pacer != None:
+			self.pacer.wait(t, n)
+		self.decodeChunk(frames[0:n], RDONLY_PACKETLOG.tell())
+	self.decoder.flush()
+	self.decoder.updateStats(0, self.bad_short_pkts, self.bad_long_pkts, RDONLY_PACKETLOG.tell())
+	return 0
+
+    # Replay a binary log (see binlog.py).  Frames are slices of the mapped file, nothing is parsed,
+    # and --skip and the time limits are seeks.  With --bulk, chunks of the mapped records go straight
+    # to the batch decoder.
+    def readBinary(self):
+	log = binlog.Reader(self.args.filename)
+	start = min(int(self.args.skip), len(log))
+	stop = len(log)
+	if getattr(self.args, 'starttime', None) != None:
+		start = max(start, log.search(self.args.starttime))
+	if getattr(self.args, 'endtime', None) != None:
+		stop = max(start, log.search(self.args.endtime))
+	count = int(self.args.count)
+	if count >= 0:
+		stop = min(start + count, stop)
+	chunk = getattr(self.args, 'bulk', None)
+	if chunk:
+		frames = log.array()['data']
+		for i in xrange(start, stop, chunk):
+			if self.kill_received:
+				break
+			last = min(i + chunk, stop)
+			if self.pacer != None:
+				self.pacer.wait(log.time(last - 1), last - i)
+			self.decodeChunk(frames[i:last], log.offset(last))
+	else:
+		for i in xrange(start, stop):
+			if self.kill_received:
+				break
+			if self.pacer != None:
+				self.pacer.wait(log.time(i))
+			d = log.frame(i)
+			self.servePacket(d)
+			self.decodeFrame(d)
+			self.decoder.updateStats(0, self.bad_short_pkts, self.bad_long_pkts, log.offset(i + 1))
+			if (i - start) % 5000 == 4999:
+				time.sleep(0.02)		# yield briefly, since we cannot control thread priority
+	self.decoder.flush()
+	self.decoder.updateStats(0, self.bad_short_pkts, self.bad_long_pkts, log.offset(stop))
+	frames = None
+	log.close()
+	return 0
+
+    def decodeChunk(self, frames, pos):
+	if self.prefilter != None:
+		frames = frames[self.prefilter.acceptRows(frames)]
+	self.decoder.decodeBatch(frames)
+	self.decoder.updateStats(0, self.bad_short_pkts, self.bad_long_pkts, pos)
+	time.sleep(0.02)		# yield briefly, since we cannot control thread priority
+
     def run(self):
 	#yappi.start()
 	print "Reading packets from file ..."
 	b = self.read()
+	self.decoder.close()
+	if self.pacer != None:
+		self.pacer.report()
 	#yappi.print_stats()
 	#return b
 
@@ -167,6 +324,9 @@ class AdsbReaderThreadSocket(AdsbReaderThread):
     def __init__(self, args, app):
 	AdsbReaderThread.__init__(self, args, app)
 
+    def feedName(self):
+	return "%s:%s" % (self.args.host, self.args.port)
+
     def read(self):
 	# fixme - use ClientThread here instead?
 	ls = 0
@@ -184,31 +344,35 @@ class AdsbReaderThreadSocket(AdsbReaderThread):
 
 	# fixme - get location info from server 
 
-	d = f.readline();
+	readline = self.lineReader(f)
+	d = readline();
 	while len(d) > 0 and not self.kill_received:
 		if len(d) > 0:
-			# extract fields
-			self.logPacketStr(d)
-			s = d.strip().split()
-			(ts, nbytes) = (s[0], s[1])
-			d = ""
-			d = d.join(s[2:]).strip()
+			line = d
 			try:
-				d = binascii.unhexlify(d)		# hex string to binary
-				#self.dumpPacket(d)
-				self.servePacket(d)
-				self.decoder.decode(d)
-				self.decoder.updateStats(0, self.bad_short_pkts, self.bad_long_pkts, self.logfileSize())
-			except:
-				pass
+				d = self.parseLine(line)
+			except TypeError:
+				self.countBadLine(line)		# not logged either: the log holds frames
+				d = ""
+			if len(d) > 0:
+				try:
+					self.logPacketStr(line, d)
+					#self.dumpPacket(d)
+					self.servePacket(d)
+					self.decodeFrame(d)
+				except:
+					pass
+			self.decoder.updateStats(0, self.bad_short_pkts, self.bad_long_pkts, self.logfileSize())
 		ls += len(d)
-		d = f.readline();
+		d = readline();
 	print "Disconnecting from server %s:%s" % (self.args.host, self.args.port)
+	self.closeLogfile()
 	return 0
 
     def run(self):
 	print "Reading packets from network..."
 	b = self.read()
+	self.decoder.close()
 	return b
 
 
@@ -218,6 +382,9 @@ class AdsbReaderThreadClientServer(AdsbReaderThread):
     def __init__(self, args, clientserver, app):
 	AdsbReaderThread.__init__(self, args, app)
 	self.clientserver = clientserver		# client or server
+
+    def feedName(self):
+	return "network ingest"
  
     def read(self):
 	ls = 0
@@ -235,17 +402,11 @@ class AdsbReaderThreadClientServer(AdsbReaderThread):
 			if len(d) > 4:
 				pktCnt = pktCnt + 1
 
-				# extract fields
-				s = d.strip().split()
-				(ts, nbytes) = (s[0], s[1])
-				d = ""
-				d = d.join(s[2:]).strip()
-				#print "new d =", type(d), d
 				try:
-					d = binascii.unhexlify(d)		# hex string to binary
+					d = self.parseLine(d)
 					#self.dumpPacket(d)
 					#self.servePacket(d)			# fixme - we don't want to serve back to ourself, right?
-					self.decoder.decode(d)
+					self.decodeFrame(d)
 					#self.decoder.updateStats(rxlevel, self.bad_short_pkts, self.bad_long_pkts, self.logfileSize())
 				except:
 					print "got exception"
@@ -258,6 +419,7 @@ class AdsbReaderThreadClientServer(AdsbReaderThread):
 	# Don't return until the we're killed
 	print "Reading packets from network..."
 	b = self.read()
+	self.decoder.close()
 
 
 # We want to read from the USB port at the highest possible rate, to avoid stalling the receiver. 
@@ -273,9 +435,12 @@ class UsbServiceThread(QThread):
 		self.setPriority(QThread.HighPriority)
 		pktCnt = 0
 		starttime = time.time()
+		read = self.readerThread.dev.read
+		if self.readerThread.profiler != None:
+			read = self.readerThread.profiler.wrap("read", read)
 		while not self.kill_received:
 			try:
-				d = self.readerThread.dev.read(0x81, 64, 0, 10000)
+				d = read(0x81, 64, 0, 10000)
 			except:
 				# device might have been removed
 				# terminate thread
@@ -317,6 +482,9 @@ class AdsbReaderThreadUSB(AdsbReaderThread):
 	AdsbReaderThread.__init__(self, args, app)
 	self.dev = dev
 	self.usbThread = UsbServiceThread(self)		# use another thread to keep servicing port at high rate
+
+    def feedName(self):
+	return "USB %s" % getattr(self.dev, 'serial_number', '')
  
     def read(self):
 	ls = 0
@@ -335,10 +503,10 @@ class AdsbReaderThreadUSB(AdsbReaderThread):
 			self.bad_short_pkts += int(d[4])
 			self.bad_long_pkts += int(d[5])
 			d = d[8:]
-			self.logPacket(d)
+			self.logPacket(d, rxlevel)
 			#self.dumpPacket(d)
 			self.servePacket(d)
-			self.decoder.decode(d)
+			self.decodeFrame(d)
 			self.decoder.updateStats(rxlevel, self.bad_short_pkts, self.bad_long_pkts, self.logfileSize())
 		else:
 			# zero-length item indicates we're done
@@ -389,6 +557,8 @@ class AdsbReaderThreadUSB(AdsbReaderThread):
 	# Don't return until the USB device is removed.
 	b = self.read()
 	print "read returned ",b
+	self.closeLogfile()
+	self.decoder.close()
 
 	# kill USB service thread
 	self.usbThread.kill_received = True
@@ -0,0 +1,81 @@
+# Registry of the aircraft we are currently hearing, and when to forget them
+#
+# Each aircraft has an expiry time: its last-seen timestamp plus a timeout which depends on
+# what it is doing (airborne, on the ground, or a TIS-B target).  Expiry times sit in a heap.
+# Aircraft update their timestamp and state without telling us, so heap entries may be stale:
+# an entry is only the earliest the aircraft could expire, going by the shortest timeout, since
+# it may yet move to that state.  When an entry comes due we recompute that aircraft's expiry and
+# push it back if it isn't due yet.  Aging therefore only touches aircraft whose entry is due,
+# never the whole table.
+# Nothing in here depends on Qt.
+#
+
+import heapq
+import clock
+
+AIRBORNE = 0
+GROUND = 1
+TISB = 2
+
+# seconds of silence before an aircraft is forgotten, per state
+DEFAULT_TIMEOUTS = { AIRBORNE: 120.0, GROUND: 300.0, TISB: 60.0 }
+
+class AircraftRegistry:
+	def __init__(self, timeouts = None):
+		self.aircraft = {}		# aa -> Aircraft
+		self.heap = []			# ( expiry time, aa ), possibly stale
+		self.queued = set()		# addresses with an entry in the heap, at most one each
+		self.timeouts = dict(DEFAULT_TIMEOUTS)
+		if timeouts != None:
+			self.timeouts.update(timeouts)
+		self.minTimeout = min(self.timeouts.values())
+
+	def state(self, a):
+		if a.fakeICAO24:
+			return TISB
+		elif a.isOnGround():
+			return GROUND
+		return AIRBORNE
+
+	def expiry(self, a):
+		return a.getTimestamp() + self.timeouts[self.state(a)]
+
+	def add(self, a):
+		self.aircraft[a.aa] = a
+		if a.aa not in self.queued:
+			# an entry left over from before a remove() will do, it is recomputed when it comes due
+			self.queued.add(a.aa)
+			heapq.heappush(self.heap, (a.getTimestamp() + self.minTimeout, a.aa))
+
+	def get(self, aa):
+		return self.aircraft.get(aa)
+
+	def remove(self, aa):
+		# the heap entry is dropped when it comes due
+		if aa in self.aircraft:
+			del self.aircraft[aa]
+
+	def __len__(self):
+		return len(self.aircraft)
+
+	# Remove and return the aircraft which have expired by now
+	def expire(self, now = None):
+		if now == None:
+			now = clock.now()
+		expired = []
+		heap = self.heap
+		while heap and heap[0][0] <= now:
+			(t, aa) = heapq.heappop(heap)
+			a = self.aircraft.get(aa)
+			if a == None:
+				self.queued.discard(aa)		# already removed
+				continue
+			due = self.expiry(a)
+			if due > now:
+				# not yet, but if it is heard from in a state with a shorter timeout, it may be sooner
+				heapq.heappush(heap, (min(due, max(a.getTimestamp(), now) + self.minTimeout), aa))
+			else:
+				del self.aircraft[aa]
+				self.queued.discard(aa)
+				expired.append(a)
+		return expired
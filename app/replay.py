@@ -0,0 +1,103 @@
+# Paced replay of a packet log, by the timestamps recorded in it
+#
+# With --speed X, AdsbReaderThreadFile hands each frame on when it is due: X times faster than
+# it was recorded, measured from the first frame replayed.  Frames aren't slept for one at a
+# time.  Whatever is due within the next TICK goes straight through, and the reader sleeps only
+# when the next frame is further off than that, so there is at most one sleep per tick, and at
+# high speeds frames go out in bursts of a tick's worth.  With --bulk, each chunk goes when its
+# last frame is due.
+#
+# If decoding (or whoever is downstream) can't keep up, frames go out late rather than being
+# dropped.  How far behind the replay is, the worst so far, and the speed actually achieved are
+# printed every REPORT_INTERVAL and at the end.  --speed max replays as fast as possible, which is
+# what happens without --speed.
+#
+# Text logs record whole seconds, so a second's frames go out together; binary logs
+# (binlog.py) record microseconds.  A gap in the log is a gap in the replay, at the given speed.
+# Nothing in here depends on Qt.
+#
+
+import sys
+import time
+import argparse
+
+TICK = 0.05			# seconds
+REPORT_INTERVAL = 10.0		# seconds
+MAX_SLEEP = 0.5			# seconds, so a long gap in the log doesn't stop us noticing we're killed
+
+class Pacer(object):
+	def __init__(self, speed, stopped = None, tick = TICK, reportInterval = REPORT_INTERVAL, out = None):
+		self.speed = speed
+		self.stopped = stopped or (lambda: False)
+		self.tick = tick
+		self.reportInterval = reportInterval
+		self.out = out or sys.stdout
+		self.t0 = None			# log time of the first frame
+		self.wall0 = None		# and when it went out
+		self.logTime = None		# log time of the last frame
+		self.frames = 0
+		self.sleeps = 0
+		self.lag = 0.0			# seconds behind, as of the last frame
+		self.maxLag = 0.0
+		self.lastReport = None
+
+	# wait until frames recorded at time t are due; n is how many there are
+	def wait(self, t, n = 1):
+		if t == None:
+			return			# a line without a time
+		now = time.time()
+		if self.t0 == None:
+			(self.t0, self.wall0, self.lastReport) = (t, now, now)
+		due = self.wall0 + (t - self.t0) / self.speed
+		if due > now + self.tick:
+			self.sleeps += 1
+			while due > now and not self.stopped():
+				time.sleep(min(due - now, MAX_SLEEP))
+				now = time.time()
+		self.lag = max(now - due, 0.0)
+		self.maxLag = max(self.maxLag, self.lag)
+		self.frames += n
+		self.logTime = t
+		if now - self.lastReport >= self.reportInterval:
+			self.report()
+			self.lastReport = now
+
+	# the speed achieved so far
+	def achieved(self):
+		elapsed = time.time() - self.wall0
+		if self.t0 == None or elapsed <= 0:
+			return 0.0
+		return (self.logTime - self.t0) / elapsed
+
+	def status(self):
+		if self.t0 == None:
+			return "replay at %gx: nothing replayed" % self.speed
+		return "replay at %gx: %u frames, up to %s, %.2fx achieved, %.2f s behind (worst %.2f s), %u sleeps" % \
+			(self.speed, self.frames, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.logTime)), \
+			self.achieved(), self.lag, self.maxLag, self.sleeps)
+
+	def report(self):
+		print >>self.out, self.status()
+
+# "10", "10x" or "max" (0, as fast as possible)
+def parseSpeed(s):
+	s = s.lower().rstrip('x')
+	if s == "max":
+		return 0.0
+	try:
+		speed = float(s)
+	except ValueError:
+		speed = -1
+	if speed <= 0:
+		raise argparse.ArgumentTypeError("speed must be a positive number, e.g. 1 or 10x, or max")
+	return speed
+
+def addArguments(parser):
+	parser.add_argument('--speed', dest="speed", type=parseSpeed, metavar="X", help="when using -f, replay packets at X times the rate they were recorded at, e.g. 1, 10x, or max (the default, as fast as possible)")
+
+# a Pacer for the options given, or None if not pacing
+def fromArgs(args, stopped = None):
+	speed = getattr(args, 'speed', None)
+	if not speed:
+		return None
+	return Pacer(speed, stopped)
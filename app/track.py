@@ -0,0 +1,256 @@
+# Track store: an aircraft's positions as typed arrays, bounded in size
+#
+# Points are (lon, lat, alt, t) and are kept in four array('d') columns, 32 bytes a point
+# instead of a tuple of four floats in a list.  Each point also has a sequence number, counting
+# every point ever appended, so a renderer can remember where it got to and ask for the points
+# since then.
+#
+# A track holds at most capacity points.  When it is full the oldest half is dropped, so a
+# long flight keeps its most recent capacity/2 to capacity points and appending stays O(1)
+# amortized.
+#
+# The arrays are never resized in place: item assignment fills them, and growing or dropping
+# points builds new arrays.  So the NumPy views columns() hands out never move underneath a
+# renderer; they are snapshots which later appends don't touch.  The one exception is the
+# newest point, which a Simplifier may move (see below).
+#
+# A track may be simplified as the points come in (add() rather than append()): a Simplifier
+# drops points which lie within a lateral, vertical and time tolerance of the line through
+# their neighbours, an opening-window form of Douglas-Peucker.  The newest point is always
+# stored, so the track ends where the aircraft is, but while the points since the last kept
+# one still fit a straight line it is moved along rather than a new point added.
+# Nothing in here depends on Qt; numpy is only needed for columns().
+#
+
+import math
+from array import array
+
+DEFAULT_CAPACITY = 4096		# points per aircraft
+MIN_ALLOC = 16
+
+METERS_PER_DEGREE = 1852.0 * 60	# of latitude
+
+class Tolerance(object):
+	def __init__(self, lateral = 100.0, vertical = 100.0, time = 60.0):
+		self.lateral = lateral		# meters off the simplified line
+		self.vertical = vertical	# feet above or below it
+		self.time = time		# keep a point at least this often, seconds
+
+class Track(object):
+	__slots__ = ('capacity', 'lon', 'lat', 'alt', 't', 'n', 'first', 'simplifier')
+
+	def __init__(self, capacity = DEFAULT_CAPACITY, tolerance = None):
+		self.capacity = max(2, int(capacity))
+		self.lon = self.lat = self.alt = self.t = array('d')
+		self.n = 0			# points stored
+		self.first = 0			# sequence number of the oldest point stored
+		self.simplifier = None
+		if tolerance != None:
+			self.simplifier = Simplifier(tolerance)
+
+	def __len__(self):
+		return self.n
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [ self[j] for j in range(*i.indices(self.n)) ]
+		if i < 0:
+			i += self.n
+		if i < 0 or i >= self.n:
+			raise IndexError("track index out of range")
+		return (self.lon[i], self.lat[i], self.alt[i], self.t[i])
+
+	def __iter__(self):
+		for i in range(self.n):
+			yield (self.lon[i], self.lat[i], self.alt[i], self.t[i])
+
+	def append(self, lon, lat, alt, t):
+		n = self.n
+		if n == len(self.lon):
+			self.grow()
+			n = self.n
+		self.lon[n] = lon
+		self.lat[n] = lat
+		self.alt[n] = alt
+		self.t[n] = t
+		self.n = n + 1
+
+	# append a new position, or move the newest one if the track is simplified and it still fits
+	def add(self, lon, lat, alt, t):
+		if self.simplifier == None:
+			self.append(lon, lat, alt, t)
+		else:
+			self.simplifier.add(self, (lon, lat, alt, t))
+
+	# move the newest point
+	def replace(self, lon, lat, alt, t):
+		n = self.n - 1
+		self.lon[n] = lon
+		self.lat[n] = lat
+		self.alt[n] = alt
+		self.t[n] = t
+
+	# make room for at least one more point: double the arrays until they reach capacity,
+	# after that drop the oldest half
+	def grow(self):
+		size = len(self.lon)
+		if size < self.capacity:
+			drop = 0
+			size = min(self.capacity, max(MIN_ALLOC, size * 2))
+		else:
+			drop = self.n - self.capacity // 2
+		pad = array('d', [0.0]) * (size - (self.n - drop))
+		self.lon = self.lon[drop:self.n] + pad
+		self.lat = self.lat[drop:self.n] + pad
+		self.alt = self.alt[drop:self.n] + pad
+		self.t = self.t[drop:self.n] + pad
+		self.n -= drop
+		self.first += drop
+
+	# sequence number the next point will get, i.e. how many points were ever appended
+	def end(self):
+		return self.first + self.n
+
+	# index of the point with sequence number seq, clamped to the points stored
+	def index(self, seq):
+		return min(max(seq - self.first, 0), self.n)
+
+	# the points appended at or after sequence number seq (those still stored), as tuples
+	def since(self, seq):
+		return self[self.index(seq):]
+
+	# lon, lat, alt and t of the points since sequence number seq, as NumPy arrays sharing
+	# the track's memory
+	def columns(self, seq = 0):
+		import numpy
+		i = self.index(seq)
+		count = self.n - i
+		offset = i * self.lon.itemsize
+		return [ numpy.frombuffer(c, dtype = numpy.float64, count = count, offset = offset) \
+			for c in (self.lon, self.lat, self.alt, self.t) ]
+
+# Per-track state of the simplification: the last point kept for good (the anchor), and what
+# the points dropped since then allow of the line from the anchor to the newest point.
+# Rather than checking each dropped point again for every new one, each dropped point q narrows
+# two ranges as it is dropped: the directions from the anchor which pass within the lateral
+# tolerance of q, and the climb rates from the anchor which pass within the vertical tolerance
+# of q at its time.  A new point fits if its direction and climb rate are within both, and it
+# is no nearer the anchor than any dropped point.  So each new point costs the same however
+# many have been dropped.
+class Simplifier(object):
+	__slots__ = ('tol', 'anchor', 'floating', 'kx', 'ref', 'lo', 'hi', 'dmax', 'slo', 'shi')
+
+	def __init__(self, tolerance):
+		self.tol = tolerance
+		self.anchor = None
+		self.floating = False		# True if the newest point stored may still be moved
+
+	# p is the new anchor, nothing dropped since
+	def restart(self, p):
+		self.anchor = p
+		self.kx = math.cos(math.radians(p[1])) * METERS_PER_DEGREE
+		self.ref = None			# direction the lo, hi offsets are relative to, radians
+		self.lo = -math.pi
+		self.hi = math.pi
+		self.dmax = 0.0			# distance of the farthest dropped point, meters
+		self.slo = float('-inf')	# climb rate range, feet per second
+		self.shi = float('inf')
+
+	# position of p relative to the anchor: [ direction offset, distance in meters ]
+	def polar(self, p):
+		x = (p[0] - self.anchor[0]) * self.kx
+		y = (p[1] - self.anchor[1]) * METERS_PER_DEGREE
+		d = math.hypot(x, y)
+		theta = math.atan2(x, y)
+		if self.ref == None:
+			self.ref = theta
+		return [ (theta - self.ref + math.pi) % (2 * math.pi) - math.pi, d ]
+
+	# narrow the ranges so the line still passes within tolerance of q
+	def drop(self, q):
+		(theta, d) = self.polar(q)
+		if d > self.tol.lateral:
+			w = math.asin(self.tol.lateral / d)
+			self.lo = max(self.lo, theta - w)
+			self.hi = min(self.hi, theta + w)
+		self.dmax = max(self.dmax, d)
+		dt = q[3] - self.anchor[3]
+		dalt = q[2] - self.anchor[2]
+		if dt > 0:
+			self.slo = max(self.slo, (dalt - self.tol.vertical) / dt)
+			self.shi = min(self.shi, (dalt + self.tol.vertical) / dt)
+		elif abs(dalt) > self.tol.vertical:
+			self.slo = self.shi = float('nan')	# nothing fits
+
+	# True if the line from the anchor to p passes within tolerance of every point dropped
+	def fits(self, p):
+		dt = p[3] - self.anchor[3]
+		if dt > self.tol.time:
+			return False
+		(theta, d) = self.polar(p)
+		if d > self.tol.lateral and not (self.lo <= theta <= self.hi):
+			return False
+		if d < self.dmax:
+			return False
+		if dt > 0:
+			return self.slo <= (p[2] - self.anchor[2]) / dt <= self.shi
+		return not (self.slo > self.shi or math.isnan(self.slo))
+
+	def add(self, track, p):
+		if self.anchor == None:
+			track.append(*p)
+			self.restart(p)
+			return
+		if not self.floating:
+			track.append(*p)
+			self.floating = True
+			return
+		last = track[-1]
+		self.drop(last)
+		if self.fits(p):
+			track.replace(*p)
+		else:
+			# the newest point is kept for good, and p starts a new line from it
+			self.restart(last)
+			track.append(*p)
+
+# for testing: simplify a made-up flight, and report how far the dropped points are from the track kept
+if __name__ == '__main__':
+	import time
+	import random
+	from bisect import bisect_right
+	rnd = random.Random(1)
+	raw = []
+	simple = Track(100000, Tolerance())
+	(lon, lat, alt, hdg, climb) = (-122.0, 37.7, 5000.0, 45.0, 1500.0)
+	for i in range(20000):
+		if i % 1200 == 0:
+			hdg = rnd.uniform(0, 360)			# turn, and change level, every 10 minutes
+			climb = rnd.choice([ -1500.0, 0.0, 0.0, 1500.0 ])
+		if i % 1200 < 60:
+			hdg += 1.5					# 3 deg/s standard rate turn
+		v = 230.0 * 0.5					# meters per half second
+		lat += v * math.cos(math.radians(hdg)) / METERS_PER_DEGREE
+		lon += v * math.sin(math.radians(hdg)) / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+		alt = max(0.0, alt + climb / 120.0)
+		raw.append((lon + rnd.gauss(0, 5e-5), lat + rnd.gauss(0, 5e-5), round(alt / 25) * 25, i * 0.5))
+	t0 = time.time()
+	for p in raw:
+		simple.add(*p)
+	t = (time.time() - t0) / len(raw)
+
+	# distance of q from the line a-b in meters, and feet above or below it at q's time
+	def error(a, b, q):
+		kx = math.cos(math.radians(a[1])) * METERS_PER_DEGREE
+		(bx, by) = ((b[0] - a[0]) * kx, (b[1] - a[1]) * METERS_PER_DEGREE)
+		(qx, qy) = ((q[0] - a[0]) * kx, (q[1] - a[1]) * METERS_PER_DEGREE)
+		u = min(max((qx*bx + qy*by) / max(bx*bx + by*by, 1e-9), 0.0), 1.0)
+		f = (q[3] - a[3]) / max(b[3] - a[3], 1e-9)
+		return [ math.hypot(qx - u*bx, qy - u*by), abs(q[2] - (a[2] + f * (b[2] - a[2]))) ]
+	times = list(simple.t[:len(simple)])
+	worst = [ 0.0, 0.0 ]
+	for p in raw:
+		j = min(max(bisect_right(times, p[3]), 1), len(simple) - 1)
+		worst = map(max, worst, error(simple[j-1], simple[j], p))
+	print "%u points -> %u kept (%.1fx), %.1f us a point, worst error %.1f m, %.1f ft" % \
+		(len(raw), len(simple), float(len(raw)) / len(simple), t * 1e6, worst[0], worst[1])
@@ -10,6 +10,8 @@ import time
 import binascii
 import argparse
 import decoder
+import prefilter
+import logwriter
 import threading
 import signal
 import random
@@ -36,6 +38,7 @@ class AdsbReaderThreadUSB(threading.Thread):
 		self.deviceName = ''
 		self.friendlyName = ''
 		self.location = [ 0, 0, 0 ]
+		self.prefilter = prefilter.fromArgs(args)	# None if every frame is served
 
 	def setLocation(self, loc):
 		self.location = loc
@@ -56,7 +59,7 @@ class AdsbReaderThreadUSB(threading.Thread):
 		# append to log
 		if self.packetlog_fname != None and self.packetlog_fname != '':
 			print "Logging received packets to file %s" % (self.packetlog_fname)
-			self.PACKETLOG = open(self.packetlog_fname, "a")		
+			self.PACKETLOG = logwriter.fromArgs(self.args, self.packetlog_fname)	# written by a thread of its own
 
 		# set DAC once or dither in background
 		if self.args.ditherdac:
@@ -80,18 +83,20 @@ class AdsbReaderThreadUSB(threading.Thread):
 			#if pktCnt % 10 == 0:
 				#print "USB read: ", time.time(), len(d), "bytes", pktCnt/(time.time()-starttime), "pkts/sec"
 
-			if len(d) > 0:
+			if len(d) > 0 and (self.prefilter == None or self.prefilter.accept(d[8:])):
 				pktCnt = pktCnt + 1
 				pkt = self.makePacket(d)
 				self.serverThread.put(pkt + '\n')
 				
 				if self.PACKETLOG:
-					self.PACKETLOG.write(pkt)
+					self.PACKETLOG.put(d[8:], rxlevel = (d[0]<<8) | d[1])
 
 				if self.args.verbose:
 					print pkt
 
 		print "USB reader thread exiting"	
+		if self.PACKETLOG:
+			logwriter.release(self.PACKETLOG)
 		self.dacThread.shutdown()
 
 	# Given a data packet from the USB device, construct a network packet
@@ -190,6 +195,8 @@ def main():
 	desc += 'Can act as either a server and/or client.\n'
 	parser = argparse.ArgumentParser(description=desc)
 	parser.add_argument('-o', '--output', dest="filename", help="log all packets to FILE", metavar="FILE")
+	parser.add_argument('-B', '--binary', dest="binarylog", help="with -o, log in the compact binary format (see binlog.py)", action="store_true")
+	logwriter.addArguments(parser)
 	parser.add_argument('-v', '--verbose', dest="verbose", help="print extra info", action="store_true")
 	parser.add_argument('-H', '--host', dest="host", help="connect as a client to server at IPADDR:PORT", metavar="IPADDR:PORT")
 	parser.add_argument('-S', '--server', dest="serverport", metavar="PORT", help="start a packet server on this host on port PORT", \
@@ -206,6 +213,7 @@ def main():
 			default=default_origin)
 	# MacOS starts programs with -psn_XXXXXXX "process serial number" argument.  Ignore it. FIXME SetFrontProcess()
 	parser.add_argument('-p')		
+	prefilter.addArguments(parser)
 	args = parser.parse_args()
 
 	if args.verbose:
@@ -228,7 +236,7 @@ def main():
 	socketThread.start()
 	
 	# start the USB reader
-	reader = AdsbReaderThreadUSB(socketThread, args, dacval=1900)
+	reader = AdsbReaderThreadUSB(socketThread, args, fname=args.filename, dacval=1900)
 	reader.setFriendlyName(args.name)
 	if args.origin != None:
 		origin = [float(args.origin[0]), float(args.origin[1]), float(args.origin[2])]